@@ -0,0 +1,37 @@
+import os
+import storage
+
+# THING_TRACKER_STORAGE=sqlite moves the tasks into tracked_items.db on the next start, =json keeps
+# the json file. Unset, a folder that already has tracked_items.db goes on using it
+SETTING = os.environ.get("THING_TRACKER_STORAGE", "").lower()
+DB_FILE = "tracked_items.db"
+# THING_TRACKER_ITEMS=columns has task_cli.py query hold the tasks as columns (columnar.py) and
+# filter them with select() instead of building an object per task. The window keeps objects,
+# its indexes and models point at them
+COLUMNS = os.environ.get("THING_TRACKER_ITEMS", "").lower() == "columns"
+
+
+def current():
+    # the storage module for the folder we're in, call it after any chdir.
+    # sqlite3 only gets imported for folders that use it
+    if SETTING == "sqlite" or (SETTING != "json" and os.path.exists(DB_FILE)):
+        import sqlite_storage
+        return sqlite_storage
+    return storage
+
+
+# THING_TRACKER_SERVICE=1 has the window use a running task_service.py (its socket in the
+# folder, or the socket path or localhost:PORT the variable gives) instead of the files
+SERVICE = os.environ.get("THING_TRACKER_SERVICE")
+
+
+def service():
+    # the service as a backend for ItemStore, None when it isn't asked for or can't be reached
+    if SERVICE is None:
+        return None
+    import service_client
+    try:
+        return service_client.connect(SERVICE)
+    except OSError as e:
+        print("Task service not reachable, using the files:", e)
+        return None
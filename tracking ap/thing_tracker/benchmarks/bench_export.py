@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+from dataset import make_records, size, ANCHOR
+from recurrence import add_months
+import calendar_export
+
+MODES = {"ics": ("ics", False), "ics --expand": ("ics", True), "csv": ("csv", False)}
+
+
+def default_jobs():
+    cores = os.cpu_count() or 1
+    jobs = [1]
+    while jobs[-1] * 2 < cores:
+        jobs.append(jobs[-1] * 2)
+    return jobs + [cores] if cores > 1 else jobs
+
+
+def digest(path):
+    # what was written, less DTSTAMP, which is the time of each run
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.startswith(b"DTSTAMP:"):
+                sha.update(line)
+    return sha.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calendar export time against the number of processes")
+    parser.add_argument("--tasks", type=size, default=20_000)
+    parser.add_argument("--years", type=int, default=3, help="how far the export goes")
+    parser.add_argument("--jobs", type=int, nargs="+", default=default_jobs())
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--chunk", type=int, default=calendar_export.CHUNK_TASKS, help="tasks per piece of work")
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory(prefix="thing-tracker-export-")  # removed once main returns
+    os.chdir(scratch.name)
+    with open("tracked_items.json", "w") as f:
+        json.dump(make_records(args.tasks), f)
+    first, last = ANCHOR, add_months(ANCHOR, 12 * args.years)
+
+    failed = False
+    print(f"{args.tasks} tasks, {first} to {last}, {os.cpu_count()} cores")
+    print(f"{'mode':<14}{'jobs':>5}{'events':>10}{'MB':>8}{'s':>8}{'events/s':>12}{'speedup':>9}")
+    for mode in args.modes:
+        fmt, expand_all = MODES[mode]
+        path = "export." + fmt
+        single = expected = None
+        for jobs in args.jobs:
+            start = time.perf_counter()
+            _, events = calendar_export.export_calendar(path, fmt, first, last, jobs, expand_all, args.chunk)
+            seconds = time.perf_counter() - start
+            megabytes = os.path.getsize(path) / 1e6
+            single = single or seconds
+            print(f"{mode:<14}{jobs:>5}{events:>10}{megabytes:>8.1f}{seconds:>8.2f}{events / seconds:>12,.0f}"
+                  f"{single / seconds:>8.2f}x")
+            # the pool must not change a byte of what gets written
+            written = digest(path)
+            if expected is None:
+                expected = written
+            elif written != expected:
+                print(f"FAIL: {mode} with {jobs} jobs wrote something else than with {args.jobs[0]}")
+                failed = True
+            os.remove(path)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
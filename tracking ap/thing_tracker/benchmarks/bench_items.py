@@ -0,0 +1,70 @@
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker_model import TrackedItem, CompactItem
+from recurrence import Series, is_recurring
+from dataset import make_records, ANCHOR
+
+
+def measure(label, fn):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    return label, time.perf_counter() - start, result
+
+
+def due_scan(items, today):
+    # what check_notifications does
+    return sum(1 for item in items if item.due is not None and item.due <= today and not item.completed)
+
+
+def current_occurrences(items, today):
+    until = today + timedelta(days=365)
+    found = 0
+    for item in items:
+        if is_recurring(item.recurrence) and item.due is not None and item.start is not None:
+            found += Series(item).current(today, until) is not None
+    return found
+
+
+def load(item_type, text):
+    # the same path as storage.load_items, the parsed dicts are dropped afterwards
+    return [item_type.from_dict(record) for record in json.loads(text)]
+
+
+def run(item_type, text):
+    tracemalloc.start()
+    _, load_time, items = measure("load", lambda: load(item_type, text))
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    today = ANCHOR
+    _, scan, _ = measure("due scan", lambda: due_scan(items, today))
+    _, occurrences, _ = measure("occurrences", lambda: current_occurrences(items, today))
+    _, dump, _ = measure("to_dict", lambda: [item.to_dict() for item in items])
+    return memory, load_time, scan, occurrences, dump
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TrackedItem vs CompactItem memory and CPU")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    text = json.dumps(make_records(args.count))
+    print(f"{args.count} items")
+    print(f"{'form':<14}{'MB':>10}{'load s':>10}{'due scan s':>12}{'recur s':>10}{'to_dict s':>11}")
+    for item_type in (TrackedItem, CompactItem):
+        memory, load_time, scan, occurrences, dump = run(item_type, text)
+        print(f"{item_type.__name__:<14}{memory / 1e6:>10.1f}{load_time:>10.2f}{scan:>12.3f}{occurrences:>10.2f}{dump:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
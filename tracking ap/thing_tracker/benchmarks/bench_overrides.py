@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker_model import CompactItem
+from recurrence import set_override
+from occurrence_index import OccurrenceIndex
+from dataset import ANCHOR
+
+
+def make_series(count, exceptions, history_days, seed=1):
+    # daily series started history_days ago, each with `exceptions` done, skipped or moved days
+    rng = random.Random(seed)
+    first = ANCHOR - timedelta(days=history_days)
+    series = []
+    for i in range(count):
+        task = CompactItem(f"series {i}", ["work"], first.isoformat(), "09:00", "10:00", False, "Low", {},
+                           first.isoformat(), "Daily")
+        for offset in rng.sample(range(history_days), min(exceptions, history_days)):
+            day = first + timedelta(days=offset)
+            kind = rng.random()
+            if kind < 0.6:
+                set_override(task, day, done=True)
+            elif kind < 0.8:
+                set_override(task, day, skip=True)
+            else:
+                moved = (day + timedelta(days=rng.randint(1, 5))).isoformat()
+                set_override(task, day, due_date=moved, start_date=moved)
+        series.append(task)
+    return series
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Window and heat map cost against exceptions per series")
+    parser.add_argument("--series", type=int, default=1000)
+    parser.add_argument("--exceptions", type=int, nargs="+", default=[0, 10, 100, 1000])
+    parser.add_argument("--history", type=int, default=3650, help="days each series has been running")
+    args = parser.parse_args()
+
+    print(f"{args.series} daily series, {args.history} days of occurrences each")
+    print(f"{'exceptions':>10}{'bytes/series':>14}{'index ms':>10}{'window ms':>11}{'heat map ms':>13}")
+    for exceptions in args.exceptions:
+        series = make_series(args.series, exceptions, args.history)
+        size = sum(len(json.dumps(task.to_dict())) for task in series) // args.series
+        index_ms, index = timed(lambda: OccurrenceIndex(series))
+        window_ms, _ = timed(lambda: index.window(ANCHOR, ANCHOR + timedelta(days=365), today=ANCHOR))
+        heat_ms, _ = timed(lambda: index.counts(ANCHOR - timedelta(days=7), ANCHOR + timedelta(days=42)))
+        print(f"{exceptions:>10}{size:>14}{index_ms:>10.1f}{window_ms:>11.1f}{heat_ms:>13.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker_model import CompactItem
+from item_store import ItemStore
+from query import compile_query, linear_scan
+from dataset import make_records, size, ANCHOR
+
+QUERIES = [
+    "tag:work priority:High due<today+30 done:no",
+    "done:no priority>=Medium",
+    "due>=today due<today+7",
+    "start>=today-3 start<=today+3 tag:home",
+    "invoice done:no",
+    "tag:urgent tag:money",
+    "priority:Low due:today+1",
+    "done:yes",
+]
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query plans over the field indexes vs a linear scan")
+    parser.add_argument("--sizes", type=size, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--explain", action="store_true", help="print each plan after it ran")
+    args = parser.parse_args()
+
+    # the generated dates sit around ANCHOR, so "today" is pinned there too
+    today = ANCHOR
+    for count in args.sizes:
+        items = [CompactItem.from_dict(record) for record in make_records(count)]
+        start = time.perf_counter()
+        store = ItemStore(items)
+        build = time.perf_counter() - start
+        print(f"\n{count} tasks, store and indexes built in {build:.2f}s")
+        print(f"{'query':<46}{'hits':>9}{'plan ms':>10}{'linear ms':>11}{'speedup':>9}")
+        for text in QUERIES:
+            hits = store.query(text, today)
+            expected = linear_scan(text, store, today)
+            if {item.id for item in hits} != {item.id for item in expected}:
+                print(f"MISMATCH {text}: {len(hits)} vs {len(expected)}")
+                return 1
+            planned = time_per_call(lambda: store.query(text, today), args.repeat)
+            linear = time_per_call(lambda: linear_scan(text, store, today), 1)
+            print(f"{text:<46}{len(hits):>9}{planned:>10.2f}{linear:>11.1f}{linear / planned:>8.0f}x")
+            if args.explain:
+                plan = compile_query(text, store, today)
+                plan.run()
+                print(plan.explain())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker_model import TrackedItem
+from search_index import SearchIndex
+from utils import filter_items
+
+WORDS = ["report", "groceries", "dentist", "invoice", "laundry", "review", "call", "email",
+         "gym", "budget", "meeting", "garden", "taxes", "backup", "car", "rent", "study", "plan"]
+TAGS = ["work", "home", "health", "money", "school", "errands", "urgent", "later"]
+QUERIES = ["rep", "invoice", "work", "call mum", "zzz", "g"]
+
+
+def make_items(count, seed=1):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        name = " ".join(rng.sample(WORDS, 2)) + f" {i}"
+        items.append(TrackedItem(
+            name=name,
+            tags=rng.sample(TAGS, rng.randint(0, 3)),
+            due_date="2026-01-01",
+            start_time="09:00",
+            end_time="10:00",
+            completed=False,
+            priority="Low",
+            fields={}
+        ))
+    return items
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search index vs linear filter_items query latency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        items = make_items(size)
+        start = time.perf_counter()
+        index = SearchIndex(items)
+        build = time.perf_counter() - start
+        print(f"\n{size} items, index built in {build:.2f}s")
+        print(f"{'query':<12}{'hits':>10}{'index ms':>12}{'linear ms':>12}")
+        for query in QUERIES:
+            hits = len(filter_items(items, query, index))
+            indexed = time_per_call(lambda: filter_items(items, query, index), args.repeat)
+            linear = time_per_call(lambda: filter_items(items, query), 1)
+            print(f"{query:<12}{hits:>10}{indexed:>12.3f}{linear:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
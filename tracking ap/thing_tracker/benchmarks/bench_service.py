@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+from dataset import make_records, size
+
+QUERIES = ["tag:work priority:High due<today+7 done:no", "invoice due>=today due<today+30",
+           "tag:health done:no start:today", "meeting priority:High done:no due<today"]
+MIX = [("get", 40), ("query", 20), ("update", 25), ("add", 10), ("delete", 5)]
+
+
+class Connection:
+    # one request at a time, like a script or window waiting for its answer
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    async def call(self, op, **args):
+        self.next_id += 1
+        self.writer.write((json.dumps({"id": self.next_id, "op": op, **args}) + "\n").encode())
+        await self.writer.drain()
+        while True:
+            message = json.loads(await self.reader.readline())
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            if "result" in message:
+                return message["result"]
+
+
+async def connect(address):
+    reader, writer = await asyncio.open_unix_connection(address, limit=1 << 26)
+    return Connection(reader, writer)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def client(address, number, tasks, stop, latencies):
+    rng = random.Random(number)
+    connection = await connect(address)
+    ops, weights = zip(*MIX)
+    mine = []  # tasks this client added, the ones it deletes
+    while not stop.is_set():
+        op = rng.choices(ops, weights)[0]
+        if op == "delete" and not mine:
+            op = "add"
+        start = time.perf_counter()
+        if op == "get":
+            await connection.call("get", task=f"{rng.randrange(tasks):032x}")
+        elif op == "query":
+            await connection.call("query", text=rng.choice(QUERIES))
+        elif op == "update":
+            # the time goes in with the edit so subscribers can tell how late it reached them
+            await connection.call("update", item={"id": f"{rng.randrange(tasks):032x}",
+                                                  "fields": {"sent": repr(time.time())}})
+        elif op == "add":
+            result = await connection.call("add", item={
+                "name": f"load test {number}", "tags": ["load"], "due_date": "2026-11-01", "start_time": "09:00",
+                "end_time": "10:00", "completed": False, "priority": "Low", "fields": {"sent": repr(time.time())},
+                "start_date": "2026-11-01"})
+            mine.append(result["item"]["id"])
+        else:
+            await connection.call("delete", ids=[mine.pop(rng.randrange(len(mine)))])
+        latencies.setdefault(op, []).append((time.perf_counter() - start) * 1000)
+    connection.writer.close()
+
+
+async def subscriber(address, stop, lags, counts):
+    connection = await connect(address)
+    await connection.call("subscribe")
+    while not stop.is_set():
+        try:
+            line = await asyncio.wait_for(connection.reader.readline(), 0.2)
+        except asyncio.TimeoutError:
+            continue
+        now = time.time()
+        for record in json.loads(line).get("records", []):
+            counts[0] += 1
+            sent = record.get("item", {}).get("fields", {}).get("sent")
+            if sent:
+                lags.append((now - float(sent)) * 1000)
+    connection.writer.close()
+
+
+async def run_level(address, clients, subscribers, tasks, seconds):
+    stop = asyncio.Event()
+    latencies, lags, counts = {}, [], [0]
+    listeners = [asyncio.create_task(subscriber(address, stop, lags, counts)) for _ in range(subscribers)]
+    workers = [asyncio.create_task(client(address, n, tasks, stop, latencies)) for n in range(clients)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*workers, *listeners)
+    return latencies, lags, counts[0]
+
+
+async def list_everything(address):
+    connection = await connect(address)
+    start = time.perf_counter()
+    count = await connection.call("list")
+    seconds = time.perf_counter() - start
+    connection.writer.close()
+    return count, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/s and latency of task_service.py with many clients at once")
+    parser.add_argument("--tasks", type=size, default=100_000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--subscribers", type=int, default=5, help="connections only listening for changes")
+    parser.add_argument("--seconds", type=float, default=5, help="per client count")
+    parser.add_argument("--max-p99-ms", type=float, help="fail when p99 at any client count is above this")
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory(prefix="thing-tracker-service-")  # removed once main returns
+    folder = scratch.name
+    with open(os.path.join(folder, "tracked_items.json"), "w") as f:
+        json.dump(make_records(args.tasks), f)
+    address = os.path.join(folder, "tracked_items.sock")
+    env = dict(os.environ)
+    env.pop("THING_TRACKER_SERVICE", None)
+    service = subprocess.Popen([sys.executable, os.path.join(APP_DIR, "task_service.py"), "--dir", folder,
+                                "--address", address], stdout=subprocess.PIPE, text=True, env=env)
+    failed = False
+    try:
+        print(service.stdout.readline().strip())
+        count, seconds = asyncio.run(list_everything(address))
+        print(f"list of all {count} tasks: {seconds * 1000:.0f} ms")
+        print(f"{'clients':>7}{'req/s':>9}{'p50 ms':>8}{'p99 ms':>8}  p99 by op{'':<37}{'events/s':>10}{'event p99':>10}")
+        for clients in args.clients:
+            latencies, lags, events = asyncio.run(run_level(address, clients, args.subscribers, args.tasks, args.seconds))
+            every = [ms for values in latencies.values() for ms in values]
+            by_op = " ".join(f"{op} {percentile(latencies.get(op, []), 0.99):.1f}" for op, _ in MIX)
+            p99 = percentile(every, 0.99)
+            print(f"{clients:>7}{len(every) / args.seconds:>9.0f}{statistics.median(every):>8.1f}{p99:>8.1f}  "
+                  f"{by_op:<46}{events / args.seconds:>10.0f}{percentile(lags, 0.99):>10.1f}")
+            if args.max_p99_ms is not None and p99 > args.max_p99_ms:
+                print(f"FAIL: p99 {p99:.1f} ms > {args.max_p99_ms} ms with {clients} clients")
+                failed = True
+    finally:
+        service.terminate()
+        service.wait(30)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
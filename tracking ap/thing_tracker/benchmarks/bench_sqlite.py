@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from datetime import timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+
+from dataset import make_records, size, ANCHOR
+
+QUERIES = [
+    "tag:work priority:High due<today+30 done:no",
+    "due>=today due<today+7",
+    "invoice done:no",
+    "done:yes priority:Low start>=today-90",
+]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run_size(count, appends):
+    # one size in a fresh folder, both modules keep their state at module level
+    import storage
+    import sqlite_storage
+    from tracker_model import CompactItem
+    from item_store import ItemStore
+    from recurrence import is_recurring
+
+    with open(storage.STORAGE_FILE, "w") as f:
+        json.dump(make_records(count), f)
+    rows = []
+    json_lazy, (active, _) = timed(lambda: storage.load_items_lazy(CompactItem))
+    json_full, items = timed(lambda: storage.load_items(CompactItem))
+    rows.append(("migrate json -> db", None, timed(sqlite_storage._connect)[0]))
+    rows.append(("load unfinished", json_lazy, timed(lambda: sqlite_storage.load_items_lazy(CompactItem))[0]))
+    rows.append(("load everything", json_full, timed(lambda: sqlite_storage.load_items(CompactItem))[0]))
+
+    # a month of finished tasks: the json side has to have loaded them all to pick from
+    first, last = ANCHOR, ANCHOR + timedelta(days=30)
+
+    def json_window():
+        window = []
+        for item in items:
+            if not item.completed:
+                continue
+            if item.due is None or item.start is None:
+                window.append(item)
+            elif is_recurring(item.recurrence):
+                if item.due <= last:
+                    window.append(item)
+            elif first <= item.due <= last:
+                window.append(item)
+        return window
+    json_ms, expected = timed(json_window)
+    sqlite_ms, found = timed(lambda: sqlite_storage.select_window(first, last))
+    rows.append((f"finished in a month ({len(found)})", json_full + json_ms, sqlite_ms))
+    if len(found) != len(expected):
+        print(f"MISMATCH window: {len(found)} vs {len(expected)}")
+
+    build_ms, store = timed(lambda: ItemStore(items))
+    for text in QUERIES:
+        memory_ms, hits = timed(lambda: store.query(text, ANCHOR))
+        sqlite_ms, records = timed(lambda: sqlite_storage.query_records(text, ANCHOR))
+        if {item.id for item in hits} != {record["id"] for record in records}:
+            print(f"MISMATCH {text}: {len(records)} vs {len(hits)}")
+        rows.append((f"{text} ({len(hits)})", memory_ms, sqlite_ms))
+
+    # one commit per append, like saving after each edit
+    new = [CompactItem.from_dict(record) for record in make_records(appends, seed=2)]
+    for item in new:
+        item.id = os.urandom(16).hex()
+    def append_each(backend):
+        for item in new:
+            records = [storage.add_record(item)]
+            backend.stamp(records)
+            backend.append_records(records)
+    json_ms, _ = timed(lambda: append_each(storage))
+    sqlite_ms, _ = timed(lambda: append_each(sqlite_storage))
+    rows.append((f"{appends} appends, ms each", json_ms / appends, sqlite_ms / appends))
+    return build_ms, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="The sqlite backend against the json file and in-memory indexes")
+    parser.add_argument("--sizes", type=size, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--appends", type=int, default=200)
+    parser.add_argument("--one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one is not None:
+        build_ms, rows = run_size(args.one, args.appends)
+        print(json.dumps({"build_ms": build_ms, "rows": rows}))
+        return 0
+    for count in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--one", str(count),
+                                  "--appends", str(args.appends)], cwd=folder, stdout=subprocess.PIPE,
+                                 text=True, check=True).stdout
+        lines = out.strip().splitlines()
+        for line in lines[:-1]:
+            print(line)
+        result = json.loads(lines[-1])
+        print(f"\n{count} tasks (in-memory indexes take {result['build_ms']:.0f} ms to build)")
+        print(f"{'':<52}{'json ms':>10}{'sqlite ms':>11}")
+        for name, json_ms, sqlite_ms in result["rows"]:
+            json_text = "" if json_ms is None else f"{json_ms:.1f}"
+            print(f"{name:<52}{json_text:>10}{sqlite_ms:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
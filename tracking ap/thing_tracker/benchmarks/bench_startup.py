@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in a fresh interpreter so every import is cold
+CHILD = r"""
+import time
+start = time.perf_counter()
+import sys, json
+sys.path.insert(0, sys.argv[1])
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QObject, QEvent
+app = QApplication([])
+import ui_main
+imported = time.perf_counter()
+window = ui_main.MainWindow()
+built = time.perf_counter()
+painted = []
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and not painted:
+            painted.append(time.perf_counter())
+            app.quit()
+        return False
+
+paint_filter = FirstPaint()
+window.installEventFilter(paint_filter)
+window.show()
+app.exec_()
+heavy = [name for name in ("requests", "pydbus", "notifier", "numpy") if name in sys.modules]
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "window_ms": (built - start) * 1000,
+    "first_paint_ms": (painted[0] - start) * 1000,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def write_tasks(folder, count):
+    if not count:
+        return
+    sys.path.insert(0, os.path.join(APP_DIR, "benchmarks"))
+    from dataset import make_records
+    with open(os.path.join(folder, "tracked_items.json"), "w") as f:
+        json.dump(make_records(count), f)
+
+
+def run_once(folder):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    out = subprocess.run([sys.executable, "-c", CHILD, APP_DIR], cwd=folder, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time to first paint, offscreen")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--items", type=int, default=0, help="tasks in the generated task file")
+    parser.add_argument("--max-import-ms", type=float, help="fail when the median import time is above this")
+    parser.add_argument("--max-paint-ms", type=float, help="fail when the median time to first paint is above this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_tasks(folder, args.items)
+        results = [run_once(folder) for _ in range(args.runs)]
+
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    window_ms = statistics.median(r["window_ms"] for r in results)
+    paint_ms = statistics.median(r["first_paint_ms"] for r in results)
+    print(f"{args.items} items, median of {args.runs} runs")
+    print(f"import        {import_ms:8.1f} ms")
+    print(f"window built  {window_ms:8.1f} ms")
+    print(f"first paint   {paint_ms:8.1f} ms")
+    heavy = sorted({name for r in results for name in r["heavy_modules"]})
+    if heavy:
+        print("loaded before first paint:", ", ".join(heavy))
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"FAIL: import {import_ms:.1f} ms > {args.max_import_ms} ms")
+        failed = True
+    if args.max_paint_ms is not None and paint_ms > args.max_paint_ms:
+        print(f"FAIL: first paint {paint_ms:.1f} ms > {args.max_paint_ms} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import resource
+import tracemalloc
+from datetime import timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QDate
+import storage
+import notifier
+from tracker_model import CompactItem
+from utils import filter_items
+from dataset import make_records, size, ANCHOR
+
+BASELINE_FILE = os.path.join(APP_DIR, "benchmarks", "baseline.json")
+CASES = ["save_items", "load_items", "load_columns", "filter_columns", "filter_items", "generate_recurrences", "refresh_list", "check_notifications"]
+QUERIES = ["rep", "invoice", "work", "call mum", "zzz", "g"]
+MIN_DELTA_SECONDS = 0.002  # slower by less than this is noise, whatever the ratio
+
+
+def measure(fn, repeat, memory):
+    # best of repeat for time, one more run under tracemalloc for the peak it allocates
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"seconds": min(times), "peak_mb": peak / 1e6 if peak is not None else None}
+
+
+def run_size(count, seed, repeat, memory):
+    import ui_main
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        items = [CompactItem.from_dict(record) for record in make_records(count, seed)]
+        results["save_items"] = measure(lambda: storage.save_items(items), repeat, memory)
+        del items
+        results["load_items"] = measure(lambda: storage.load_items(CompactItem), repeat, memory)
+        # THING_TRACKER_ITEMS=columns, what task_cli.py query works on then
+        results["load_columns"] = measure(storage.load_columns, repeat, memory)
+        columns = storage.load_columns()
+
+        def select():
+            columns.overdue(ANCHOR)
+            columns.due_between(ANCHOR, ANCHOR + timedelta(days=30))
+            columns.with_priority("High")
+            columns.query("due<today+7 done:no tag:work", ANCHOR)
+
+        results["filter_columns"] = measure(select, repeat, memory)
+        del columns
+
+        window = ui_main.MainWindow()
+        while not window.items.fully_loaded:
+            window.items.load_more(count)
+        window.calendar.setSelectedDate(QDate(ANCHOR.year, ANCHOR.month, ANCHOR.day))
+
+        def search():
+            for query in QUERIES:
+                filter_items(window.items, query, window.items.search_index)
+
+        def recurrences():
+            from_dt, to_dt = window.visible_window()
+            for task in window.items:
+                window.generate_recurrences(task, from_dt, to_dt)
+
+        results["filter_items"] = measure(search, repeat, memory)
+        results["generate_recurrences"] = measure(recurrences, repeat, memory)
+        results["refresh_list"] = measure(window.refresh_list, repeat, memory)
+        results["check_notifications"] = measure(window.check_notifications, repeat, memory)
+        window.items.writer.close()
+        window.deleteLater()
+        os.chdir(APP_DIR)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # (size, case, what, now, then) for everything more than threshold behind the baseline
+    regressions = []
+    for count, cases in results.items():
+        for case, now in cases.items():
+            then = baseline.get(count, {}).get(case)
+            if then is None:
+                continue
+            if (now["seconds"] > then["seconds"] * (1 + threshold)
+                    and now["seconds"] - then["seconds"] > MIN_DELTA_SECONDS):
+                regressions.append((count, case, "seconds", now["seconds"], then["seconds"]))
+            if (now["peak_mb"] is not None and then.get("peak_mb") is not None
+                    and now["peak_mb"] > then["peak_mb"] * (1 + threshold) and now["peak_mb"] - then["peak_mb"] > 1):
+                regressions.append((count, case, "peak MB", now["peak_mb"], then["peak_mb"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the app's hot paths on generated task sets, offscreen")
+    parser.add_argument("--sizes", type=size, nargs="+", default=[1_000, 100_000, 1_000_000],
+                        help="task counts, 1k, 100k and 1m work too")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the fastest one counts")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each case")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file to compare against and save to")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to the baseline file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail when a case is this much slower or bigger than the baseline, 0.25 is 25%%")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    # only the scan is timed, nothing gets sent
+    notifier.available = lambda: True
+    notifier.send_notification = lambda summary, body, timeout=5000: None
+    app = QApplication.instance() or QApplication([])
+
+    results = {}
+    print(f"{'size':>9}  {'case':<22}{'seconds':>10}{'peak MB':>10}{'vs baseline':>13}")
+    for count in args.sizes:
+        results[str(count)] = run_size(count, args.seed, args.repeat, not args.no_memory)
+        for case in CASES:
+            now = results[str(count)][case]
+            then = baseline.get(str(count), {}).get(case)
+            change = f"{(now['seconds'] / then['seconds'] - 1) * 100:+.0f}%" if then and then["seconds"] else ""
+            peak = f"{now['peak_mb']:.1f}" if now["peak_mb"] is not None else "-"
+            print(f"{count:>9}  {case:<22}{now['seconds']:>10.4f}{peak:>10}{change:>13}")
+        app.processEvents()
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if args.save_baseline:
+        merged = dict(baseline, **results)
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "seed": args.seed, "results": merged}, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for count, case, what, now, then in regressions:
+        print(f"FAIL: {case} at {count} tasks, {what} {now:.4f} vs baseline {then:.4f}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
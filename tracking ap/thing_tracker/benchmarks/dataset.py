@@ -0,0 +1,62 @@
+import sys
+import json
+import random
+import argparse
+from datetime import date, timedelta
+
+# generated sets are dated around this day, not today, so the same seed always gives the same tasks
+ANCHOR = date(2026, 6, 1)
+
+WORDS = ["report", "groceries", "dentist", "invoice", "laundry", "review", "call", "email",
+         "gym", "budget", "meeting", "garden", "taxes", "backup", "car", "rent", "study", "plan"]
+TAGS = ["work", "home", "health", "money", "school", "errands", "urgent", "later"]
+PRIORITIES = ["Low", "Medium", "High"]
+PRIORITY_WEIGHTS = [50, 35, 15]
+RECURRENCES = ["None", "Daily", "Weekly", "Fortnightly", "Monthly", "Yearly"]
+RECURRENCE_WEIGHTS = [70, 5, 10, 3, 10, 2]
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def make_records(count, seed=1, anchor=ANCHOR):
+    # about three years of history and one ahead, most of the old tasks done
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        start = anchor + timedelta(days=rng.randint(-1100, 365))
+        due = start + timedelta(days=rng.choice([0, 0, 0, 1, 2, 7, 14]))
+        start_minutes = rng.randint(6 * 4, 21 * 4) * 15
+        end_minutes = min(start_minutes + rng.choice([15, 30, 60, 90, 120]), 23 * 60 + 45)
+        overdue = due < anchor - timedelta(days=30)
+        records.append({
+            "name": " ".join(rng.sample(WORDS, rng.randint(1, 3))) + f" {i}",
+            "tags": rng.sample(TAGS, rng.choice([0, 1, 1, 2, 3])),
+            "due_date": due.isoformat(),
+            "start_time": f"{start_minutes // 60:02d}:{start_minutes % 60:02d}",
+            "end_time": f"{end_minutes // 60:02d}:{end_minutes % 60:02d}",
+            "completed": rng.random() < (0.9 if overdue else 0.1),
+            "priority": rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0],
+            "fields": {"notes": f"note {i}"} if rng.random() < 0.1 else {},
+            "start_date": start.isoformat(),
+            "recurrence": rng.choices(RECURRENCES, RECURRENCE_WEIGHTS)[0],
+            "id": f"{i:032x}",
+        })
+    return records
+
+
+def size(value):
+    return SIZES.get(value.lower()) or int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a generated task file")
+    parser.add_argument("count", type=size, help="number of tasks, or 1k, 100k, 1m")
+    parser.add_argument("path", nargs="?", default="tracked_items.json")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    with open(args.path, "w") as f:
+        json.dump(make_records(args.count, args.seed), f)
+    print(f"wrote {args.count} tasks to {args.path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import storage
+from tracker_model import CompactItem
+from item_store import ItemStore
+from dataset import make_records
+
+SHARED = 50  # tasks every process keeps editing, the last write has to win everywhere
+
+
+def disk_state():
+    with storage.locked():
+        return {record["id"]: record for record in storage.stream_records()[1]}
+
+
+def worker(number, folder, ops, compact_after, seed, barrier, results):
+    # edits its own tasks and the shared ones, merging the others' changes as it goes
+    os.chdir(folder)
+    storage.COMPACT_AFTER = compact_after
+    rng = random.Random(seed * 1000 + number)
+    store = ItemStore(*storage.load_items_lazy(CompactItem))
+    while not store.fully_loaded:
+        store.load_more(1 << 20)
+    store.writer.delay = 0.002
+    shared = sorted(store.by_id)[:SHARED]
+    own = {}  # id -> what it should look like on disk, None once deleted
+    alive = []
+    adds = deletes = merges = 0
+    barrier.wait()
+    start = time.perf_counter()
+    for op in range(ops):
+        roll = rng.random()
+        if roll < 0.4 or not alive:
+            item = CompactItem(f"p{number} task {op}", [f"p{number}"], "2026-10-20", "09:00", "10:00",
+                               False, "Medium", {}, "2026-10-20", rng.choice(["None", "Weekly"]))
+            store.add(item)
+            own[item.id] = item.to_dict()
+            alive.append(item.id)
+            adds += 1
+        elif roll < 0.7:
+            item = store.get(rng.choice(alive))
+            item.completed = not item.completed
+            item.name = f"p{number} edit {op}"
+            store.update(item)
+            own[item.id] = item.to_dict()
+        elif roll < 0.85:
+            item_id = alive.pop(rng.randrange(len(alive)))
+            store.remove([item_id])
+            own[item_id] = None
+            deletes += 1
+        else:
+            item = store.get(rng.choice(shared))
+            item.fields = {"by": f"p{number}", "op": str(op)}
+            store.update(item)
+        if op % 20 == 0:
+            store.merge_external()
+            merges += 1
+    store.writer.close()
+    elapsed = time.perf_counter() - start
+    barrier.wait()  # everyone's writes are on disk
+    store.merge_external()
+    disk = disk_state()
+    own_lost = [item_id for item_id, record in own.items() if disk.get(item_id) != record]
+    view = {item_id: item.to_dict() for item_id, item in store.by_id.items()}
+    view_diff = len(view.keys() ^ disk.keys()) + sum(
+        1 for item_id in view.keys() & disk.keys() if view[item_id] != disk[item_id])
+    results.put({"number": number, "ops": ops, "seconds": elapsed, "adds": adds, "deletes": deletes,
+                 "own_lost": len(own_lost), "view_diff": view_diff, "merges": merges})
+
+
+def check_journal():
+    seqs = [record["seq"] for record in storage.read_journal()[0]]
+    return all(a < b for a, b in zip(seqs, seqs[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Several processes editing one task file at once")
+    parser.add_argument("--processes", type=int, default=6)
+    parser.add_argument("--ops", type=int, default=400, help="edits per process")
+    parser.add_argument("--tasks", type=int, default=2000, help="tasks in the file to start with")
+    parser.add_argument("--compact-after", type=int, default=50, help="small, so compactions race the appends")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dir", help="folder to run in, a temporary one by default")
+    parser.add_argument("--keep", action="store_true", help="leave the temporary folder behind to look at")
+    args = parser.parse_args()
+
+    folder = args.dir or tempfile.mkdtemp(prefix="thing-tracker-stress-")
+    try:
+        return run(args, folder)
+    finally:
+        if not args.dir and not args.keep:
+            os.chdir(APP_DIR)
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def run(args, folder):
+    os.chdir(folder)
+    with open(storage.STORAGE_FILE, "w") as f:
+        json.dump(make_records(args.tasks, args.seed), f)
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.processes)
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(n, folder, args.ops, args.compact_after, args.seed, barrier, results))
+               for n in range(args.processes)]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    reports = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    wall = time.perf_counter() - start
+
+    failed = False
+    print(f"{'proc':>4}{'ops':>6}{'ops/s':>9}{'merges':>8}{'own lost':>10}{'view diff':>11}")
+    for report in sorted(reports, key=lambda r: r["number"]):
+        print(f"{report['number']:>4}{report['ops']:>6}{report['ops'] / report['seconds']:>9.0f}"
+              f"{report['merges']:>8}{report['own_lost']:>10}{report['view_diff']:>11}")
+        failed |= report["own_lost"] > 0 or report["view_diff"] > 0
+    disk = disk_state()
+    expected = args.tasks + sum(r["adds"] - r["deletes"] for r in reports)
+    print(f"{len(disk)} tasks on disk, expected {expected}; {args.processes * args.ops} edits in {wall:.1f}s")
+    if len(disk) != expected:
+        print("FAIL: task count")
+        failed = True
+    if not check_journal():
+        print("FAIL: journal seqs out of order")
+        failed = True
+    print("FAIL" if failed else "ok")
+    if args.dir or args.keep:
+        print("files left in", folder)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import io
+import os
+import csv
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from backend import current as current_backend
+from tracker_model import CompactItem
+from recurrence import Series, is_recurring, index_on_or_before, occurrence_date, add_months
+
+CHUNK_TASKS = 1000  # tasks handed to a process at a time
+YEARS = 3           # how far ahead the export goes unless told otherwise
+ONE_DAY = timedelta(days=1)
+PRIORITY_LEVELS = {"High": 1, "Medium": 5, "Low": 9}  # icalendar's 1 is the most urgent
+DAY_RULES = {"Daily": "FREQ=DAILY", "Weekly": "FREQ=WEEKLY", "Fortnightly": "FREQ=WEEKLY;INTERVAL=2"}
+CSV_COLUMNS = ["id", "name", "tags", "start_date", "start_time", "due_date", "end_time", "priority",
+               "recurrence", "completed", "occurrence"]
+ICS_HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Thing Tracker//Thing Tracker//EN\r\nCALSCALE:GREGORIAN\r\n"
+ICS_FOOTER = "END:VCALENDAR\r\n"
+
+
+def detect_format(path, given):
+    if given:
+        return given
+    return "csv" if path.lower().endswith(".csv") else "ics"
+
+
+# an export formats the same few thousand days and times over and over, each is done once
+_days = {}
+_times = {}
+_isos = {}
+
+
+def _day(day):
+    try:
+        return _days[day]
+    except KeyError:
+        text = _days[day] = f"{day.year:04d}{day.month:02d}{day.day:02d}"
+        return text
+
+
+def _when(day, minutes):
+    # the value part of a DTSTART-like line: a DATE for tasks without a time, local time otherwise
+    if minutes is None:
+        return ";VALUE=DATE:" + _day(day)
+    try:
+        time = _times[minutes]
+    except KeyError:
+        time = _times[minutes] = f"T{minutes // 60:02d}{minutes % 60:02d}00"
+    return ":" + _day(day) + time
+
+
+def _escape(text):
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\n").replace("\r", "\n").replace("\n", "\\n"))
+
+
+def _fold(line):
+    # lines longer than 75 bytes carry on after a line break and a space
+    if len(line) <= 75 and line.isascii():
+        return line
+    parts, part, size = [], [], 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > 75:
+            parts.append("".join(part))
+            part, size = [], 1
+        part.append(char)
+        size += width
+    parts.append("".join(part))
+    return "\r\n ".join(parts)
+
+
+def _details(task):
+    # the lines every event of a task shares
+    lines = [_fold("SUMMARY:" + _escape(task.name))]
+    if task.tags:
+        lines.append(_fold("CATEGORIES:" + ",".join(_escape(tag) for tag in task.tags)))
+    if task.priority in PRIORITY_LEVELS:
+        lines.append(f"PRIORITY:{PRIORITY_LEVELS[task.priority]}")
+    if task.fields:
+        notes = "\n".join(f"{key}: {value}" for key, value in task.fields.items())
+        lines.append(_fold("DESCRIPTION:" + _escape(notes)))
+    return lines
+
+
+def _end(task, start, due):
+    if task.start_minutes is None:
+        return "DTEND;VALUE=DATE:" + _day(max(start, due) + ONE_DAY)
+    if task.end_minutes is None or (due, task.end_minutes) <= (start, task.start_minutes):
+        return None  # no end time, or one before the start
+    return "DTEND" + _when(due, task.end_minutes)
+
+
+def _event(lines, task, uid, start, due, stamp, details, extra=()):
+    lines.append(f"BEGIN:VEVENT\r\nUID:{uid}\r\nDTSTAMP:{stamp}")
+    lines.extend(extra)
+    lines.append("DTSTART" + _when(start, task.start_minutes))
+    end = _end(task, start, due)
+    if end is not None:
+        lines.append(end)
+    lines.extend(details)
+    lines.append("END:VEVENT")
+
+
+def rule(task):
+    # the RRULE giving the dates occurrence_date gives, None when there isn't one. An event
+    # has a single length, so the start and due dates have to move in step
+    recurrence, start, due = task.recurrence, task.start, task.due
+    if recurrence in DAY_RULES:
+        return DAY_RULES[recurrence]
+    if (start.year, start.month) != (due.year, due.month):
+        return None  # the months in between aren't all the same length
+    monthly = recurrence == "Monthly"
+    clamped = [day for day in (start, due) if (day.day > 28 if monthly else (day.month, day.day) == (2, 29))]
+    if not clamped:
+        return "FREQ=MONTHLY" if monthly else "FREQ=YEARLY"
+    if start != due:
+        return None  # one end gets cut short in short months and the other doesn't
+    if monthly:
+        # the day, or the month's last one when it's shorter
+        days = ",".join(str(day) for day in range(28, start.day + 1))
+        return f"FREQ=MONTHLY;BYMONTHDAY={days};BYSETPOS=-1"
+    return "FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=28,29;BYSETPOS=-1"
+
+
+def _ics_series(lines, task, series, pattern, n_first, n_last, first, last, stamp, details):
+    # one event with the rule for occurrences n_first..n_last, skipped ones as EXDATE and
+    # moved ones as RECURRENCE-ID, or as events of their own when they came from outside it
+    recurrence = task.recurrence
+    uid = f"{task.id}@thing-tracker"
+    moved, alone = [], []
+    for occurrence in series.moved:
+        if first <= occurrence.due <= last:
+            n = index_on_or_before(series.due, recurrence, occurrence.original)
+            (moved if n_first <= n <= n_last else alone).append((n, occurrence))
+    stays = {n for n, _ in moved}
+    excluded = sorted(n for n in (index_on_or_before(series.due, recurrence, original) for original in series.gone)
+                      if n_first <= n <= n_last and n not in stays)
+
+    def original_start(n):
+        return _when(occurrence_date(series.start, recurrence, n), task.start_minutes)
+
+    extra = [f"RRULE:{pattern};COUNT={n_last - n_first + 1}"]
+    if excluded:
+        values = [original_start(n) for n in excluded]
+        # every value after the first drops the shared ;VALUE=DATE: or : prefix
+        prefix = values[0][:values[0].index(":") + 1]
+        extra.append(_fold("EXDATE" + prefix + ",".join(value[len(prefix):] for value in values)))
+    _event(lines, task, uid, occurrence_date(series.start, recurrence, n_first),
+           occurrence_date(series.due, recurrence, n_first), stamp, details, extra)
+    for n, occurrence in moved:
+        _event(lines, task, uid, occurrence.start, occurrence.due, stamp, details, ["RECURRENCE-ID" + original_start(n)])
+    for _, occurrence in alone:
+        _event(lines, task, f"{task.id}-{_day(occurrence.original)}@thing-tracker", occurrence.start,
+               occurrence.due, stamp, details)
+    return n_last - n_first + 1 - len(excluded) + len(alone)
+
+
+def _ics_task(lines, task, first, last, stamp, expand_all):
+    # the task's events between first and last, returns how many
+    due = task.due
+    if due is None:
+        return 0  # nowhere to put it
+    if task.start is None or not is_recurring(task.recurrence):
+        if not first <= due <= last:
+            return 0
+        _event(lines, task, f"{task.id}@thing-tracker", task.start or due, due, stamp, _details(task))
+        return 1
+    details = _details(task)
+    series = Series(task)
+    pattern = None if expand_all else rule(task)
+    if pattern is not None:
+        n_first = index_on_or_before(series.due, task.recurrence, first - ONE_DAY) + 1
+        n_last = index_on_or_before(series.due, task.recurrence, last)
+        if n_last >= n_first:
+            return _ics_series(lines, task, series, pattern, n_first, n_last, first, last, stamp, details)
+    occurrences = series.between(first, last)
+    for occurrence in occurrences:
+        _event(lines, task, f"{task.id}-{_day(occurrence.original)}@thing-tracker", occurrence.start,
+               occurrence.due, stamp, details)
+    return len(occurrences)
+
+
+def _iso(day):
+    try:
+        return _isos[day]
+    except KeyError:
+        text = _isos[day] = day.isoformat()
+        return text
+
+
+def _csv_task(writer, task, first, last):
+    due = task.due
+    if due is None:
+        return 0
+    if task.start is None or not is_recurring(task.recurrence):
+        if not first <= due <= last:
+            return 0
+        occurrences = [(task.start_date, task.due_date, task.completed, task.due_date)]
+    else:
+        occurrences = [(_iso(occurrence.start), _iso(occurrence.due), occurrence.completed, _iso(occurrence.original))
+                       for occurrence in Series(task).between(first, last)]
+    task_id, name, tags = task.id, task.name, ", ".join(task.tags)
+    start_time, end_time, priority, recurrence = task.start_time, task.end_time, task.priority, task.recurrence
+    writer.writerows((task_id, name, tags, start_date, start_time, due_date, end_time, priority, recurrence,
+                      "true" if completed else "false", original)
+                     for start_date, due_date, completed, original in occurrences)
+    return len(occurrences)
+
+
+def render_chunk(records, fmt, first, last, stamp, expand_all):
+    # one chunk of the file as bytes and the number of events in it, what each process runs
+    tasks = [CompactItem.from_dict(record) for record in records]
+    events = 0
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for task in tasks:
+            events += _csv_task(writer, task, first, last)
+        text = out.getvalue()
+    else:
+        lines = []
+        for task in tasks:
+            events += _ics_task(lines, task, first, last, stamp, expand_all)
+        text = "\r\n".join(lines) + "\r\n" if lines else ""
+    return text.encode("utf-8"), events
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _rendered(chunks, jobs, *args):
+    # rendered chunks in the order they came in, with at most two per process on the go
+    if jobs <= 1:
+        for chunk in chunks:
+            yield len(chunk), render_chunk(chunk, *args)
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(render_chunk, chunk, *args)))
+            if len(pending) >= jobs * 2:
+                count, future = pending.popleft()
+                yield count, future.result()
+        while pending:
+            count, future = pending.popleft()
+            yield count, future.result()
+
+
+def export_calendar(path, fmt=None, first=None, last=None, jobs=None, expand_all=False, chunk_size=CHUNK_TASKS):
+    # every task's occurrences from first to last as .ics or CSV, returns (tasks, events).
+    # Recurring tasks go out as one event with an RRULE where the pattern fits one, and as
+    # an event per occurrence otherwise or with expand_all. CSV is always one row each
+    fmt = detect_format(path, fmt)
+    first = first or date.today()
+    last = last or add_months(first, 12 * YEARS)
+    jobs = jobs or os.cpu_count() or 1
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    _, records = current_backend().stream_records()
+    tasks = events = 0
+    f = sys.stdout.buffer if path == "-" else open(path, "wb")
+    try:
+        if fmt == "csv":
+            header = io.StringIO()
+            csv.writer(header).writerow(CSV_COLUMNS)
+            f.write(header.getvalue().encode("utf-8"))
+        else:
+            f.write(ICS_HEADER.encode("utf-8"))
+        for count, (data, found) in _rendered(_chunks(records, chunk_size), jobs, fmt, first, last, stamp, expand_all):
+            f.write(data)
+            tasks += count
+            events += found
+        if fmt != "csv":
+            f.write(ICS_FOOTER.encode("utf-8"))
+    finally:
+        if f is not sys.stdout.buffer:
+            f.close()
+    return tasks, events
@@ -0,0 +1,265 @@
+from array import array
+from datetime import date
+from tracker_model import CompactItem, Priority, NO_FIELDS
+from query import parse, date_bounds, matches
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RECURRENCES = ["None", "Daily", "Weekly", "Fortnightly", "Monthly", "Yearly"]
+NO_DATE = 0     # ordinal 0 is never a real date
+NO_VALUE = -1   # missing time or priority
+
+
+class StringTable:
+    # each distinct string stored once, rows hold its code
+    def __init__(self, strings=()):
+        self.strings = []
+        self.codes = {}
+        for string in strings:
+            self.code(string)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def code(self, string):
+        code = self.codes.get(string)
+        if code is None:
+            code = self.codes[string] = len(self.strings)
+            self.strings.append(string)
+        return code
+
+    def __getitem__(self, code):
+        return self.strings[code]
+
+
+class ColumnStore:
+    # tasks as parallel columns, CompactItem objects only get built for rows someone asks for
+    def __init__(self):
+        self.ids = []
+        self.id_rows = {}
+        self.names = StringTable()
+        self.tag_sets = StringTable([()])
+        self.recurrences = StringTable(RECURRENCES)
+        self.name = array("i")
+        self.tags = array("i")
+        self.due = array("i")
+        self.start = array("i")
+        self.start_minutes = array("h")
+        self.end_minutes = array("h")
+        self.priority = array("b")
+        self.completed = array("b")
+        self.recurrence = array("b")
+        self.alive = array("b")
+        self.fields = {}  # row -> fields, only for rows that have some
+        self.overrides = {}  # row -> a series' exceptions, only for rows that have some
+        self.raw = {}     # row -> strings that didn't parse, as CompactItem keeps them
+        self._dates = {}
+
+    @staticmethod
+    def from_dicts(records):
+        store = ColumnStore()
+        for record in records:
+            store.add(CompactItem.from_dict(record))
+        return store
+
+    def __len__(self):
+        return len(self.id_rows)
+
+    def __contains__(self, item_id):
+        return item_id in self.id_rows
+
+    def __iter__(self):
+        for row in self.live_rows():
+            yield self.item(row)
+
+    def live_rows(self):
+        return self.select()
+
+    def _values(self, item):
+        if not isinstance(item, CompactItem):
+            item = CompactItem.from_dict(item.to_dict())
+        return item, (
+            self.names.code(item.name),
+            self.tag_sets.code(tuple(item.tags)),
+            item.due.toordinal() if item.due is not None else NO_DATE,
+            item.start.toordinal() if item.start is not None else NO_DATE,
+            item.start_minutes if item.start_minutes is not None else NO_VALUE,
+            item.end_minutes if item.end_minutes is not None else NO_VALUE,
+            int(item.level) if item.level is not None else NO_VALUE,
+            int(bool(item.completed)),
+            self.recurrences.code(item.recurrence),
+        )
+
+    def _write(self, row, item):
+        item, values = self._values(item)
+        columns = (self.name, self.tags, self.due, self.start, self.start_minutes,
+                   self.end_minutes, self.priority, self.completed, self.recurrence)
+        for column, value in zip(columns, values):
+            if row == len(column):
+                column.append(value)
+            else:
+                column[row] = value
+        self._set_sparse(self.fields, row, dict(item.fields))
+        self._set_sparse(self.overrides, row, item.overrides)
+        self._set_sparse(self.raw, row, item._raw)
+
+    @staticmethod
+    def _set_sparse(table, row, value):
+        if value:
+            table[row] = dict(value)
+        else:
+            table.pop(row, None)
+
+    def add(self, item):
+        row = len(self.ids)
+        self.ids.append(item.id)
+        self.id_rows[item.id] = row
+        self.alive.append(1)
+        self._write(row, item)
+        return row
+
+    def update(self, item):
+        self._write(self.id_rows[item.id], item)
+
+    def set_completed(self, item_id, completed):
+        self.completed[self.id_rows[item_id]] = int(bool(completed))
+
+    def remove(self, item_ids):
+        removed = []
+        for item_id in item_ids:
+            row = self.id_rows.pop(item_id, None)
+            if row is not None:
+                self.alive[row] = 0
+                self.fields.pop(row, None)
+                self.overrides.pop(row, None)
+                self.raw.pop(row, None)
+                removed.append(item_id)
+        return removed
+
+    def _date(self, ordinal):
+        if ordinal == NO_DATE:
+            return None
+        day = self._dates.get(ordinal)
+        if day is None:
+            day = self._dates[ordinal] = date.fromordinal(ordinal)
+        return day
+
+    def item(self, row):
+        item = CompactItem.__new__(CompactItem)
+        item.id = self.ids[row]
+        item.name = self.names[self.name[row]]
+        item.tags = self.tag_sets[self.tags[row]]
+        item.due = self._date(self.due[row])
+        item.start = self._date(self.start[row])
+        start_minutes, end_minutes = self.start_minutes[row], self.end_minutes[row]
+        item.start_minutes = start_minutes if start_minutes != NO_VALUE else None
+        item.end_minutes = end_minutes if end_minutes != NO_VALUE else None
+        level = self.priority[row]
+        item.level = Priority(level) if level != NO_VALUE else None
+        item.completed = bool(self.completed[row])
+        item.recurrence = self.recurrences[self.recurrence[row]]
+        item.fields = self.fields.get(row, NO_FIELDS)
+        overrides = self.overrides.get(row)
+        item.overrides = dict(overrides) if overrides else None
+        raw = self.raw.get(row)
+        item._raw = dict(raw) if raw else None
+        return item
+
+    def get(self, item_id):
+        row = self.id_rows.get(item_id)
+        return self.item(row) if row is not None else None
+
+    def items(self, rows):
+        return [self.item(row) for row in rows]
+
+    def snapshot(self):
+        return self
+
+    def to_dicts(self):
+        return [self.item(row).to_dict() for row in self.live_rows()]
+
+    def select(self, due_from=None, due_to=None, completed=None, priority=None):
+        # rows matching every filter given, dates are inclusive
+        due_from = due_from.toordinal() if due_from is not None else None
+        due_to = due_to.toordinal() if due_to is not None else None
+        if isinstance(priority, str):
+            priority = Priority[priority]
+        priority = int(priority) if priority is not None else None
+        if np is not None:
+            return self._select_numpy(due_from, due_to, completed, priority)
+        rows = []
+        due, done, level = self.due, self.completed, self.priority
+        for row, alive in enumerate(self.alive):
+            if not alive:
+                continue
+            if (due_from is not None or due_to is not None) and due[row] == NO_DATE:
+                continue
+            if due_from is not None and due[row] < due_from:
+                continue
+            if due_to is not None and due[row] > due_to:
+                continue
+            if completed is not None and bool(done[row]) != completed:
+                continue
+            if priority is not None and level[row] != priority:
+                continue
+            rows.append(row)
+        return rows
+
+    def _select_numpy(self, due_from, due_to, completed, priority):
+        # the views pin the arrays, so they must not outlive this call
+        mask = np.frombuffer(self.alive, dtype=np.int8) == 1
+        if due_from is not None or due_to is not None:
+            due = np.frombuffer(self.due, dtype=np.int32)
+            mask &= due != NO_DATE
+            if due_from is not None:
+                mask &= due >= due_from
+            if due_to is not None:
+                mask &= due <= due_to
+        if completed is not None:
+            mask &= np.frombuffer(self.completed, dtype=np.int8) == int(bool(completed))
+        if priority is not None:
+            mask &= np.frombuffer(self.priority, dtype=np.int8) == priority
+        return np.flatnonzero(mask).tolist()
+
+    def overdue(self, today):
+        return self.select(due_to=today, completed=False)
+
+    def due_between(self, first, last):
+        return self.select(due_from=first, due_to=last)
+
+    def with_priority(self, priority):
+        return self.select(priority=priority)
+
+    def plan(self, text, today=None):
+        # the select() filters a query comes down to, and the terms left to check row by row.
+        # None for the filters when no row can match
+        filters, rest, lows, highs = {}, [], [], []
+        for term in parse(text, today):
+            if term.field == "due":
+                low, high = date_bounds(term.op, term.value)
+                lows += [low] if low is not None else []
+                highs += [high] if high is not None else []
+            elif term.field == "done" and "completed" not in filters:
+                filters["completed"] = term.value
+            elif term.field == "priority" and term.op in (":", "=") and "priority" not in filters:
+                filters["priority"] = term.value
+            else:
+                rest.append(term)
+        if highs and min(highs) < 1 or lows and max(lows) > date.max.toordinal():
+            return None, rest  # the range starts before year 1 or after year 9999
+        if lows:
+            filters["due_from"] = date.fromordinal(max(lows))
+        if highs:
+            filters["due_to"] = date.fromordinal(min(highs))
+        return filters, rest
+
+    def query(self, text, today=None):
+        # the tasks matching a query like "due<today done:no priority:High", as ItemStore.query
+        # would give them. Raises QueryError for a term it can't read
+        filters, rest = self.plan(text, today)
+        if filters is None:
+            return []
+        items = self.items(self.select(**filters))
+        return [item for item in items if all(matches(term, item) for term in rest)]
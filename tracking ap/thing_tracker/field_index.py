@@ -0,0 +1,125 @@
+from bisect import bisect_left, insort
+from itertools import compress
+from tracker_model import Priority
+
+
+class FieldIndex:
+    # sorted (ordinal, id) lists over due and start dates for range scans, and a byte per task
+    # slot for each priority and done state so those filters are lookups or one big AND
+    def __init__(self, items=()):
+        self._due = []        # sorted (due ordinal, id)
+        self._start = []      # sorted (start ordinal, id)
+        self._slots = {}      # id -> slot, the position in every bitmap
+        self._ids = []        # slot -> id, None for a free slot
+        self._free = []       # slots given back by removals
+        self._bitmaps = {key: bytearray() for key in self.bitmap_keys()}
+        self._counts = dict.fromkeys(self._bitmaps, 0)
+        self._entries = {}    # id -> (due ordinal, start ordinal, bitmap keys) as indexed, for removal
+        for item in items:
+            self._add(item, sort=False)
+        self._due.sort()
+        self._start.sort()
+
+    @staticmethod
+    def bitmap_keys():
+        return [("priority", level) for level in Priority] + [("done", True), ("done", False)]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, item):
+        self._add(item, sort=True)
+
+    def add_many(self, items):
+        # one sort per date list for the whole batch instead of an insort per item
+        for item in items:
+            self._add(item, sort=False)
+        self._due.sort()
+        self._start.sort()
+
+    def _add(self, item, sort):
+        key = item.id
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = key
+        else:
+            slot = len(self._ids)
+            self._ids.append(key)
+            for bitmap in self._bitmaps.values():
+                bitmap.append(0)
+        self._slots[key] = slot
+        due = item.due.toordinal() if item.due is not None else None
+        start = item.start.toordinal() if item.start is not None else None
+        for ordinal, column in ((due, self._due), (start, self._start)):
+            if ordinal is not None:
+                if sort:
+                    insort(column, (ordinal, key))
+                else:
+                    column.append((ordinal, key))
+        keys = [("done", bool(item.completed))]
+        if item.level is not None:
+            keys.append(("priority", item.level))
+        for bitmap_key in keys:
+            self._bitmaps[bitmap_key][slot] = 1
+            self._counts[bitmap_key] += 1
+        self._entries[key] = (due, start, keys)
+
+    def remove(self, item):
+        key = item.id
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        due, start, keys = entry
+        for ordinal, column in ((due, self._due), (start, self._start)):
+            if ordinal is not None:
+                del column[bisect_left(column, (ordinal, key))]
+        slot = self._slots.pop(key)
+        for bitmap_key in keys:
+            self._bitmaps[bitmap_key][slot] = 0
+            self._counts[bitmap_key] -= 1
+        self._ids[slot] = None
+        self._free.append(slot)
+
+    def update(self, item):
+        self.remove(item)
+        self.add(item)
+
+    def _range(self, column, first, last):
+        # positions in column of ordinals first..last inclusive, None for an open end
+        column = self._due if column == "due" else self._start
+        low = 0 if first is None else bisect_left(column, (first,))
+        high = len(column) if last is None else bisect_left(column, (last + 1,))
+        return column, low, max(low, high)
+
+    def range_count(self, column, first, last):
+        _, low, high = self._range(column, first, last)
+        return high - low
+
+    def range_ids(self, column, first, last):
+        column, low, high = self._range(column, first, last)
+        return {key for _, key in column[low:high]}
+
+    def date_of(self, column, item_id):
+        entry = self._entries.get(item_id)
+        if entry is None:
+            return None
+        return entry[0] if column == "due" else entry[1]
+
+    def bitmap_count(self, keys):
+        # keys are ORed together, so this is exact
+        return sum(self._counts[key] for key in keys)
+
+    def bitmap(self, keys):
+        # the ORed bitmaps as one int, bit 8 * slot set for a task in any of them
+        combined = 0
+        for key in keys:
+            combined |= int.from_bytes(self._bitmaps[key], "little")
+        return combined
+
+    def bitmap_ids(self, combined):
+        data = combined.to_bytes(len(self._ids), "little")
+        return set(compress(self._ids, data))
+
+    def in_bitmap(self, keys, item_id):
+        slot = self._slots.get(item_id)
+        return slot is not None and any(self._bitmaps[key][slot] for key in keys)
@@ -0,0 +1,252 @@
+import threading
+from search_index import SearchIndex
+from occurrence_index import OccurrenceIndex
+from field_index import FieldIndex
+from query import compile_query
+from backend import current as current_backend
+from storage import add_record, update_record, delete_records, record_id
+from persistence import WriteBehind
+from tracker_model import CompactItem
+from recurrence import as_date
+
+FLUSH_SECONDS = 5.0  # longest a merge or a window load waits for our queued edits to be written
+
+
+class ItemStore:
+    # the loaded tasks keyed by id, iterates in insertion order like the old list
+    def __init__(self, items=(), rest=None, item_type=CompactItem, backend=None):
+        self.item_type = item_type
+        self.backend = backend or current_backend()
+        self.by_id = {item.id: item for item in items}
+        self.search_index = SearchIndex(self.by_id.values())
+        self.occurrence_index = OccurrenceIndex(self.by_id.values())
+        self.field_index = FieldIndex(self.by_id.values())
+        self.writer = WriteBehind(backend=self.backend)
+        self._rest = rest  # items still to be loaded, see load_more
+        # a backend with select_window (sqlite) loads unfinished tasks only, see load_window
+        self.windowed = hasattr(self.backend, "select_window")
+        self._windows = []  # (first, last) date ranges whose finished tasks are loaded
+        self._merged = set()  # ids other processes changed, their deferred copies are stale
+        self._local = {}  # id -> (our last record for it, writer.written() once it's on disk), see apply_taken
+        # held while the indexes change and while a query reads them, so a query can run on another
+        # thread (see SearchWorker). The GUI thread makes every change
+        self.lock = threading.RLock()
+
+    @property
+    def fully_loaded(self):
+        return self._rest is None
+
+    def load_more(self, count):
+        # pulls up to count of the deferred items in, returns them
+        loaded = []
+        if self._rest is None:
+            return loaded
+        for item in self._rest:
+            if item.id in self._merged:
+                continue
+            self.by_id[item.id] = item
+            loaded.append(item)
+            if len(loaded) >= count:
+                break
+        else:
+            self._rest = None
+        with self.lock:
+            self._index_many(loaded)
+        return loaded
+
+    def _index_many(self, loaded):
+        self.search_index.add_many(loaded)
+        self.field_index.add_many(loaded)
+        for item in loaded:
+            self.occurrence_index.add(item)
+
+    def load_window(self, first, last):
+        # pulls in the finished tasks the list or heat map needs for first..last, returns them
+        first, last = as_date(first), as_date(last)
+        if not self.windowed or any(a <= first and last <= b for a, b in self._windows):
+            return []
+        # a queued delete would otherwise come back from the database. While the writer can't
+        # get through, the window stays unloaded and the next refresh asks again
+        if not self.writer.flush(FLUSH_SECONDS):
+            print("Tasks still being saved, finished ones for", first, "to", last, "not loaded yet")
+            return []
+        loaded = []
+        for record in self.backend.select_window(first, last, completed=True):
+            if record["id"] not in self.by_id:
+                item = self.by_id[record["id"]] = self.item_type.from_dict(record)
+                loaded.append(item)
+        with self.lock:
+            self._index_many(loaded)
+        self._windows.append((first, last))
+        return loaded
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __contains__(self, item_id):
+        return item_id in self.by_id
+
+    def get(self, item_id):
+        return self.by_id.get(item_id)
+
+    def add(self, item):
+        with self.lock:
+            self.by_id[item.id] = item
+            self.search_index.add(item)
+            self.occurrence_index.add(item)
+            self.field_index.add(item)
+        self._submit([add_record(item)])
+
+    def update(self, item):
+        with self.lock:
+            self.search_index.update(item)
+            self.occurrence_index.update(item)
+            self.field_index.update(item)
+        self._submit([update_record(item)])
+
+    def replace(self, item):
+        # a new object in place of the loaded one with the same id, so whoever holds the old one
+        # (see TaskService) sees it unchanged. The indexes are keyed by id
+        with self.lock:
+            self.by_id[item.id] = item
+            self.search_index.update(item)
+            self.occurrence_index.update(item)
+            self.field_index.update(item)
+        self._submit([update_record(item)])
+
+    def remove(self, item_ids):
+        removed = []
+        with self.lock:
+            for item_id in item_ids:
+                item = self.by_id.pop(item_id, None)
+                if item is not None:
+                    self.search_index.remove(item)
+                    self.occurrence_index.remove(item)
+                    self.field_index.remove(item)
+                    removed.append(item_id)
+        if removed:
+            self._submit(delete_records(removed))
+        return removed
+
+    def _submit(self, records):
+        done = self.writer.submit(records)
+        for record in records:
+            self._local[record_id(record)] = (record, done)
+
+    def search(self, query):
+        return self.search_index.search(query)
+
+    def query(self, text, today=None):
+        # tasks matching a query like "tag:work due<today done:no", None when it has no terms.
+        # Raises QueryError for a term it can't read, compile_query gives the plan for explain
+        with self.lock:
+            ids = self.query_ids(text, today)
+            return None if ids is None else [self.by_id[item_id] for item_id in ids]
+
+    def query_ids(self, text, today=None, cancelled=None):
+        # the ids query() would give, cancelled as for Plan.run
+        with self.lock:
+            return compile_query(text, self, today).run(cancelled)
+
+    def merge_external(self):
+        # takes in what other processes wrote, returns the (changed, removed) ids.
+        # our queued edits go first so they have their final seqs, an external record for
+        # the same task with a lower seq came before ours on disk and mustn't replace it.
+        # Raises TimeoutError (an OSError) when ours can't be written yet, merge again later
+        self._flush()
+        written = self.writer.written()
+        records, resync = self.backend.take_changes()
+        if not resync:
+            return self.apply_taken(written, records)
+        with self.backend.locked():
+            self.backend.take_changes()
+            _, everything = self.backend.stream_records()
+            return self.apply_taken(written, None, everything)
+
+    def take_external(self):
+        # the part of merge_external that waits on the files, for another thread while this store
+        # keeps being edited (see TaskService). Hand what it returns to apply_taken
+        written = self.writer.written()
+        records, resync = self.backend.take_changes()
+        if not resync:
+            return written, records, None
+        with self.backend.locked():
+            self.backend.take_changes()
+            return written, None, list(self.backend.stream_records()[1])
+
+    def apply_taken(self, written, records, everything=None):
+        # records other processes journaled, or when they can't be told apart everything on disk
+        # to diff against by id. written is how far our writer had got before they were read:
+        # an edit of ours still unwritten goes to disk after theirs, a written one has its final seq
+        now = self.writer.written()
+        local = self._local
+        # edits written after the read can still meet older external records next time
+        self._local = {item_id: entry for item_id, entry in local.items() if entry[1] > written}
+
+        def ours(item_id, seq=None):
+            # whether our edit to item_id is newer than theirs (seq None: than the diffed copy)
+            if item_id not in local:
+                return False
+            mine, done = local[item_id]
+            if done > now:
+                return True
+            return done > written if seq is None else mine["seq"] > seq
+
+        changed, removed = {}, set()
+        if everything is None:
+            for record in records:
+                if ours(record_id(record), record["seq"]):
+                    continue
+                if record["op"] == "delete":
+                    changed.pop(record["id"], None)
+                    removed.add(record["id"])
+                else:
+                    changed[record["item"]["id"]] = record["item"]
+                    removed.discard(record["item"]["id"])
+            return self._apply_external(changed, removed)
+        seen = set()
+        for record in everything:
+            seen.add(record["id"])
+            if ours(record["id"]):
+                continue
+            item = self.by_id.get(record["id"])
+            if item is None and self.windowed and record.get("completed"):
+                continue  # not loaded before either, load_window brings it in when it's shown
+            if item is None or item.to_dict() != record:
+                changed[record["id"]] = record
+        self._rest = None  # the diff covered the deferred ones too
+        self._windows = []  # finished tasks in the windows may have changed, they get looked up again
+        removed = {item_id for item_id in self.by_id if item_id not in seen and not ours(item_id)}
+        return self._apply_external(changed, removed)
+
+    def _flush(self):
+        if not self.writer.flush(FLUSH_SECONDS):
+            raise TimeoutError(f"edits not saved after {FLUSH_SECONDS:.0f}s")
+
+    def _apply_external(self, changed, removed):
+        with self.lock:
+            return self._apply_external_locked(changed, removed)
+
+    def _apply_external_locked(self, changed, removed):
+        for item_id in removed:
+            self._merged.add(item_id)
+            item = self.by_id.pop(item_id, None)
+            if item is not None:
+                self.search_index.remove(item)
+                self.occurrence_index.remove(item)
+                self.field_index.remove(item)
+        for item_id, record in changed.items():
+            self._merged.add(item_id)
+            old = self.by_id.get(item_id)
+            if old is not None:
+                self.search_index.remove(old)
+                self.occurrence_index.remove(old)
+                self.field_index.remove(old)
+            item = self.by_id[item_id] = self.item_type.from_dict(dict(record))
+            self.search_index.add(item)
+            self.occurrence_index.add(item)
+            self.field_index.add(item)
+        return list(changed), list(removed)
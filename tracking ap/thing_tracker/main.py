@@ -1,42 +1,73 @@
 import sys
 import os
 import time
-import requests
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
 from PyQt5.QtWidgets import QApplication, QMessageBox
-from ui_main import MainWindow
 
 APP_VERSION = "1.1.6"
+VERSION_URL = "https://raw.githubusercontent.com/Soldrion/vibe-coded/main/tracking%20ap/thing_tracker/version.txt"
+
+
+def fetch_latest_version():
+    # requests takes a while to import, so it only gets loaded here on the checker thread
+    import requests
+    url = f"{VERSION_URL}?nocache={int(time.time())}"
+    response = requests.get(url, timeout=5)
+    print("Response:", response)
+
+    if response.status_code == 200:
+        return response.text.strip()
+    print("Failed to fetch version.txt, status code:", response.status_code)
+    return None
+
+
+class UpdateChecker(QObject):
+    # the request runs on a daemon thread, so quitting mid-request doesn't wait on it.
+    # The signal is queued back to the GUI thread.
+    update_available = pyqtSignal(str)
+
+    def __init__(self, current_version, parent=None):
+        super().__init__(parent)
+        self.current_version = current_version
+
+    def start(self):
+        threading.Thread(target=self.run, name="update-check", daemon=True).start()
+
+    def run(self):
+        try:
+            latest = fetch_latest_version()
+        except Exception as e:
+            print("Update check failed:", e)
+            return
+        print(latest)
+        if latest and latest != self.current_version:
+            print("need update")
+            print(latest, self.current_version)
+            self.update_available.emit(latest)
+
+
+def show_update_available(parent, latest):
+    QMessageBox.information(
+        parent,
+        "Update Available",
+        f"A new version is available: {latest}\n\nPlease update :)"
+    )
+
 
 def check_for_updates(current_version, parent=None):
-    try:
-        url = f"https://raw.githubusercontent.com/Soldrion/vibe-coded/main/tracking%20ap/thing_tracker/version.txt?nocache={int(time.time())}"
-        response = requests.get(url, timeout=5)
-        print("Response:", response)
-
-        if response.status_code == 200:
-            latest = response.text.strip()
-            print(latest)
-
-            if latest != current_version:
-                print("need update")
-                print(latest, current_version)
-                QMessageBox.information(
-                    parent,
-                    "Update Available",
-                    f"A new version is available: {latest}\n\nPlease update :)"
-                )
-        else:
-            print("Failed to fetch version.txt, status code:", response.status_code)
-
-    except Exception as e:
-        print("Update check failed:", e)
+    checker = UpdateChecker(current_version, parent)
+    checker.update_available.connect(lambda latest: show_update_available(parent, latest))
+    checker.start()
+    return checker
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    from ui_main import MainWindow
     window = MainWindow()
     window.show()
     print(sys.platform)
-    check_for_updates(APP_VERSION, parent=window)
+    window.after_first_paint(lambda: check_for_updates(APP_VERSION, parent=window))
 
     sys.exit(app.exec_())
-
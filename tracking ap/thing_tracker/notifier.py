@@ -1,13 +1,24 @@
-from pydbus import SessionBus
+try:
+    from pydbus import SessionBus
+except ImportError:
+    SessionBus = None
+
+_notify = None
+
+
+def available():
+    return SessionBus is not None
 
-bus = SessionBus()
-notify = bus.get('org.freedesktop.Notifications')
 
 def send_notification(summary, body, timeout=5000):
+    # the session bus is only opened the first time something is sent
+    global _notify
+    if _notify is None:
+        _notify = SessionBus().get('org.freedesktop.Notifications')
     # timeout in milliseconds
-    notify.Notify(
+    _notify.Notify(
         "ThingTracker",  # app name
-        0,               # replaces_id 
+        0,               # replaces_id
         "",              # app icon
         summary,
         body,
@@ -15,3 +26,22 @@ def send_notification(summary, body, timeout=5000):
         {},              # hints
         timeout
     )
+
+
+class DBusNotifier:
+    def send(self, summary, body, timeout=5000):
+        send_notification(summary, body, timeout)
+
+
+class PrintNotifier:
+    def send(self, summary, body, timeout=5000):
+        print(f"{summary}\n{body}\n")
+
+
+class FakeNotifier:
+    # keeps what would have been sent, for tests
+    def __init__(self):
+        self.sent = []
+
+    def send(self, summary, body, timeout=5000):
+        self.sent.append((summary, body))
@@ -0,0 +1,251 @@
+import os
+import sys
+import heapq
+import argparse
+import threading
+from datetime import datetime, timedelta, time
+from backend import current as current_backend
+from tracker_model import CompactItem
+from recurrence import Series, is_recurring, index_on_or_before, occurrence_date
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None  # the task files get stat'ed every POLL_SECONDS instead
+
+POLL_SECONDS = 5.0       # how often the task file gets stat'ed while waiting, without watchdog
+MAX_SLEEP_SECONDS = 300  # the timer doesn't see clock changes or a suspend, look again at least this often
+
+
+def at(day, minutes):
+    return datetime.combine(day, time()) + timedelta(minutes=minutes or 0)
+
+
+def next_time(anchor, recurrence, minutes, after):
+    # first occurrence of anchor at minutes that falls after `after`, None if there isn't one
+    if anchor is None:
+        return None
+    if not is_recurring(recurrence):
+        when = at(anchor, minutes)
+        return when if when > after else None
+    n = max(index_on_or_before(anchor, recurrence, after.date()), 0)
+    when = at(occurrence_date(anchor, recurrence, n), minutes)
+    if when <= after:
+        when = at(occurrence_date(anchor, recurrence, n + 1), minutes)
+    return when
+
+
+def next_reminder(item, kind, after):
+    # when the "starts" or "due" reminder for item next goes off after `after`
+    minutes = item.start_minutes if kind == "starts" else item.end_minutes
+    if not item.overrides or item.due is None or item.start is None or not is_recurring(item.recurrence):
+        return next_time(item.start if kind == "starts" else item.due, item.recurrence, minutes, after)
+    # occurrences ticked off or skipped stay quiet, moved ones go off on their new day
+    for occurrence in Series(item).following(after.date()):
+        if not occurrence.completed:
+            when = at(occurrence.start if kind == "starts" else occurrence.due, minutes)
+            if when > after:
+                return when
+
+
+def deadlines(item, after):
+    if item.completed:
+        return []
+    found = []
+    for kind in ("starts", "due"):
+        when = next_reminder(item, kind, after)
+        if when is not None:
+            found.append((when, kind))
+    return found
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def watch_folder(folder, callback):
+    # calls callback from watchdog's thread when something in folder is written, None without watchdog
+    if Observer is None:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            # opening and closing don't change anything, and reading the files would wake us again
+            if event.event_type in ("created", "modified", "moved", "deleted"):
+                callback()
+
+    observer = Observer()
+    observer.schedule(Handler(), folder, recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+class NotificationDaemon:
+    def __init__(self, backend, clock=datetime.now, poll_seconds=POLL_SECONDS, watch=True):
+        self.backend = backend
+        self.storage = current_backend()  # the json files or tracked_items.db, see backend.py
+        self.clock = clock
+        self.poll_seconds = poll_seconds
+        self.watch = watch
+        self.watcher = None
+        self.records = {}
+        self.items = {}
+        self.versions = {}
+        self.heap = []      # (when, counter, item id, kind, version)
+        self._counter = 0
+        self._seq = 0
+        self._offset = 0
+        self._snapshot_stat = None
+        self._journal_stat = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # set when the task files changed, or to stop
+
+    def load(self):
+        data, seq, offset = self.storage.read_records()
+        self._snapshot_stat = _stat(self.storage.STORAGE_FILE)
+        self._journal_stat = _stat(self.storage.JOURNAL_FILE)
+        self._seq, self._offset = seq, offset
+        changed = [item_id for item_id, record in data.items() if self.records.get(item_id) != record]
+        removed = [item_id for item_id in self.records if item_id not in data]
+        self.records = data
+        self._reschedule(changed, removed)
+        return changed, removed
+
+    def poll_changes(self):
+        # only the records that differ from last time get rescheduled
+        snapshot, journal = _stat(self.storage.STORAGE_FILE), _stat(self.storage.JOURNAL_FILE)
+        if snapshot == self._snapshot_stat and journal == self._journal_stat:
+            return [], []
+        if hasattr(self.storage, "changes_since"):
+            # tracked_items.db, its change rows go by seq
+            taken = self.storage.changes_since(self._offset)
+            if taken is None:
+                return self.load()
+            records, self._offset = taken
+        else:
+            grew = (snapshot == self._snapshot_stat and journal is not None and self._journal_stat is not None
+                    and journal[0] == self._journal_stat[0] and journal[1] >= self._offset)
+            if not grew:
+                return self.load()
+            records, self._offset = self.storage.read_journal(self._offset)
+        self._snapshot_stat, self._journal_stat = snapshot, journal
+        changed, removed = set(), set()
+        for record in records:
+            if record["seq"] <= self._seq:
+                continue
+            self._seq = record["seq"]
+            if record["op"] == "delete":
+                if self.records.pop(record["id"], None) is not None:
+                    removed.add(record["id"])
+                    changed.discard(record["id"])
+            else:
+                item_id = record["item"]["id"]
+                self.records[item_id] = record["item"]
+                changed.add(item_id)
+                removed.discard(item_id)
+        self._reschedule(changed, removed)
+        return list(changed), list(removed)
+
+    def _reschedule(self, changed, removed):
+        now = self.clock()
+        for item_id in removed:
+            self.items.pop(item_id, None)
+            self.versions[item_id] = self.versions.get(item_id, 0) + 1
+        for item_id in changed:
+            item = self.items[item_id] = CompactItem.from_dict(self.records[item_id])
+            version = self.versions[item_id] = self.versions.get(item_id, 0) + 1
+            for when, kind in deadlines(item, now):
+                self._push(when, item_id, kind, version)
+
+    def _push(self, when, item_id, kind, version):
+        self._counter += 1
+        heapq.heappush(self.heap, (when, self._counter, item_id, kind, version))
+
+    def next_deadline(self):
+        # stale entries are dropped lazily, here and when firing
+        while self.heap and self.heap[0][4] != self.versions.get(self.heap[0][2]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def overdue(self, today):
+        return [item for item in self.items.values()
+                if item.due is not None and item.due <= today and not item.completed]
+
+    def notify_overdue(self):
+        due_tasks = self.overdue(self.clock().date())
+        if due_tasks:
+            body = "\n".join(f"{t.name} (Due: {t.due_date})" for t in due_tasks)
+            self.backend.send("Thing Tracker - Due Tasks", body)
+
+    def run_pending(self, now=None):
+        # fires everything due by now, reminders that came due together go out as one notification
+        now = now or self.clock()
+        fired = []
+        while self.next_deadline() is not None and self.heap[0][0] <= now:
+            when, _, item_id, kind, version = heapq.heappop(self.heap)
+            item = self.items[item_id]
+            fired.append((when, item, kind))
+            following = next_reminder(item, kind, when)
+            if following is not None:
+                self._push(following, item_id, kind, version)
+        if fired:
+            lines = [f"{item.name} {kind} at {when:%Y-%m-%d %H:%M}" for when, item, kind in fired]
+            summary = "Thing Tracker" if len(fired) == 1 else f"Thing Tracker - {len(fired)} tasks"
+            self.backend.send(summary, "\n".join(lines))
+        return fired
+
+    def wait_seconds(self):
+        # how long run() sleeps: until the next deadline, woken early when the files change.
+        # Without a watcher the files only get looked at every poll_seconds
+        wait = MAX_SLEEP_SECONDS if self.watcher is not None else self.poll_seconds
+        deadline = self.next_deadline()
+        if deadline is not None:
+            wait = min(wait, max((deadline - self.clock()).total_seconds(), 0))
+        return wait
+
+    def run(self):
+        self.load()
+        self.notify_overdue()
+        if self.watch:
+            self.watcher = watch_folder(os.getcwd(), self._wake.set)
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                self.poll_changes()
+                self.run_pending()
+                self._wake.wait(self.wait_seconds())
+        finally:
+            if self.watcher is not None:
+                self.watcher.stop()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def main(argv=None):
+    from notifier import DBusNotifier, PrintNotifier, available
+    parser = argparse.ArgumentParser(description="Thing Tracker notifications without the window")
+    parser.add_argument("--backend", choices=["dbus", "print"], default="dbus" if available() else "print")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS,
+                        help="seconds between task file checks when watchdog isn't installed")
+    parser.add_argument("--dir", help="folder with tracked_items.json, defaults to the current one")
+    args = parser.parse_args(argv)
+    if args.dir:
+        os.chdir(args.dir)
+    backend = DBusNotifier() if args.backend == "dbus" else PrintNotifier()
+    daemon = NotificationDaemon(backend, poll_seconds=args.poll)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, timedelta
+from recurrence import Series, STEP_DAYS, is_recurring, as_date, days_in_month
+
+
+class OccurrenceIndex:
+    # tasks bucketed by day so the calendar window and the per-day counts are lookups.
+    # one-off tasks sit in a bucket for their due day, recurring ones in a sorted list of
+    # anchors per (step, phase), a day's count is a bisect in each list that can land on it
+    def __init__(self, items=()):
+        self._always = {}     # id -> task without a due or start date, shown for any window
+        self._days = {}       # due ordinal -> {id: task}, one-off tasks
+        self._day_keys = []   # sorted ordinals that have a bucket
+        self._series = {}     # id -> Series
+        self._anchors = {}    # (step kind, phase) -> sorted due ordinals of series anchors
+        self._shifts = {}     # due ordinal -> occurrences skipped or moved off (-) and moved onto (+) it
+        self._entries = {}    # id -> what the task was filed under, for removal
+        self._today = None    # day the cached current occurrences below are for
+        self._current = {}    # id -> occurrence shown while the window ends on or after today
+        self._previous = set()  # ids whose current occurrence is already due
+        self._upcoming = []   # sorted (due ordinal, id) for the rest
+        for item in items:
+            self._add(item, sort=False)
+        self._day_keys.sort()
+        for anchors in self._anchors.values():
+            anchors.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _anchor_key(recurrence, due):
+        if recurrence in STEP_DAYS:
+            step = STEP_DAYS[recurrence]
+            return recurrence, due.toordinal() % step
+        if recurrence == "Monthly":
+            return recurrence, due.day
+        return recurrence, (due.month, due.day)
+
+    def add(self, item):
+        self._add(item, sort=True)
+
+    def _add(self, item, sort):
+        key = item.id
+        due, start = item.due, item.start
+        anchor = None
+        if due is None or start is None:
+            # shown for any window and counted on no day, recurring or not, as generate_recurrences has it
+            self._always[key] = item
+        elif not is_recurring(item.recurrence):
+            ordinal = due.toordinal()
+            bucket = self._days.get(ordinal)
+            if bucket is None:
+                bucket = self._days[ordinal] = {}
+                if sort:
+                    insort(self._day_keys, ordinal)
+                else:
+                    self._day_keys.append(ordinal)
+            bucket[key] = item
+        else:
+            series = self._series[key] = Series(item)
+            if series.gone:
+                shifts = [(day.toordinal(), -1) for day in series.gone]
+                shifts += [(occurrence.due.toordinal(), 1) for occurrence in series.moved]
+                self._shift(shifts)
+            if self._today is not None:
+                self._file_current(key)
+            anchor = self._anchor_key(item.recurrence, due)
+            anchors = self._anchors.setdefault(anchor, [])
+            if sort:
+                insort(anchors, due.toordinal())
+            else:
+                anchors.append(due.toordinal())
+        self._entries[key] = (due.toordinal() if due is not None else None, anchor)
+
+    def remove(self, item):
+        key = item.id
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        ordinal, anchor = entry
+        self._always.pop(key, None)
+        series = self._series.pop(key, None)
+        if series is not None:
+            self._unfile_current(key)
+            if series.gone:
+                shifts = [(day.toordinal(), 1) for day in series.gone]
+                shifts += [(occurrence.due.toordinal(), -1) for occurrence in series.moved]
+                self._shift(shifts)
+        elif ordinal is not None and key in self._days.get(ordinal, ()):
+            bucket = self._days[ordinal]
+            del bucket[key]
+            if not bucket:
+                del self._days[ordinal]
+                del self._day_keys[bisect_left(self._day_keys, ordinal)]
+        if anchor is not None:
+            anchors = self._anchors[anchor]
+            del anchors[bisect_left(anchors, ordinal)]
+
+    def update(self, item):
+        self.remove(item)
+        self.add(item)
+
+    def _shift(self, shifts):
+        for ordinal, change in shifts:
+            count = self._shifts.get(ordinal, 0) + change
+            if count:
+                self._shifts[ordinal] = count
+            else:
+                del self._shifts[ordinal]
+
+    def _file_current(self, key):
+        # what Series.current(today, until) gives for any until >= today
+        series = self._series[key]
+        occurrence = series.previous(self._today)
+        if occurrence is not None:
+            self._previous.add(key)
+        else:
+            occurrence = series.next(self._today)
+            insort(self._upcoming, (occurrence.due.toordinal(), key))
+        self._current[key] = occurrence
+
+    def _unfile_current(self, key):
+        occurrence = self._current.pop(key, None)
+        if occurrence is None:
+            return
+        if key in self._previous:
+            self._previous.discard(key)
+        else:
+            del self._upcoming[bisect_left(self._upcoming, (occurrence.due.toordinal(), key))]
+
+    def _set_today(self, today):
+        if today == self._today:
+            return
+        self._today = today
+        self._current, self._previous, self._upcoming = {}, set(), []
+        for key in self._series:
+            self._file_current(key)
+
+    def window(self, from_date, to_date, today=None):
+        # (task, occurrence) pairs for the list, the same ones MainWindow.generate_recurrences picks
+        from_day, to_day = as_date(from_date), as_date(to_date)
+        today = as_date(today) if today is not None else date.today()
+        found = [(task, task) for task in self._always.values()]
+        keys = self._day_keys
+        first, last = bisect_left(keys, from_day.toordinal()), bisect_right(keys, to_day.toordinal())
+        for position in range(first, last):
+            found.extend((task, task) for task in self._days[keys[position]].values())
+        if to_day < today:
+            # a window ending in the past isn't cached, work it out series by series
+            for series in self._series.values():
+                occurrence = series.current(today, to_day)
+                if occurrence is not None:
+                    found.append((series.task, occurrence))
+            return found
+        self._set_today(today)
+        current = self._current
+        found.extend((self._series[key].task, current[key]) for key in self._previous)
+        last = bisect_left(self._upcoming, (to_day.toordinal() + 1,))
+        found.extend((self._series[key].task, current[key]) for _, key in self._upcoming[:last])
+        return found
+
+    def count_on(self, day):
+        # tasks falling due on day, recurring ones counted for every occurrence their exceptions leave there
+        ordinal = day.toordinal()
+        count = len(self._days.get(ordinal, ())) + self._shifts.get(ordinal, 0)
+        for recurrence, step in STEP_DAYS.items():
+            count += bisect_right(self._anchors.get((recurrence, ordinal % step), ()), ordinal)
+        count += bisect_right(self._anchors.get(("Monthly", day.day), ()), ordinal)
+        month_length = days_in_month(day.year, day.month)
+        if day.day == month_length:
+            # anchors later in the month than this month has days clamp to its last day
+            for later in range(day.day + 1, 32):
+                count += bisect_right(self._anchors.get(("Monthly", later), ()), ordinal)
+        count += bisect_right(self._anchors.get(("Yearly", (day.month, day.day)), ()), ordinal)
+        if day.month == 2 and day.day == 28 and month_length == 28:
+            count += bisect_right(self._anchors.get(("Yearly", (2, 29)), ()), ordinal)
+        return count
+
+    def counts(self, first, last):
+        # {day: count} for first..last inclusive, days with nothing left out
+        first, last = as_date(first), as_date(last)
+        found = {}
+        for offset in range((last - first).days + 1):
+            day = first + timedelta(days=offset)
+            count = self.count_on(day)
+            if count:
+                found[day] = count
+        return found
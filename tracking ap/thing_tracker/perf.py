@@ -0,0 +1,145 @@
+import os
+import csv
+import json
+import math
+import atexit
+import threading
+import functools
+from time import perf_counter_ns
+from collections import deque
+
+# THING_TRACKER_PERF=1 turns timing on, a .json or .csv path also writes the trace there on exit
+SETTING = os.environ.get("THING_TRACKER_PERF", "")
+ENABLED = SETTING not in ("", "0")
+BUCKETS_PER_OCTAVE = 8  # bucket edges 2^(1/8) apart, so percentiles are within about 9%
+MAX_EVENTS = 100000     # spans kept for the trace file, oldest dropped first
+
+
+class Histogram:
+    # log-bucketed durations in ns, fixed size however many samples go in
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = {}
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        bucket = int(math.log2(ns) * BUCKETS_PER_OCTAVE) if ns > 0 else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        # upper edge of the bucket the sample falls in, never above the real max
+        if not self.count:
+            return 0
+        rank = math.ceil(self.count * fraction)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(int(2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE)), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50_ms": self.percentile(0.5) / 1e6,
+            "p95_ms": self.percentile(0.95) / 1e6,
+            "max_ms": self.max / 1e6,
+            "total_ms": self.total / 1e6,
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+_events = deque(maxlen=MAX_EVENTS)  # (name, start ns, duration ns, thread name)
+_origin = perf_counter_ns()
+
+
+def record(name, start, duration):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(duration)
+        _events.append((name, start - _origin, duration, threading.current_thread().name))
+
+
+def timed(name):
+    # decorator; when timing is off the function comes back untouched, so it costs nothing
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, start, perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+
+class span:
+    # with span("name"): for blocks that aren't a whole function
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns() if ENABLED else 0
+        return self
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            record(self.name, self.start, perf_counter_ns() - self.start)
+        return False
+
+
+def stats():
+    # operation -> count, p50/p95/max/total in ms
+    with _lock:
+        return {name: histogram.summary() for name, histogram in sorted(_histograms.items())}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _events.clear()
+
+
+def export(path):
+    # .csv gets one row per span, anything else a Chrome trace (chrome://tracing, Perfetto) with the stats
+    with _lock:
+        events = list(_events)
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["operation", "start_ms", "duration_ms", "thread"])
+            for name, start, duration, thread in events:
+                writer.writerow([name, f"{start / 1e6:.3f}", f"{duration / 1e6:.3f}", thread])
+    else:
+        trace = [{"name": name, "ph": "X", "ts": start / 1000, "dur": duration / 1000,
+                  "pid": os.getpid(), "tid": thread} for name, start, duration, thread in events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "stats": stats()}, f)
+    return len(events)
+
+
+def _export_on_exit():
+    try:
+        export(SETTING)
+    except OSError as e:
+        print("Writing the perf trace failed:", e)
+
+
+if ENABLED and SETTING.lower().endswith((".json", ".csv")):
+    atexit.register(_export_on_exit)
@@ -0,0 +1,67 @@
+from PyQt5.QtWidgets import (
+    QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
+    QTableWidget, QTableWidgetItem, QFileDialog, QHeaderView
+)
+from PyQt5.QtCore import Qt, QTimer
+import perf
+
+COLUMNS = ["Operation", "Count", "p50 ms", "p95 ms", "Max ms", "Total ms"]
+REFRESH_MS = 1000
+
+
+class PerfPanel(QDockWidget):
+    # the perf histograms as a table, only created when THING_TRACKER_PERF is set
+    def __init__(self, parent=None):
+        super().__init__("Perf", parent)
+        body = QWidget()
+        layout = QVBoxLayout()
+        body.setLayout(layout)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        buttons.addWidget(reset_button)
+        export_button = QPushButton("Export Trace")
+        export_button.clicked.connect(self.export_trace)
+        buttons.addWidget(export_button)
+        layout.addLayout(buttons)
+        self.setWidget(body)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_MS)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        stats = perf.stats()
+        self.table.setRowCount(len(stats))
+        for row, (name, summary) in enumerate(stats.items()):
+            values = [name, str(summary["count"])] + [
+                f"{summary[key]:.3f}" for key in ("p50_ms", "p95_ms", "max_ms", "total_ms")]
+            for column, value in enumerate(values):
+                cell = QTableWidgetItem(value)
+                if column:
+                    cell.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, cell)
+
+    def reset(self):
+        perf.reset()
+        self.refresh()
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "thing_tracker_trace.json",
+                                              "Chrome trace (*.json);;CSV (*.csv)")
+        if not path:
+            return
+        try:
+            perf.export(path)
+        except OSError as e:
+            print("Writing the perf trace failed:", e)
@@ -0,0 +1,121 @@
+import threading
+import time
+import traceback
+import storage
+
+DEBOUNCE_SECONDS = 0.25
+MAX_DELAY_SECONDS = 2.0  # a steady stream of edits still hits the disk this often
+MAX_RETRY_SECONDS = 5.0  # longest wait between tries at a batch that keeps failing
+
+
+class WriteBehind:
+    # journals edits on a background thread, bursts of edits become one write
+    def __init__(self, delay=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS, backend=None):
+        self.backend = backend or storage  # storage or sqlite_storage, see backend.py
+        self.delay = delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._queue = []
+        self._submitted = 0   # records handed to the worker
+        self._written = 0     # records on disk, counts since seqs get renumbered when another process got in first
+        self._due = 0.0
+        self._deadline = 0.0
+        self._flushing = False
+        self._closed = False
+        self._thread = None
+
+    def submit(self, records):
+        # returns how many records were submitted up to these, see written()
+        with self._cond:
+            if not records:
+                return self._submitted
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            self.backend.stamp(records)
+            self._submitted += len(records)
+            now = time.monotonic()
+            if not self._queue:
+                self._deadline = now + self.max_delay
+            self._queue.extend(records)
+            self._due = min(now + self.delay, self._deadline)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="thing-tracker-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return self._submitted
+
+    def pending(self):
+        with self._cond:
+            return self._submitted - self._written
+
+    def written(self):
+        # records are written in the order they were submitted, so a submit()'s records are on
+        # disk with their final seqs once this reaches what it returned
+        with self._cond:
+            return self._written
+
+    def flush(self, timeout=None):
+        # blocks until everything submitted so far is on disk
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted
+            self._flushing = True
+            self._cond.notify_all()
+            while self._written < target:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout=5.0):
+        done = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return done
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            while self._queue and not self._flushing and not self._closed:
+                remaining = self._due - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            records, self._queue = self._queue, []
+            if not self._queue:
+                self._flushing = False
+            return records
+
+    def _run(self):
+        retry = self.delay
+        while True:
+            records = self._take_batch()
+            if not records:
+                return
+            try:
+                compact_due = self.backend.append_records(records)
+            except Exception as e:
+                # OSError is the disk or another process holding the lock, anything else a bug.
+                # Either way the batch stays queued, the thread dying would lose it and hang flush()
+                if not isinstance(e, OSError):
+                    traceback.print_exc()
+                print("Saving tasks failed, retrying:", e)
+                with self._cond:
+                    self._queue[:0] = records
+                time.sleep(retry)
+                retry = min(retry * 2, MAX_RETRY_SECONDS)
+                continue
+            retry = self.delay
+            if compact_due:
+                try:
+                    self.backend.compact()
+                except Exception as e:
+                    print("Compacting tasks failed:", e)
+            with self._cond:
+                self._written += len(records)
+                self._cond.notify_all()
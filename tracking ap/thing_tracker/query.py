@@ -0,0 +1,277 @@
+import re
+from datetime import date, timedelta
+from perf import timed
+from search_index import tokenize, contains
+from tracker_model import Priority
+
+# tag:work priority:High due<2026-12-01 done:no start>=today, anything else is searched as text
+TERM_RE = re.compile(r'(\w+)(<=|>=|<|>|=|:)("[^"]*"|\S+)|(\S+)')
+DATE_FIELDS = ("due", "start")
+FIELDS = DATE_FIELDS + ("tag", "priority", "done")
+YES = {"yes", "y", "true", "1"}
+NO = {"no", "n", "false", "0"}
+RELATIVE_RE = re.compile(r"today([+-]\d+)$")
+PRIORITY_BY_LOWER = {priority.name.lower(): priority for priority in Priority}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class QueryCancelled(Exception):
+    # Plan.run stopped between steps because a newer query made this one pointless
+    pass
+
+
+class Term:
+    __slots__ = ("field", "op", "value", "text")
+
+    def __init__(self, field, op, value, text):
+        self.field = field
+        self.op = op
+        self.value = value
+        self.text = text
+
+    def __repr__(self):
+        return f"Term({self.text!r})"
+
+
+def parse_day(value, today):
+    value = value.lower()
+    match = RELATIVE_RE.match(value)
+    try:
+        if value == "today":
+            return today
+        if value == "tomorrow":
+            return today + timedelta(days=1)
+        if value == "yesterday":
+            return today - timedelta(days=1)
+        if match:
+            return today + timedelta(days=int(match.group(1)))
+        return date.fromisoformat(value)
+    except (OverflowError, ValueError):
+        # ValueError for an ISO date that doesn't exist and for too many digits to be an int,
+        # OverflowError for a day past year 9999
+        raise QueryError(f"{value!r} isn't a day, use YYYY-MM-DD, today, tomorrow or today+N")
+
+
+def parse(text, today=None):
+    # the terms in text, field values already checked and converted. Bare words come back
+    # as one "text" term so they match the way the search bar always did
+    today = today or date.today()
+    terms, words = [], []
+    for match in TERM_RE.finditer(text):
+        name, op, value, word = match.groups()
+        if word is not None or name.lower() not in FIELDS:
+            words.append(match.group(0))
+            continue
+        name = name.lower()
+        value = value[1:-1] if value.startswith('"') else value
+        if name in DATE_FIELDS:
+            try:
+                day = parse_day(value, today)
+            except QueryError as e:
+                raise QueryError(f"{match.group(0)}: {e}")
+            terms.append(Term(name, op, day.toordinal(), match.group(0)))
+        elif name == "tag":
+            if op not in (":", "="):
+                raise QueryError(f"{match.group(0)}: tags only match exactly, use tag:{value}")
+            terms.append(Term(name, op, value, match.group(0)))
+        elif name == "priority":
+            level = PRIORITY_BY_LOWER.get(value.lower())
+            if level is None:
+                raise QueryError(f"{match.group(0)}: priority is one of {', '.join(PRIORITY_BY_LOWER)}")
+            terms.append(Term(name, op, level, match.group(0)))
+        else:
+            if op not in (":", "=") or value.lower() not in YES | NO:
+                raise QueryError(f"{match.group(0)}: use done:yes or done:no")
+            terms.append(Term(name, op, value.lower() in YES, match.group(0)))
+    if words:
+        terms.append(Term("text", ":", " ".join(words), " ".join(words)))
+    return terms
+
+
+def date_bounds(op, ordinal):
+    # inclusive (first, last) ordinals, None for an open end
+    if op == "<":
+        return None, ordinal - 1
+    if op == "<=":
+        return None, ordinal
+    if op == ">":
+        return ordinal + 1, None
+    if op == ">=":
+        return ordinal, None
+    return ordinal, ordinal
+
+
+def priority_levels(op, level):
+    if op == "<":
+        return [p for p in Priority if p < level]
+    if op == "<=":
+        return [p for p in Priority if p <= level]
+    if op == ">":
+        return [p for p in Priority if p > level]
+    if op == ">=":
+        return [p for p in Priority if p >= level]
+    return [level]
+
+
+def matches(term, item):
+    # one term checked against one task, for the linear scan
+    if term.field in DATE_FIELDS:
+        day = item.due if term.field == "due" else item.start
+        if day is None:
+            return False
+        first, last = date_bounds(term.op, term.value)
+        ordinal = day.toordinal()
+        return (first is None or ordinal >= first) and (last is None or ordinal <= last)
+    if term.field == "tag":
+        wanted = term.value.strip().lower()
+        return any(tag.strip().lower() == wanted for tag in item.tags)
+    if term.field == "priority":
+        return item.level in priority_levels(term.op, term.value)
+    if term.field == "done":
+        return bool(item.completed) == term.value
+    words = tokenize(term.value)
+    if not words:
+        return contains(item, term.value.lower())
+    tokens = tokenize(item.name)
+    for tag in item.tags:
+        tokens += tokenize(tag)
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+def linear_scan(text, items, today=None):
+    # what a query matches, found by checking every task. Slow, it's what plans get compared against
+    terms = parse(text, today)
+    return [item for item in items if all(matches(term, item) for term in terms)]
+
+
+class Step:
+    # one term with how it gets its ids (fetch) or checks a candidate (probe), and an exact count
+    __slots__ = ("term", "method", "estimate", "fetch", "probe", "bitmap", "action", "rows")
+
+    def __init__(self, term, method, estimate, fetch, probe, bitmap=None):
+        self.term = term
+        self.method = method
+        self.estimate = estimate
+        self.fetch = fetch
+        self.probe = probe
+        self.bitmap = bitmap  # returns the step's bitmap as an int, bitmap steps only
+        self.action = ""
+        self.rows = None
+
+
+def _range_step(column, terms, fields):
+    # every term on one date column narrows a single range, so due>=x due<y is one bounded scan
+    first = last = None
+    for term in terms:
+        low, high = date_bounds(term.op, term.value)
+        if low is not None and (first is None or low > first):
+            first = low
+        if high is not None and (last is None or high < last):
+            last = high
+
+    def probe(item_id):
+        ordinal = fields.date_of(column, item_id)
+        return ordinal is not None and (first is None or ordinal >= first) and (last is None or ordinal <= last)
+    term = Term(column, None, (first, last), " ".join(term.text for term in terms))
+    return Step(term, f"{column} range scan", fields.range_count(column, first, last),
+                lambda: fields.range_ids(column, first, last), probe)
+
+
+def _step(term, store):
+    fields = store.field_index
+    if term.field in ("priority", "done"):
+        if term.field == "priority":
+            keys = [("priority", level) for level in priority_levels(term.op, term.value)]
+        else:
+            keys = [("done", term.value)]
+        return Step(term, f"{term.field} bitmap", fields.bitmap_count(keys),
+                    lambda: fields.bitmap_ids(fields.bitmap(keys)),
+                    lambda item_id: fields.in_bitmap(keys, item_id),
+                    lambda: fields.bitmap(keys))
+    if term.field == "tag":
+        keys = store.search_index.tag_keys(term.value)
+        return Step(term, "tag posting", len(keys), lambda: set(keys), keys.__contains__)
+    # the prefix scan has to run to know the count, the plan keeps what it found
+    keys = store.search_index.match_keys(term.value)
+    return Step(term, "text index", len(keys), lambda: keys, keys.__contains__)
+
+
+class Plan:
+    # the terms ordered smallest first: the first one's ids are fetched, later ones are fetched
+    # and intersected while they're no bigger than what's left, otherwise each candidate is probed.
+    # When the smallest is a bitmap every bitmap term gets ANDed in one go instead
+    def __init__(self, text, steps, fields):
+        self.text = text
+        self.fields = fields
+        self.steps = sorted(steps, key=lambda step: step.estimate)
+        self.ran = False
+
+    @timed("query")
+    def run(self, cancelled=None):
+        # cancelled, when given, is checked before every step and raises QueryCancelled once it's true
+        steps = self.steps
+        self.ran = True
+        if not steps:
+            return None  # nothing to filter on
+        if cancelled is not None and cancelled():
+            raise QueryCancelled(self.text)
+        if steps[0].bitmap is not None:
+            bitmaps = [step for step in steps if step.bitmap is not None]
+            combined = bitmaps[0].bitmap()
+            for step in bitmaps[1:]:
+                if not combined:
+                    break
+                combined &= step.bitmap()
+            candidates = self.fields.bitmap_ids(combined)
+            for step in bitmaps:
+                step.action, step.rows = "AND", len(candidates)
+            rest = [step for step in steps if step.bitmap is None]
+            self.steps = bitmaps + rest  # the order they ran in, for explain
+        else:
+            candidates = set(steps[0].fetch())
+            steps[0].action, steps[0].rows = "fetch", len(candidates)
+            rest = steps[1:]
+        for step in rest:
+            if not candidates:
+                step.action, step.rows = "skipped", 0
+                continue
+            if cancelled is not None and cancelled():
+                raise QueryCancelled(self.text)
+            if step.estimate <= len(candidates):
+                candidates &= step.fetch()
+                step.action = "fetch and intersect"
+            else:
+                candidates = {item_id for item_id in candidates if step.probe(item_id)}
+                step.action = "probe"
+            step.rows = len(candidates)
+        return candidates
+
+    def explain(self):
+        # one line per term in the order they run; after run() with what each did and rows left
+        lines = [f"query: {self.text}"]
+        if not self.steps:
+            lines.append("  no terms, everything matches")
+        for number, step in enumerate(self.steps, 1):
+            line = f"  {number}. {step.term.text:<24} {step.method:<16} est {step.estimate:>9}"
+            if self.ran:
+                line += f"  {step.action or 'not run'}"
+                if step.rows is not None:
+                    line += f" -> {step.rows}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def compile_query(text, store, today=None):
+    # store is an ItemStore, its search and field indexes answer the terms
+    steps, ranges = [], {}
+    for term in parse(text, today):
+        if term.field in DATE_FIELDS:
+            ranges.setdefault(term.field, []).append(term)
+        else:
+            steps.append(_step(term, store))
+    for column, terms in ranges.items():
+        steps.append(_range_step(column, terms, store.field_index))
+    return Plan(text, steps, store.field_index)
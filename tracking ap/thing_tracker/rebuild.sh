@@ -20,7 +20,7 @@ if [[ -d venv311 ]]; then
     source venv311/bin/activate
 fi
 pyinstaller --onefile updater.py
-pyinstaller --onefile --add-data "ui_main.py:." --add-data "storage.py:." --add-data "notifier.py:." --add-data "tracker_model.py:." --add-data "utils.py:." --add-data "version.txt:." main.py
+pyinstaller --onefile --add-data "ui_main.py:." --add-data "storage.py:." --add-data "notifier.py:." --add-data "tracker_model.py:." --add-data "utils.py:." --add-data "task_list_model.py:." --add-data "search_index.py:." --add-data "recurrence.py:." --add-data "item_store.py:." --add-data "persistence.py:." --add-data "columnar.py:." --add-data "notify_daemon.py:." --add-data "task_cli.py:." --add-data "perf.py:." --add-data "perf_panel.py:." --add-data "occurrence_index.py:." --add-data "field_index.py:." --add-data "query.py:." --add-data "backend.py:." --add-data "sqlite_storage.py:." --add-data "search_worker.py:." --add-data "calendar_export.py:." --add-data "task_service.py:." --add-data "service_client.py:." --add-data "version.txt:." main.py
 echo "*********************************"
 echo "Rebuild complete. Cleaning up..."
 echo "*********************************"
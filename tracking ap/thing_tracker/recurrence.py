@@ -0,0 +1,266 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from tracker_model import parse_date
+
+np = None  # numpy is only imported once a window actually gets expanded
+
+STEP_DAYS = {"Daily": 1, "Weekly": 7, "Fortnightly": 14}
+STEP_MONTHS = {"Monthly": 1, "Yearly": 12}
+DAYS_IN_MONTH = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+OVERRIDE_KEYS = ("done", "skip", "due_date", "start_date")
+
+
+def is_recurring(recurrence):
+    return recurrence in STEP_DAYS or recurrence in STEP_MONTHS
+
+
+def as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def days_in_month(year, month):
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return 29
+    return DAYS_IN_MONTH[month - 1]
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(day.day, days_in_month(year, month)))
+
+
+def occurrence_date(anchor, recurrence, n):
+    # nth occurrence counted from the anchor, month ends clamp per occurrence
+    if recurrence in STEP_DAYS:
+        return anchor + timedelta(days=n * STEP_DAYS[recurrence])
+    return add_months(anchor, n * STEP_MONTHS[recurrence])
+
+
+def index_on_or_before(anchor, recurrence, day):
+    # largest n with occurrence_date(n) <= day, -1 when the series starts later
+    if day < anchor:
+        return -1
+    if recurrence in STEP_DAYS:
+        return (day - anchor).days // STEP_DAYS[recurrence]
+    step = STEP_MONTHS[recurrence]
+    n = ((day.year - anchor.year) * 12 + day.month - anchor.month) // step
+    if occurrence_date(anchor, recurrence, n) > day:
+        n -= 1
+    return n
+
+
+def set_override(task, original, **changes):
+    # records an exception for the occurrence first due on original: done=True, skip=True or a
+    # new due_date/start_date. None or False takes that part back out. Entries get replaced,
+    # never changed in place, records already handed to the writer share them
+    key = as_date(original).isoformat()
+    overrides = dict(task.overrides or {})
+    entry = dict(overrides.get(key, {}))
+    for name, value in changes.items():
+        if name not in OVERRIDE_KEYS:
+            raise ValueError(f"{name} isn't something an occurrence can override")
+        if value is None or value is False:
+            entry.pop(name, None)
+        else:
+            entry[name] = value
+    if entry:
+        overrides[key] = entry
+    else:
+        overrides.pop(key, None)
+    task.overrides = overrides or None
+
+
+def clear_override(task, original):
+    # puts the occurrence back the way the pattern has it
+    overrides = dict(task.overrides or {})
+    overrides.pop(as_date(original).isoformat(), None)
+    task.overrides = overrides or None
+
+
+class Occurrence:
+    # one date of a recurring task, everything but the dates comes from the task.
+    # original is the due date the pattern gives it, what its override is keyed by
+    __slots__ = ("task", "due", "start", "completed", "original")
+
+    def __init__(self, task, due, start, completed=False, original=None):
+        self.task = task
+        self.due = due
+        self.start = start
+        self.completed = completed
+        self.original = original or due
+
+    @property
+    def due_date(self):
+        return self.due.isoformat()
+
+    @property
+    def start_date(self):
+        return self.start.isoformat()
+
+    @property
+    def name(self):
+        return self.task.name
+
+    @property
+    def tags(self):
+        return self.task.tags
+
+    @property
+    def start_time(self):
+        return self.task.start_time
+
+    @property
+    def end_time(self):
+        return self.task.end_time
+
+    @property
+    def priority(self):
+        return self.task.priority
+
+    @property
+    def recurrence(self):
+        return self.task.recurrence
+
+    @property
+    def fields(self):
+        return self.task.fields
+
+    def __repr__(self):
+        return f"Occurrence({self.task.name!r}, due={self.due_date})"
+
+
+class Series:
+    # a recurring task with its anchors and exceptions parsed once. Everything below costs the
+    # same as without exceptions plus a step per exception, never a walk over the occurrences
+    __slots__ = ("task", "recurrence", "due", "start", "done", "gone", "moved", "moved_dues")
+
+    def __init__(self, task):
+        self.task = task
+        self.recurrence = task.recurrence
+        self.due = task.due
+        self.start = task.start
+        self.done = set()   # original due dates ticked off
+        self.gone = set()   # original due dates with nothing on them: skipped or moved away
+        self.moved = []     # occurrences on a day of their own, sorted by due
+        self.moved_dues = []  # their due dates, for bisecting
+        if task.overrides:
+            self._read_overrides(task.overrides)
+
+    def _read_overrides(self, overrides):
+        for key, entry in overrides.items():
+            original = parse_date(key)
+            n = index_on_or_before(self.due, self.recurrence, original) if original is not None else -1
+            if n < 0 or occurrence_date(self.due, self.recurrence, n) != original:
+                continue  # the series' dates changed since, it no longer lands there
+            if entry.get("skip"):
+                self.gone.add(original)
+                continue
+            start = occurrence_date(self.start, self.recurrence, n)
+            new_due = parse_date(entry.get("due_date")) or original
+            new_start = parse_date(entry.get("start_date")) or start
+            if (new_due, new_start) != (original, start):
+                self.gone.add(original)
+                self.moved.append(Occurrence(self.task, new_due, new_start, bool(entry.get("done")), original))
+            elif entry.get("done"):
+                self.done.add(original)
+        self.moved.sort(key=lambda occurrence: occurrence.due)
+        self.moved_dues = [occurrence.due for occurrence in self.moved]
+
+    def occurrence(self, n):
+        due = occurrence_date(self.due, self.recurrence, n)
+        return Occurrence(self.task, due, occurrence_date(self.start, self.recurrence, n), due in self.done)
+
+    def _regular(self, n, step):
+        # the nearest n in step's direction whose occurrence is still on its own day
+        while n >= 0 and self.gone and occurrence_date(self.due, self.recurrence, n) in self.gone:
+            n += step
+        return n
+
+    def previous(self, day):
+        # the latest occurrence due on or before day
+        day = as_date(day)
+        n = self._regular(index_on_or_before(self.due, self.recurrence, day), -1)
+        found = self.occurrence(n) if n >= 0 else None
+        position = bisect_right(self.moved_dues, day)
+        if position and (found is None or self.moved_dues[position - 1] > found.due):
+            found = self.moved[position - 1]
+        return found
+
+    def next(self, day):
+        # the first occurrence due after day
+        day = as_date(day)
+        found = self.occurrence(self._regular(index_on_or_before(self.due, self.recurrence, day) + 1, 1))
+        position = bisect_right(self.moved_dues, day)
+        if position < len(self.moved) and self.moved_dues[position] < found.due:
+            found = self.moved[position]
+        return found
+
+    def following(self, day):
+        # every occurrence due on or after day in date order, it never runs out
+        day = as_date(day)
+        moved = self.moved
+        position = bisect_left(self.moved_dues, day)
+        n = index_on_or_before(self.due, self.recurrence, day - timedelta(days=1)) + 1
+        while True:
+            n = self._regular(n, 1)
+            occurrence = self.occurrence(n)
+            while position < len(moved) and moved[position].due <= occurrence.due:
+                yield moved[position]
+                position += 1
+            yield occurrence
+            n += 1
+
+    def current(self, today, until):
+        # the latest occurrence already due, otherwise the first one coming up
+        today, until = as_date(today), as_date(until)
+        previous = self.previous(min(today, until))
+        if previous is not None:
+            return previous
+        upcoming = self.next(today)
+        return upcoming if upcoming.due <= until else None
+
+    def between(self, from_day, to_day):
+        from_day, to_day = as_date(from_day), as_date(to_day)
+        first = index_on_or_before(self.due, self.recurrence, from_day - timedelta(days=1)) + 1
+        last = index_on_or_before(self.due, self.recurrence, to_day)
+        found = []
+        if last >= first:
+            dues = expand(self.due, self.recurrence, first, last)
+            starts = expand(self.start, self.recurrence, first, last)
+            if not (self.done or self.gone):
+                return [Occurrence(self.task, due, start) for due, start in zip(dues, starts)]
+            found = [Occurrence(self.task, due, start, due in self.done)
+                     for due, start in zip(dues, starts) if due not in self.gone]
+        moved = self.moved[bisect_left(self.moved_dues, from_day):bisect_right(self.moved_dues, to_day)]
+        if moved:
+            found = sorted(found + moved, key=lambda occurrence: occurrence.due)
+        return found
+
+
+def _numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        np = numpy
+    return np
+
+
+def expand(anchor, recurrence, first, last):
+    # occurrences first..last in one batch
+    if not _numpy():
+        return [occurrence_date(anchor, recurrence, n) for n in range(first, last + 1)]
+    steps = np.arange(first, last + 1)
+    if recurrence in STEP_DAYS:
+        dates = np.datetime64(anchor, "D") + steps * STEP_DAYS[recurrence]
+    else:
+        months = np.datetime64(anchor, "M") + steps * STEP_MONTHS[recurrence]
+        month_start = months.astype("datetime64[D]")
+        month_length = (months + 1).astype("datetime64[D]") - month_start
+        day = np.minimum(anchor.day, month_length.astype(int))
+        dates = month_start + (day - 1)
+    return dates.astype(object).tolist()
@@ -0,0 +1,113 @@
+import re
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def contains(item, needle):
+    # the old substring match, for search text without a word in it ("#", "--"), needle lowercased
+    return needle in item.name.lower() or any(needle in tag.lower() for tag in item.tags)
+
+
+class SearchIndex:
+    # inverted index over item names and tags, postings hold item ids
+    def __init__(self, items=()):
+        self._items = {}
+        self._postings = {}   # token -> set of keys
+        self._tokens = []     # sorted distinct tokens, for prefix scans
+        self._tags = {}       # lowercased tag -> set of keys
+        self._item_terms = {} # key -> (tokens, tags) as indexed, so removal doesn't re-tokenize
+        for item in items:
+            self._add(item, sort=False)
+        self._tokens = sorted(self._postings)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        self._add(item, sort=True)
+
+    def add_many(self, items):
+        # one sort for the whole batch instead of an insort per new token
+        for item in items:
+            self._add(item, sort=False)
+        self._tokens = sorted(self._postings)
+
+    def _add(self, item, sort):
+        key = item.id
+        tags = {tag.strip().lower() for tag in item.tags if tag.strip()}
+        tokens = set(tokenize(item.name))
+        for tag in tags:
+            tokens.update(tokenize(tag))
+        self._items[key] = item
+        self._item_terms[key] = (tokens, tags)
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                if sort:
+                    insort(self._tokens, token)
+            posting.add(key)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+    def remove(self, item):
+        key = item.id
+        if key not in self._items:
+            return
+        tokens, tags = self._item_terms.pop(key)
+        del self._items[key]
+        for token in tokens:
+            posting = self._postings[token]
+            posting.discard(key)
+            if not posting:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+        for tag in tags:
+            posting = self._tags[tag]
+            posting.discard(key)
+            if not posting:
+                del self._tags[tag]
+
+    def update(self, item):
+        self.remove(item)
+        self.add(item)
+
+    def _prefix_keys(self, prefix):
+        keys = set()
+        tokens = self._tokens
+        position = bisect_left(tokens, prefix)
+        while position < len(tokens) and tokens[position].startswith(prefix):
+            keys |= self._postings[tokens[position]]
+            position += 1
+        return keys
+
+    def match_keys(self, query):
+        # items with a word starting with each word of the query
+        terms = tokenize(query)
+        if not terms:
+            needle = query.strip().lower()
+            if not needle:
+                return set(self._items)
+            return {key for key, item in self._items.items() if contains(item, needle)}
+        postings = sorted((self._prefix_keys(term) for term in terms), key=len)
+        keys = postings[0]
+        for other in postings[1:]:
+            if not keys:
+                break
+            keys &= other
+        return keys
+
+    def search(self, query):
+        return [self._items[key] for key in self.match_keys(query)]
+
+    def tag_keys(self, tag):
+        # the posting itself, copy it before changing it
+        return self._tags.get(tag.strip().lower(), set())
+
+    def with_tag(self, tag):
+        return [self._items[key] for key in self._tags.get(tag.strip().lower(), ())]
@@ -0,0 +1,82 @@
+import threading
+import traceback
+from PyQt5.QtCore import QObject, pyqtSignal
+from query import QueryError, QueryCancelled
+import perf
+
+FIRST_CHUNK = 256   # rows in the first batch sent back, about a screenful
+CHUNK = 4096        # rows per batch after that
+SCAN_STEP = 8192    # rows checked between looks at whether a newer search came in
+
+
+class SearchWorker(QObject):
+    # runs searches on a thread of its own and sends the matching rows back in chunks.
+    # Only the newest search counts: an older one stops at its next check, and anything
+    # it already sent carries an old generation the window ignores
+    found = pyqtSignal(int, list, bool)   # generation, rows, first chunk of that generation
+    failed = pyqtSignal(int, str)         # generation, why the query couldn't be read
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._job = None
+        self._thread = None
+
+    def search(self, text, rows, today=None):
+        # rows are the list's rows to pick from, returns the generation the results will carry
+        with self._cond:
+            self._generation += 1
+            self._job = (self._generation, text, rows, today)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="thing-tracker-search", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return self._generation
+
+    def cancel(self):
+        with self._cond:
+            self._generation += 1
+            self._job = None
+
+    def _cancelled(self, generation):
+        return generation != self._generation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._job is None:
+                    self._cond.wait()
+                job, self._job = self._job, None
+            try:
+                self._search(*job)
+            except QueryCancelled:
+                pass
+            except Exception as e:
+                # a bug in one search mustn't end the thread, search() wouldn't start another
+                traceback.print_exc()
+                self.failed.emit(job[0], str(e) or type(e).__name__)
+
+    @perf.timed("search")
+    def _search(self, generation, text, rows, today):
+        def cancelled():
+            return self._cancelled(generation)
+        try:
+            ids = self.store.query_ids(text, today, cancelled)
+        except QueryError as e:
+            self.failed.emit(generation, str(e))
+            return
+        if ids is None:
+            self.found.emit(generation, list(rows), True)
+            return
+        batch, first, size = [], True, FIRST_CHUNK
+        for position in range(0, len(rows), SCAN_STEP):
+            if cancelled():
+                raise QueryCancelled(text)
+            batch.extend(row for row in rows[position:position + SCAN_STEP] if row.task.id in ids)
+            while len(batch) >= size:
+                self.found.emit(generation, batch[:size], first)
+                batch, first, size = batch[size:], False, CHUNK
+        if batch or first:
+            self.found.emit(generation, batch, first)
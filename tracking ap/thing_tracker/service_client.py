@@ -0,0 +1,264 @@
+import json
+import queue
+import socket
+import threading
+from contextlib import nullcontext
+from tracker_model import TrackedItem
+from storage import record_id
+
+SOCKET_FILE = "tracked_items.sock"
+
+
+class ServiceError(Exception):
+    # the service read the request and turned it down, connection trouble is an OSError
+    pass
+
+
+def parse_address(value):
+    # "1" or "" is tracked_items.sock in the current folder, host:port a localhost TCP port,
+    # anything else the path of a socket. Returns (family, address) for socket.connect
+    if value in ("", "1"):
+        return socket.AF_UNIX, SOCKET_FILE
+    host, _, port = value.rpartition(":")
+    if port.isdigit() and host in ("localhost", "127.0.0.1", ""):
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, value
+
+
+class ServiceClient:
+    # a blocking connection to task_service.py, safe to share between threads. One reader
+    # thread hands each answer to whoever asked and change events to the watchers
+    def __init__(self, address="", timeout=30.0):
+        self.family, self.address = parse_address(address)
+        self.timeout = timeout
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._waiting = {}   # request id -> queue its messages go to
+        self._watchers = []  # called with each batch of change records, on the reader thread
+        self._subscribed = False
+        self._closed = False
+        self._sock = None
+        self._connect()
+
+    def _connect(self):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            sock.settimeout(None)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile("rb")
+        threading.Thread(target=self._read, args=(self._file,), name="thing-tracker-service", daemon=True).start()
+
+    def _read(self, f):
+        try:
+            for line in f:
+                message = json.loads(line)
+                if "event" in message:
+                    for watcher in list(self._watchers):
+                        watcher(message["records"])
+                    continue
+                with self._lock:
+                    waiting = self._waiting.get(message["id"])
+                if waiting is not None:
+                    waiting.put(message)
+        except (OSError, ValueError) as e:
+            if not self._closed:
+                print("Task service connection lost:", e)
+        with self._lock:
+            waiting, self._waiting = list(self._waiting.values()), {}
+            if self._file is f:
+                self._sock = None
+        for q in waiting:
+            q.put({"error": "connection to the task service closed", "closed": True})
+        for watcher in list(self._watchers):
+            watcher(None)  # None: events may have been missed
+
+    def _send(self, op, args):
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+                resubscribe = self._subscribed
+            else:
+                resubscribe = False
+            self._next_id += 1
+            request_id = self._next_id
+            self._waiting[request_id] = q = queue.Queue()
+        data = (json.dumps({"id": request_id, "op": op, **args}) + "\n").encode()
+        with self._send_lock:
+            if resubscribe:
+                self._sock.sendall(b'{"id": 0, "op": "subscribe"}\n')
+            self._sock.sendall(data)
+        return request_id, q
+
+    def _messages(self, op, args):
+        # every message answering the request, the last one has the result
+        request_id, q = self._send(op, args)
+        try:
+            while True:
+                message = q.get(timeout=self.timeout)
+                if message.get("closed"):
+                    raise ConnectionError(message["error"])
+                if "error" in message:
+                    raise ServiceError(message["error"])
+                yield message
+                if "result" in message:
+                    return
+        except queue.Empty:
+            raise TimeoutError(f"no answer to {op} from the task service in {self.timeout:.0f}s")
+        finally:
+            with self._lock:
+                self._waiting.pop(request_id, None)
+
+    def call(self, op, **args):
+        for message in self._messages(op, args):
+            if "result" in message:
+                return message["result"]
+
+    def records(self, op, **args):
+        # (seq, records) for list and query, the records come in as they're read
+        messages = self._messages(op, args)
+        first = next(messages)
+
+        def pages():
+            message = first
+            while True:
+                yield from message["records"]
+                if "result" in message:
+                    return
+                message = next(messages)
+        return first.get("seq"), pages()
+
+    def list(self, completed=None):
+        return list(self.records("list", completed=completed)[1])
+
+    def query(self, text, today=None):
+        return list(self.records("query", text=text, today=today)[1])
+
+    def get(self, item_id):
+        return self.call("get", task=item_id)
+
+    def add(self, record):
+        return self.call("add", item=record)
+
+    def update(self, record):
+        # record needs an id, fields left out keep their value
+        return self.call("update", item=record)
+
+    def delete(self, item_ids):
+        return self.call("delete", ids=list(item_ids))
+
+    def subscribe(self, watcher):
+        # watcher gets each batch of change records as the journal has them, None after a reconnect
+        self._watchers.append(watcher)
+        if not self._subscribed:
+            self.call("subscribe")
+            self._subscribed = True
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+
+class ServiceBackend:
+    # the task service in the place of storage/sqlite_storage for an ItemStore, so a window
+    # keeps its indexes but never touches the files. Edits are sent in the writer's batches,
+    # the service journals them, and everyone else's come back through take_changes
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._changes = []
+        self._resync = False
+        self._seq = 0
+        self._loaded = 0  # events up to this seq were already in what got loaded
+        self._callbacks = []
+        client.subscribe(self._changed)
+
+    def _changed(self, records):
+        with self._lock:
+            if records is None:
+                self._resync = True
+            else:
+                self._changes.extend(record for record in records if record["seq"] > self._loaded)
+        for callback in self._callbacks:
+            callback()
+
+    def watch(self, callback):
+        # callback runs on the reader thread whenever changes came in
+        self._callbacks.append(callback)
+
+    def load_items_lazy(self, item_type=TrackedItem):
+        seq, active = self.client.records("list", completed=False)
+        self._loaded = seq
+        active = [item_type.from_dict(record) for record in active]
+        _, rest = self.client.records("list", completed=True)
+        return active, (item_type.from_dict(record) for record in rest)
+
+    def load_items(self, item_type=TrackedItem):
+        seq, records = self.client.records("list")
+        self._loaded = seq
+        return [item_type.from_dict(record) for record in records]
+
+    def stream_records(self):
+        try:
+            return self.client.records("list")
+        except OSError:
+            with self._lock:
+                self._resync = True  # still owed once the service is back
+            raise
+
+    def locked(self):
+        return nullcontext()  # the service puts every edit in one order already
+
+    def stamp(self, records):
+        # a stand-in seq until the service hands out the real one in append_records
+        with self._lock:
+            for record in records:
+                self._seq += 1
+                record["seq"] = self._seq
+
+    def append_records(self, records):
+        # connection trouble is an OSError, so WriteBehind keeps the batch and tries again.
+        # Applying a batch twice leaves the same tasks, the service takes adds of known ids as updates.
+        # Edits it turns down are gone, the window then loads the service's copies again
+        try:
+            result = self.client.call("apply", records=[{k: v for k, v in record.items() if k != "seq"}
+                                                        for record in records])
+        except ServiceError as e:
+            print("The task service turned down a batch of edits:", e)
+            self._turned_down()
+            return False
+        for record, seq in zip(records, result["seqs"]):
+            if seq is not None:
+                record["seq"] = seq
+        for index, why in result["rejected"]:
+            print(f"The task service turned down an edit to {record_id(records[index])}:", why)
+        if result["rejected"]:
+            self._turned_down()
+        return False  # the service compacts its own files
+
+    def _turned_down(self):
+        with self._lock:
+            self._resync = True
+        for callback in self._callbacks:
+            callback()
+
+    def compact(self):
+        pass
+
+    def take_changes(self):
+        with self._lock:
+            records, self._changes = self._changes, []
+            resync, self._resync = self._resync, False
+        return records, resync
+
+
+def connect(address=""):
+    return ServiceBackend(ServiceClient(address))
@@ -0,0 +1,525 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List
+import storage
+from perf import timed
+from query import parse, date_bounds, priority_levels, DATE_FIELDS
+from recurrence import is_recurring
+from search_index import tokenize
+from tracker_model import TrackedItem, PRIORITY_BY_NAME, parse_date, new_id
+
+# the storage API over tracked_items.db instead of the json file and journal, see backend.py
+DB_FILE = "tracked_items.db"
+STORAGE_FILE = DB_FILE           # what a file watcher should look at, as in storage
+JOURNAL_FILE = DB_FILE + "-wal"  # every commit lands here first
+COMPACT_AFTER = storage.COMPACT_AFTER
+KEEP_CHANGES = 10000  # change rows kept for instances that haven't read them yet, further behind means a resync
+BATCH_SIZE = 10000
+PAGE_SIZE = 2000      # rows fetched per query while streaming
+UNDATED, ONE_OFF, RECURRING = 0, 1, 2  # the kind column, the same split OccurrenceIndex makes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    pos INTEGER PRIMARY KEY,  -- insertion order, an update keeps its place like in the json file
+    id TEXT NOT NULL UNIQUE,
+    record TEXT NOT NULL,     -- the task as saved, so a load gives back exactly what was stored
+    kind INTEGER NOT NULL,
+    due INTEGER,              -- date ordinals, NULL when missing or not a date
+    start INTEGER,
+    completed INTEGER NOT NULL,
+    priority INTEGER
+);
+CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (tag, id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS words (word TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (word, id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY, record TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+# dropped while a full rewrite copies everything in, building them afterwards is a sort instead
+# of a random insert per row
+INDEXES = {
+    "tasks_window": "CREATE INDEX IF NOT EXISTS tasks_window ON tasks (completed, kind, due)",
+    "tasks_due": "CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due)",
+    "tasks_start": "CREATE INDEX IF NOT EXISTS tasks_start ON tasks (start)",
+    "tags_id": "CREATE INDEX IF NOT EXISTS tags_id ON tags (id)",
+    "words_id": "CREATE INDEX IF NOT EXISTS words_id ON words (id)",
+}
+
+# a full rewrite fills these first, the records it's given may still be reading the real tables
+SHADOW_SCHEMA = [
+    "CREATE TEMP TABLE new_tasks (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, record TEXT NOT NULL, "
+    "kind INTEGER NOT NULL, due INTEGER, start INTEGER, completed INTEGER NOT NULL, priority INTEGER)",
+    "CREATE TEMP TABLE new_tags (tag TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (tag, id)) WITHOUT ROWID",
+    "CREATE INDEX temp.new_tags_id ON new_tags (id)",
+    "CREATE TEMP TABLE new_words (word TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (word, id)) WITHOUT ROWID",
+    "CREATE INDEX temp.new_words_id ON new_words (id)",
+]
+TABLES = ("tasks", "tags", "words")
+
+
+def _statements(prefix):
+    # the same text every time, so sqlite3's statement cache keeps each one prepared
+    return {
+        "upsert": f"INSERT INTO {prefix}tasks (id, record, kind, due, start, completed, priority) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET record = excluded.record, "
+                  "kind = excluded.kind, due = excluded.due, start = excluded.start, "
+                  "completed = excluded.completed, priority = excluded.priority",
+        "delete": f"DELETE FROM {prefix}tasks WHERE id = ?",
+        "tag": f"INSERT OR IGNORE INTO {prefix}tags VALUES (?, ?)",
+        "untag": f"DELETE FROM {prefix}tags WHERE id = ?",
+        "word": f"INSERT OR IGNORE INTO {prefix}words VALUES (?, ?)",
+        "unword": f"DELETE FROM {prefix}words WHERE id = ?",
+    }
+
+
+MAIN = _statements("")
+SHADOW = _statements("new_")
+GET_META = "SELECT value FROM meta WHERE key = ?"
+SET_META = "INSERT INTO meta VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+INSERT_CHANGE = "INSERT INTO changes VALUES (?, ?)"
+SELECT_CHANGES = "SELECT seq, record FROM changes WHERE seq > ? ORDER BY seq"
+SELECT_PAGE = "SELECT pos, record FROM tasks WHERE pos > ? ORDER BY pos LIMIT ?"
+SELECT_UNFINISHED = "SELECT record FROM tasks WHERE completed = 0 ORDER BY pos"
+# the three kinds each get their own range on tasks_window, OR would make sqlite scan
+SELECT_WINDOW = (
+    "SELECT pos, record FROM tasks WHERE completed = ? AND kind = 0 "
+    "UNION ALL SELECT pos, record FROM tasks WHERE completed = ? AND kind = 1 AND due BETWEEN ? AND ? "
+    "UNION ALL SELECT pos, record FROM tasks WHERE completed = ? AND kind = 2 AND due <= ? "
+    "ORDER BY pos"
+)
+
+_lock = threading.Lock()
+_seq = 0        # seq of the last record written
+_pending = 0    # change rows written since the last compact
+
+# everything below is only touched inside locked()
+_db_lock = threading.RLock()
+_db = None
+_depth = 0
+_disk_seq = 0
+_incoming = []
+_resync = False
+
+
+def _meta(db, key):
+    row = db.execute(GET_META, (key,)).fetchone()
+    return row[0] if row else 0
+
+
+def _connect():
+    # one connection for the process, shared by the writer thread under _db_lock
+    global _db
+    if _db is None:
+        db = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")  # a commit is on disk like a journal append after its fsync
+        db.executescript(SCHEMA + ";\n".join(INDEXES.values()) + ";")
+        _db = db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            migrated = None
+            if db.execute(GET_META, ("seq",)).fetchone() is None:
+                migrated = _migrate(db)
+                db.execute(SET_META, ("seq", _meta(db, "seq")))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            _db = None
+            db.close()
+            raise
+        if migrated is not None:
+            _retire_json(migrated)
+    return _db
+
+
+def _migrate(db):
+    # a new database takes over tracked_items.json and its journal once, under the json lock
+    # so no instance still on the json files writes in between. Returns the task count
+    if not (os.path.exists(storage.STORAGE_FILE) or os.path.exists(storage.JOURNAL_FILE)):
+        return None
+    with storage.locked():
+        seq, records = storage.stream_records()
+        return _rewrite(db, records, BATCH_SIZE, seq)
+
+
+def _retire_json(count):
+    # renamed rather than deleted, and only after the commit. The meta row is what marks a
+    # database as migrated, so a failed rename leaves nothing half done
+    for name in (storage.STORAGE_FILE, storage.JOURNAL_FILE, storage.PREVIOUS_JOURNAL_FILE):
+        if os.path.exists(name):
+            try:
+                os.replace(name, name + ".migrated")
+            except OSError as e:
+                print(f"Couldn't rename {name} after moving it into {DB_FILE}:", e)
+    if os.path.exists(storage.INDEX_FILE):
+        os.remove(storage.INDEX_FILE)
+    print(f"Moved {count} tasks from {storage.STORAGE_FILE} into {DB_FILE}")
+
+
+@contextmanager
+def locked():
+    # one write transaction for the block, other processes wait for it. Nests within a process,
+    # an exception anywhere inside rolls the whole thing back. sqlite's operational errors, like
+    # the database staying locked past the timeout, come out as OSError the way a file's would,
+    # so WriteBehind keeps the batch and tries again
+    global _depth
+    with _db_lock:
+        try:
+            db = _connect()
+            if _depth == 0:
+                db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            raise OSError(f"{DB_FILE}: {e}") from e
+        _depth += 1
+        ok = False
+        try:
+            yield db
+            ok = True
+        except sqlite3.OperationalError as e:
+            raise OSError(f"{DB_FILE}: {e}") from e
+        finally:
+            _depth -= 1
+            if _depth == 0:
+                _end(db, ok)
+
+
+def _end(db, ok):
+    try:
+        db.execute("COMMIT" if ok else "ROLLBACK")
+    except sqlite3.OperationalError as e:
+        if db.in_transaction:
+            db.execute("ROLLBACK")  # a failed commit leaves it open, and the next BEGIN would fail
+        raise OSError(f"{DB_FILE}: {e}") from e
+
+
+def _columns(item):
+    item_id = item.get("id")
+    if item_id is None:
+        item_id = item["id"] = new_id()
+    due, start = parse_date(item.get("due_date")), parse_date(item.get("start_date"))
+    if due is None or start is None:
+        kind = UNDATED
+    elif is_recurring(item.get("recurrence", "None")):
+        kind = RECURRING
+    else:
+        kind = ONE_OFF
+    level = PRIORITY_BY_NAME.get(item.get("priority"))
+    return (item_id, json.dumps(item), kind, due.toordinal() if due is not None else None,
+            start.toordinal() if start is not None else None, 1 if item.get("completed") else 0,
+            None if level is None else int(level))
+
+
+def _put(db, items, statements=MAIN):
+    # upserts a batch of task dicts along with their tag and word rows, same terms as SearchIndex
+    rows, ids, tags, words = [], [], [], []
+    for item in items:
+        row = _columns(item)
+        item_id = row[0]
+        rows.append(row)
+        ids.append((item_id,))
+        item_tags = {tag.strip().lower() for tag in item.get("tags", ()) if tag.strip()}
+        item_words = set(tokenize(item.get("name", "")))
+        for tag in item_tags:
+            tags.append((tag, item_id))
+            item_words.update(tokenize(tag))
+        words.extend((word, item_id) for word in item_words)
+    # in key order the b-tree inserts land next to each other
+    tags.sort()
+    words.sort()
+    db.executemany(statements["untag"], ids)
+    db.executemany(statements["unword"], ids)
+    db.executemany(statements["upsert"], rows)
+    db.executemany(statements["tag"], tags)
+    db.executemany(statements["word"], words)
+
+
+def _drop(db, item_ids):
+    ids = [(item_id,) for item_id in item_ids]
+    db.executemany(MAIN["untag"], ids)
+    db.executemany(MAIN["unword"], ids)
+    db.executemany(MAIN["delete"], ids)
+
+
+def _apply_records(db, records):
+    # the batch folded by id, last record wins. A task deleted and added again in one batch
+    # goes to the end, as storage._apply puts it
+    final, deleted = {}, set()
+    for record in records:
+        if record["op"] == "delete":
+            final[record["id"]] = None
+            deleted.add(record["id"])
+        else:
+            final[record["item"]["id"]] = record["item"]
+    _drop(db, [item_id for item_id, item in final.items() if item is None or item_id in deleted])
+    _put(db, [item for item in final.values() if item is not None])
+
+
+def _catch_up(db):
+    # queues what other processes wrote since this one last looked, caller holds locked()
+    global _disk_seq, _resync
+    if _meta(db, "pruned") > _disk_seq:
+        _resync = True  # rows this instance hadn't read are gone, only a full diff tells what changed
+        del _incoming[:]
+        _disk_seq = _meta(db, "seq")
+        return
+    for seq, record in db.execute(SELECT_CHANGES, (_disk_seq,)):
+        _incoming.append(json.loads(record))
+        _disk_seq = seq
+
+
+def _mark_read(db):
+    global _seq, _disk_seq
+    _disk_seq = _meta(db, "seq")
+    with _lock:
+        _seq = max(_seq, _disk_seq)
+
+
+def take_changes():
+    # (records, resync) like storage.take_changes, from the changes table instead of the journal
+    global _incoming, _resync
+    with locked() as db:
+        _catch_up(db)
+        records, _incoming = _incoming, []
+        resync, _resync = _resync, False
+    return records, resync
+
+
+def stamp(records):
+    global _seq
+    with _lock:
+        for record in records:
+            _seq += 1
+            record["seq"] = _seq
+        return _seq
+
+
+@timed("append_records")
+def append_records(records):
+    # one transaction for the batch: the change rows and the tasks they touch.
+    # Seqs another process got to first are moved past the last one, as in storage
+    global _seq, _pending, _disk_seq
+    with locked() as db:
+        _catch_up(db)
+        last = _meta(db, "seq")
+        for record in records:
+            if record["seq"] <= last:
+                record["seq"] = last + 1
+            last = record["seq"]
+        db.executemany(INSERT_CHANGE, [(record["seq"], json.dumps(record)) for record in records])
+        _apply_records(db, records)
+        db.execute(SET_META, ("seq", last))
+    # only once it's committed, a batch that got rolled back gets sent again
+    with _db_lock:
+        _disk_seq = last
+        _pending += len(records)
+    with _lock:
+        _seq = max(_seq, last)
+    return _pending >= COMPACT_AFTER
+
+
+@timed("compact")
+def compact():
+    # the tasks table is always current, so this only drops change rows nobody should need
+    # any more and lets sqlite fold the WAL back into the database
+    global _pending
+    with locked() as db:
+        cutoff = _meta(db, "seq") - KEEP_CHANGES
+        if cutoff > _meta(db, "pruned"):
+            db.execute("DELETE FROM changes WHERE seq <= ?", (cutoff,))
+            db.execute(SET_META, ("pruned", cutoff))
+        _pending = 0
+    with _db_lock:
+        _connect().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def _rewrite(db, records, batch_size=BATCH_SIZE, seq=None):
+    # every task replaced by records, caller holds locked(). They go through shadow tables
+    # since records may be streaming out of the real ones. Gets a seq of its own and drops
+    # the change rows, so other instances see pruned jump and resync
+    global _seq, _pending, _disk_seq
+    if seq is None:
+        _catch_up(db)
+        seq = _meta(db, "seq") + 1
+    for statement in SHADOW_SCHEMA:
+        db.execute(statement)
+    count = 0
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            _put(db, batch, SHADOW)
+            count += len(batch)
+            batch = []
+    _put(db, batch, SHADOW)
+    count += len(batch)
+    for name in INDEXES:
+        db.execute(f"DROP INDEX {name}")
+    for table in TABLES:
+        db.execute(f"DELETE FROM {table}")
+        db.execute(f"INSERT INTO {table} SELECT * FROM new_{table}")
+        db.execute(f"DROP TABLE new_{table}")
+    for statement in INDEXES.values():
+        db.execute(statement)
+    db.execute("DELETE FROM changes")
+    db.execute(SET_META, ("seq", seq))
+    db.execute(SET_META, ("pruned", seq))
+    _disk_seq = seq
+    _pending = 0
+    with _lock:
+        _seq = max(_seq, seq)
+    return count
+
+
+def write_snapshot_stream(records, batch_size=BATCH_SIZE):
+    with locked() as db:
+        return _rewrite(db, records, batch_size)
+
+
+@timed("save_items")
+def save_items(items: List[TrackedItem]):
+    with locked() as db:
+        _rewrite(db, storage._dump(items))
+
+
+def _decode(rows):
+    # one json.loads for the whole page instead of one per row
+    return json.loads("[" + ",".join(rows) + "]")
+
+
+def stream_records():
+    # (seq, records) like storage.stream_records, a page at a time by insertion order.
+    # Hold locked() around it to read one consistent state
+    with locked() as db:
+        seq = _meta(db, "seq")
+
+    def records():
+        pos = 0
+        while True:
+            with _db_lock:
+                page = _connect().execute(SELECT_PAGE, (pos, PAGE_SIZE)).fetchall()
+            if not page:
+                return
+            pos = page[-1][0]
+            yield from _decode([record for _, record in page])
+    return seq, records()
+
+
+def _load_records():
+    with locked() as db:
+        _mark_read(db)
+        _, records = stream_records()
+        return list(records)
+
+
+@timed("load_items")
+def load_items(item_type=TrackedItem) -> List[TrackedItem]:
+    return [item_type.from_dict(item) for item in _load_records()]
+
+
+@timed("load_items_lazy")
+def load_items_lazy(item_type=TrackedItem):
+    # unfinished tasks only, and no rest: finished ones come in per window through select_window
+    with locked() as db:
+        _mark_read(db)
+        rows = [row[0] for row in db.execute(SELECT_UNFINISHED)]
+    return [item_type.from_dict(item) for item in _decode(rows)], None
+
+
+def load_columns():
+    from columnar import ColumnStore
+    return ColumnStore.from_dicts(_load_records())
+
+
+def _ordinal(day):
+    return (day.date() if isinstance(day, datetime) else day).toordinal()
+
+
+def select_window(first, last, completed=True):
+    # tasks the list could show for first..last: undated ones, one-offs due in the window and
+    # series that started by its end, the same ones OccurrenceIndex.window looks at
+    first, last = _ordinal(first), _ordinal(last)
+    flag = 1 if completed else 0
+    with _db_lock:
+        rows = _connect().execute(SELECT_WINDOW, (flag, flag, first, last, flag, last)).fetchall()
+    return _decode([record for _, record in rows])
+
+
+def _after(word):
+    # the first string past every word starting with word
+    return word[:-1] + chr(ord(word[-1]) + 1)
+
+
+def _where(text, today=None):
+    # a query.py query as a WHERE clause, each term an indexed range or lookup
+    clauses, params = [], []
+    for term in parse(text, today):
+        if term.field in DATE_FIELDS:
+            first, last = date_bounds(term.op, term.value)
+            if first is not None:
+                clauses.append(f"{term.field} >= ?")
+                params.append(first)
+            if last is not None:
+                clauses.append(f"{term.field} <= ?")
+                params.append(last)
+        elif term.field == "priority":
+            levels = [int(level) for level in priority_levels(term.op, term.value)]
+            clauses.append(f"priority IN ({', '.join('?' * len(levels))})")
+            params.extend(levels)
+        elif term.field == "done":
+            clauses.append("completed = ?")
+            params.append(1 if term.value else 0)
+        elif term.field == "tag":
+            clauses.append("id IN (SELECT id FROM tags WHERE tag = ?)")
+            params.append(term.value.strip().lower())
+        else:
+            words = tokenize(term.value)
+            if not words:
+                # nothing to look up in words, the substring match SearchIndex falls back to
+                clauses.append("(instr(lower(json_extract(record, '$.name')), ?) > 0 "
+                               "OR id IN (SELECT id FROM tags WHERE instr(tag, ?) > 0))")
+                params.extend((term.value.lower(), term.value.lower()))
+            for word in words:
+                clauses.append("id IN (SELECT id FROM words WHERE word >= ? AND word < ?)")
+                params.extend((word, _after(word)))
+    return " AND ".join(clauses) or "1", params
+
+
+def query_records(text, today=None):
+    # what ItemStore.query would match, answered by sqlite without loading anything else
+    where, params = _where(text, today)
+    with _db_lock:
+        rows = _connect().execute(f"SELECT record FROM tasks WHERE {where} ORDER BY pos", params).fetchall()
+    return _decode([row[0] for row in rows])
+
+
+def explain_query(text, today=None):
+    where, params = _where(text, today)
+    with _db_lock:
+        plan = _connect().execute(f"EXPLAIN QUERY PLAN SELECT record FROM tasks WHERE {where} ORDER BY pos",
+                                  params).fetchall()
+    return "\n".join([f"query: {text}", f"  WHERE {where}"] + [f"  {row[-1]}" for row in plan])
+
+
+def read_records():
+    # for notify_daemon: (records by id, seq, offset), the offset being the seq the changes go on from
+    with locked() as db:
+        seq = _meta(db, "seq")
+        _, records = stream_records()
+        data = {record["id"]: record for record in records}
+    return data, seq, seq
+
+
+def changes_since(seq):
+    # for notify_daemon: (change records after seq, the seq to carry on from), or None when some
+    # of them were pruned (compact, or a rewrite like task_cli import) and only read_records
+    # tells what changed, as for _catch_up. File sizes say nothing about the change rows
+    with locked() as db:
+        if _meta(db, "pruned") > seq:
+            return None
+        rows = db.execute(SELECT_CHANGES, (seq,)).fetchall()
+    if not rows:
+        return [], seq
+    return [json.loads(record) for _, record in rows], rows[-1][0]
\ No newline at end of file
@@ -1,19 +1,586 @@
 import json
+import mmap
 import os
+import re
+import struct
+import threading
+from array import array
+from contextlib import contextmanager
 from typing import List
-from tracker_model import TrackedItem
+from tracker_model import TrackedItem, new_id
+from perf import timed
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # windows
+    import msvcrt
 
 STORAGE_FILE = "tracked_items.json"
+JOURNAL_FILE = "tracked_items.journal"
+PREVIOUS_JOURNAL_FILE = "tracked_items.journal.prev"
+INDEX_FILE = "tracked_items.idx"
+LOCK_FILE = "tracked_items.lock"
+COMPACT_AFTER = 500  # journal records before the snapshot gets rewritten
+INDEX_MAGIC = b"TTIX1"
+INDEX_HEADER = struct.Struct("<5sQQQ")  # magic, snapshot seq, snapshot size, record count
 
+_lock = threading.Lock()
+_seq = 0        # seq of the last record written to the journal
+_pending = 0    # journal records not yet folded into the snapshot
 
-def save_items(items: List[TrackedItem]):
-    with open(STORAGE_FILE, "w") as f:
-        json.dump([item.to_dict() for item in items], f, indent=2)
+# everything below is only touched inside locked()
+_file_lock = threading.RLock()
+_lock_fd = None
+_lock_depth = 0
+_journal_ino = None   # the journal this process has read up to _offset
+_journal_pin = None   # that journal kept open, see _pin_journal
+_offset = 0
+_disk_seq = 0         # last seq in the files as of the last look
+_incoming = []        # records other processes wrote, until take_changes hands them out
+_resync = False       # set when the files changed in a way the journal doesn't explain
+
+
+def _acquire(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass  # LK_LOCK gives up after 10 seconds, keep waiting
+
+
+def _release(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def locked():
+    # tracked_items.lock held for the block, other processes wait for it. Nests within a process
+    global _lock_fd, _lock_depth
+    with _file_lock:
+        if _lock_depth == 0:
+            _lock_fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT)
+            _acquire(_lock_fd)
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0:
+                _release(_lock_fd)
+                os.close(_lock_fd)
+                _lock_fd = None
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _snapshot_seq():
+    try:
+        with open(STORAGE_FILE, "rb") as f:
+            head = f.read(64)
+    except FileNotFoundError:
+        return 0
+    match = re.match(rb'\s*\{\s*"seq"\s*:\s*(\d+)', head)
+    return int(match.group(1)) if match else 0
 
 
-def load_items() -> List[TrackedItem]:
+def _write_snapshot(seq, data, batch_size=10000):
+    # one record per line, and an index of where each one starts so loads can skip around
+    offsets, lengths, completed = array("Q"), array("I"), array("b")
+    tmp_path = STORAGE_FILE + ".tmp"
+    with open(tmp_path, "wb") as f:
+        position = f.write(b'{"seq": %d, "items": [\n' % seq)
+        batch = []
+        for record in data:
+            # ascii only, so the byte offsets match the text
+            line = json.dumps(record).encode("ascii")
+            if offsets:
+                batch.append(b",\n")
+                position += 2
+            offsets.append(position)
+            lengths.append(len(line))
+            completed.append(1 if record.get("completed") else 0)
+            batch.append(line)
+            position += len(line)
+            if len(batch) >= batch_size:
+                f.write(b"".join(batch))
+                batch = []
+        batch.append(b"\n]}")
+        f.write(b"".join(batch))
+        size = position + 3
+        f.flush()
+        os.fsync(f.fileno())
+    index_path = INDEX_FILE + ".tmp"
+    with open(index_path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, seq, size, len(offsets)))
+        offsets.tofile(f)
+        lengths.tofile(f)
+        completed.tofile(f)
+    # the index names the seq and size it belongs to, a stale one is ignored
+    os.replace(tmp_path, STORAGE_FILE)
+    os.replace(index_path, INDEX_FILE)
+    return len(offsets)
+
+
+def _read_snapshot():
     if not os.path.exists(STORAGE_FILE):
-        return []
+        return 0, []
     with open(STORAGE_FILE, "r") as f:
         data = json.load(f)
-        return [TrackedItem.from_dict(item) for item in data]
+    # files written before the journal existed are a bare list
+    if isinstance(data, list):
+        return 0, data
+    return data.get("seq", 0), data.get("items", [])
+
+
+def read_journal(offset=0, path=None):
+    # complete records from offset on, and the offset just past the last one
+    path = path or JOURNAL_FILE
+    records = []
+    if not os.path.exists(path):
+        return records, 0
+    good = offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # torn append from a crash, or one still being written
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            good += len(line)
+    return records, good
+
+
+def _read_journal(offset=0):
+    # caller holds locked(), so a partial last line is left over from a crash, not an append in progress
+    records, good = read_journal(offset)
+    # drop a torn tail so the next append starts on a clean line
+    if os.path.exists(JOURNAL_FILE) and os.path.getsize(JOURNAL_FILE) > good:
+        with open(JOURNAL_FILE, "r+b") as f:
+            f.truncate(good)
+    return records, good
+
+
+def _pin_journal():
+    # the journal stays open while this process goes by its inode number. Closed, a rotated
+    # journal frees the number and a new one can get it, then a stale _offset looks valid.
+    # Windows doesn't hand file ids out again like that, and couldn't rename an open file
+    global _journal_ino, _journal_pin
+    if _journal_pin is not None:
+        _journal_pin.close()
+        _journal_pin = None
+    _journal_ino = _inode(JOURNAL_FILE)
+    if _journal_ino is not None and fcntl is not None:
+        _journal_pin = open(JOURNAL_FILE, "rb")
+
+
+def _mark_read(seq):
+    # this process has seen the files as they are now, up to seq
+    global _offset, _disk_seq
+    _pin_journal()
+    _offset = os.path.getsize(JOURNAL_FILE) if _journal_ino is not None else 0
+    _disk_seq = seq
+
+
+def _rotate_journal(seq):
+    # after the snapshot took in everything up to seq. The old journal stays around as .prev
+    # for processes that haven't read its end yet, caller holds locked()
+    global _pending
+    if os.path.exists(JOURNAL_FILE):
+        os.replace(JOURNAL_FILE, PREVIOUS_JOURNAL_FILE)
+    open(JOURNAL_FILE, "ab").close()
+    _pending = 0
+    _mark_read(seq)
+
+
+def _catch_up():
+    # queues what other processes wrote since this one last looked, caller holds locked()
+    global _offset, _disk_seq, _resync, _pending
+    records = []
+    if _inode(JOURNAL_FILE) != _journal_ino:
+        if _journal_ino is not None and _inode(PREVIOUS_JOURNAL_FILE) == _journal_ino:
+            # compacted once since, the rest of the old journal is still in .prev
+            records += read_journal(_offset, PREVIOUS_JOURNAL_FILE)[0]
+        elif _journal_ino is not None:
+            _resync = True  # compacted more than once, those records are only in the snapshot now
+        _pin_journal()
+        _offset, _pending = 0, 0
+    # by seq rather than inode, a rewritten snapshot can get the old file's number
+    seq = _snapshot_seq()
+    if seq > max([_disk_seq] + [record["seq"] for record in records]):
+        _resync = True  # rewritten from something other than the journal, like an import
+        _disk_seq = seq
+    if _journal_ino is not None:
+        more, _offset = _read_journal(_offset)
+        records += more
+        _pending += len(more)
+    for record in records:
+        if record["seq"] > _disk_seq:
+            _disk_seq = record["seq"]
+            _incoming.append(record)
+
+
+def take_changes():
+    # (records, resync): what other processes journaled since the last call, in seq order.
+    # resync means some changes can't be told apart that way and the caller has to diff
+    global _incoming, _resync
+    with locked():
+        _catch_up()
+        records, _incoming = _incoming, []
+        resync, _resync = _resync, False
+    return records, resync
+
+
+def _apply(data, record):
+    # data is keyed by id, so adds land at the end and updates keep their place
+    op = record["op"]
+    if op in ("add", "update"):
+        data[record["item"]["id"]] = record["item"]
+    elif op == "delete":
+        data.pop(record["id"], None)
+
+
+def add_record(item):
+    return {"op": "add", "item": item.to_dict()}
+
+
+def update_record(item):
+    return {"op": "update", "item": item.to_dict()}
+
+
+def delete_records(item_ids):
+    return [{"op": "delete", "id": item_id} for item_id in item_ids]
+
+
+def record_id(record):
+    return record["id"] if record["op"] == "delete" else record["item"]["id"]
+
+
+def stamp(records):
+    # seqs are handed out in edit order, before the records reach the disk
+    global _seq
+    with _lock:
+        for record in records:
+            _seq += 1
+            record["seq"] = _seq
+        return _seq
+
+
+@timed("append_records")
+def append_records(records):
+    # one write and one fsync for the whole batch, returns True once compaction is due.
+    # seqs another process got to first are moved past the journal's last one
+    global _seq, _pending, _disk_seq, _offset
+    with locked():
+        _catch_up()
+        for record in records:
+            if record["seq"] <= _disk_seq:
+                record["seq"] = _disk_seq + 1
+            _disk_seq = record["seq"]
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with open(JOURNAL_FILE, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            _offset = f.tell()
+        if _journal_ino is None:
+            _pin_journal()  # the append just created it
+        _pending += len(records)
+        with _lock:
+            _seq = max(_seq, _disk_seq)
+        return _pending >= COMPACT_AFTER
+
+
+def _dump(items):
+    # a ColumnStore serializes its own rows without building items first
+    if hasattr(items, "to_dicts"):
+        return items.to_dicts()
+    return [item.to_dict() for item in items]
+
+
+@timed("compact")
+def compact():
+    # folds the journal into the snapshot from what's on disk, so other processes' edits are kept
+    with locked():
+        _catch_up()
+        seq, records = stream_records()
+        _write_snapshot(seq, records)
+        _rotate_journal(seq)
+
+
+def _rewrite(records, batch_size=10000):
+    # a snapshot that isn't just the journal folded in gets a seq of its own,
+    # so other processes know to diff against it. Caller holds locked()
+    global _seq
+    _catch_up()
+    seq = _disk_seq + 1
+    count = _write_snapshot(seq, records, batch_size)
+    _rotate_journal(seq)
+    with _lock:
+        _seq = max(_seq, seq)
+    return count
+
+
+@timed("save_items")
+def save_items(items: List[TrackedItem]):
+    with locked():
+        _rewrite(_dump(items))
+
+
+def _load_records():
+    global _seq, _pending
+    with locked():
+        seq, snapshot = _read_snapshot()
+        # records from before ids existed get one now, and keep it once written
+        missing_ids = [item for item in snapshot if "id" not in item]
+        for item in missing_ids:
+            item["id"] = new_id()
+        data = {item["id"]: item for item in snapshot}
+        pending = 0
+        for record in _read_journal()[0]:
+            if record["seq"] <= seq:
+                continue  # already in the snapshot, crash before the journal was trimmed
+            _apply(data, record)
+            seq = record["seq"]
+            pending += 1
+        with _lock:
+            _seq = max(_seq, seq)
+        _pending = pending
+        _mark_read(seq)
+        if missing_ids:
+            _write_snapshot(seq, list(data.values()))
+            _rotate_journal(seq)
+    return data.values()
+
+
+def read_records():
+    # read-only load for other processes: no torn tail repair, no id migration
+    seq, snapshot = _read_snapshot()
+    data = {item.get("id") or new_id(): item for item in snapshot}
+    for item_id, item in data.items():
+        item["id"] = item_id
+    records, offset = read_journal()
+    for record in records:
+        if record["seq"] > seq:
+            _apply(data, record)
+            seq = record["seq"]
+    return data, seq, offset
+
+
+def _iter_array(f, buf="", chunk_size=1 << 20):
+    # decodes the elements of a json array one at a time, buf and then f pick up just past the [
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            if pos == len(buf):
+                raise ValueError("need more")
+            value, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield value
+        pos = end
+
+
+def iter_snapshot():
+    # (seq, items) like _read_snapshot, but items come out one by one
+    if not os.path.exists(STORAGE_FILE):
+        return 0, iter(())
+    f = open(STORAGE_FILE, "r")
+    head = ""
+    while "[" not in head:
+        chunk = f.read(4096)
+        if not chunk:
+            f.close()
+            return 0, iter(())
+        head += chunk
+    start = head.index("[")
+    seq = 0
+    if not head.lstrip().startswith("["):
+        # {"seq": N, "items": [...]}, save writes seq first
+        match = re.search(r'"seq"\s*:\s*(\d+)', head[:start])
+        seq = int(match.group(1)) if match else 0
+
+    def items():
+        with f:
+            yield from _iter_array(f, head[start + 1:])
+    return seq, items()
+
+
+def stream_records():
+    # every stored record, journal applied, holding only the journal in memory
+    seq, items = iter_snapshot()
+    changes = {}
+    for record in read_journal()[0]:
+        if record["seq"] <= seq:
+            continue
+        seq = record["seq"]
+        if record["op"] == "delete":
+            changes[record["id"]] = None
+        else:
+            changes[record["item"]["id"]] = record["item"]
+
+    def records():
+        for item in items:
+            item_id = item.get("id")
+            if item_id is None:
+                item_id = item["id"] = new_id()
+            if item_id in changes:
+                # updated in place or deleted, same as _apply
+                item = changes.pop(item_id)
+                if item is None:
+                    continue
+            yield item
+        for item in changes.values():
+            if item is not None:
+                yield item
+    return seq, records()
+
+
+def write_snapshot_stream(records, batch_size=10000):
+    # writes the snapshot from an iterator in batches, then empties the journal.
+    # hold locked() around reading what records comes from as well
+    with locked():
+        return _rewrite(records, batch_size)
+
+
+class MappedSnapshot:
+    # the snapshot mapped read-only, records get decoded one at a time through the index
+    def __init__(self, f, seq, offsets, lengths, completed):
+        self.file = f
+        self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.seq = seq
+        self.offsets = offsets
+        self.lengths = lengths
+        self.completed = completed
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def records(self, rows, batch_size=10000):
+        # a json.loads per batch, per record the call overhead outweighs the parsing
+        offsets, lengths, data = self.offsets, self.lengths, self.map
+        for first in range(0, len(rows), batch_size):
+            batch = rows[first:first + batch_size]
+            yield from json.loads(b"[" + b",".join(
+                data[offsets[row]:offsets[row] + lengths[row]] for row in batch) + b"]")
+
+    def rows(self, completed):
+        flag = 1 if completed else 0
+        return [row for row, done in enumerate(self.completed) if done == flag]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def open_snapshot():
+    # None when there's no snapshot or its index is missing or stale
+    try:
+        f = open(STORAGE_FILE, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        with open(INDEX_FILE, "rb") as index:
+            magic, seq, size, count = INDEX_HEADER.unpack(index.read(INDEX_HEADER.size))
+            offsets, lengths, completed = array("Q"), array("I"), array("b")
+            offsets.fromfile(index, count)
+            lengths.fromfile(index, count)
+            completed.fromfile(index, count)
+        if magic != INDEX_MAGIC or size != os.fstat(f.fileno()).st_size or size == 0:
+            raise ValueError("stale index")
+        head = f.read(64)
+        match = re.match(rb'\{"seq": (\d+),', head)
+        if not match or int(match.group(1)) != seq:
+            raise ValueError("stale index")
+        return MappedSnapshot(f, seq, offsets, lengths, completed)
+    except (OSError, EOFError, ValueError, struct.error):
+        f.close()
+        return None
+
+
+def load_records_lazy():
+    # (active, rest): incomplete tasks and everything the journal touched now,
+    # completed ones as an iterator that decodes them when it gets pulled
+    global _seq, _pending
+    with locked():
+        snapshot = open_snapshot()
+        if snapshot is None:
+            # no usable index yet, load everything once and write the indexed layout
+            records = list(_load_records())
+            if os.path.exists(STORAGE_FILE) or os.path.exists(JOURNAL_FILE):
+                _write_snapshot(_disk_seq, records)
+                _rotate_journal(_disk_seq)
+            return records, iter(())
+        seq = snapshot.seq
+        changes = {}
+        pending = 0
+        for record in _read_journal()[0]:
+            if record["seq"] <= seq:
+                continue
+            seq = record["seq"]
+            pending += 1
+            if record["op"] == "delete":
+                changes[record["id"]] = None
+            else:
+                changes[record["item"]["id"]] = record["item"]
+        with _lock:
+            _seq = max(_seq, seq)
+        _pending = pending
+        _mark_read(seq)
+
+    # every snapshot with an index was written with ids, so rows and journal records line up
+    active = []
+    for record in snapshot.records(snapshot.rows(completed=False)):
+        if record["id"] not in changes:
+            active.append(record)
+    active.extend(record for record in changes.values() if record is not None)
+
+    def rest():
+        try:
+            for record in snapshot.records(snapshot.rows(completed=True)):
+                if record["id"] not in changes:
+                    yield record
+        finally:
+            snapshot.close()
+    return active, rest()
+
+
+@timed("load_items_lazy")
+def load_items_lazy(item_type=TrackedItem):
+    active, rest = load_records_lazy()
+    return [item_type.from_dict(item) for item in active], (item_type.from_dict(item) for item in rest)
+
+
+@timed("load_items")
+def load_items(item_type=TrackedItem) -> List[TrackedItem]:
+    return [item_type.from_dict(item) for item in _load_records()]
+
+
+def load_columns():
+    from columnar import ColumnStore
+    return ColumnStore.from_dicts(_load_records())
@@ -0,0 +1,316 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import sqlite3
+from datetime import date
+from itertools import chain, islice
+from backend import current as current_backend, COLUMNS
+from tracker_model import TrackedItem, CompactItem
+from item_store import ItemStore
+from query import compile_query, parse_day, QueryError
+
+CSV_COLUMNS = ["id", "name", "tags", "start_date", "start_time", "due_date", "end_time",
+               "priority", "recurrence", "completed", "fields", "overrides"]
+TRUE_VALUES = {"1", "true", "yes", "y", "done", "x"}
+BATCH_SIZE = 10000
+LOOKUP_SIZE = 500  # stored ids looked up in the import spool per query, under sqlite's parameter limit
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def detect_format(path, given):
+    if given:
+        return given
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def open_input(path):
+    return sys.stdin if path == "-" else open(path, "r", newline="", encoding="utf-8")
+
+
+def open_output(path):
+    return sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+
+
+def read_jsonl(f):
+    for line_no, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, InvalidRecord(f"bad json: {e}")
+
+
+def read_csv(f):
+    reader = csv.DictReader(f)
+    for row in reader:
+        record = {key: value for key, value in row.items() if key is not None and value is not None}
+        if "tags" in record:
+            record["tags"] = [tag.strip() for tag in record["tags"].split(",") if tag.strip()]
+        if "completed" in record:
+            record["completed"] = record["completed"].strip().lower() in TRUE_VALUES
+        for column in ("fields", "overrides"):
+            if isinstance(record, dict) and column in record:
+                try:
+                    record[column] = json.loads(record[column]) if record[column].strip() else {}
+                except ValueError as e:
+                    record = InvalidRecord(f"bad {column} json: {e}")
+        if isinstance(record, dict) and not record.get("id"):
+            record.pop("id", None)
+        yield reader.line_num, record
+
+
+def validate(record):
+    # whatever TrackedItem.from_dict accepts, normalised to what save_items writes
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord("not an object")
+    record = dict(record)
+    record.setdefault("fields", {})
+    try:
+        item = TrackedItem.from_dict(record)
+    except TypeError as e:
+        raise InvalidRecord(str(e))
+    if not isinstance(item.name, str) or not isinstance(item.tags, list):
+        raise InvalidRecord("name must be text and tags a list")
+    if item.due is None:
+        raise InvalidRecord(f"due_date {item.due_date!r} is not YYYY-MM-DD")
+    if item.overrides is None:
+        item.overrides = {}
+    if not isinstance(item.overrides, dict):
+        raise InvalidRecord("overrides must map dates to changes")
+    # to_dict goes through asdict's deep copy, the record is already a fresh copy
+    record = dict(vars(item))
+    if not record["overrides"]:
+        del record["overrides"]
+    return record
+
+
+class Progress:
+    def __init__(self, label, every=100000):
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.skipped = 0
+        self.replaced = 0
+        self.start = time.perf_counter()
+
+    def tick(self):
+        self.count += 1
+        if self.count % self.every == 0:
+            self.report(final=False)
+
+    def report(self, final=True):
+        elapsed = time.perf_counter() - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        line = f"{self.label} {self.count} records in {elapsed:.1f}s ({rate:,.0f} records/s)"
+        if self.skipped:
+            line += f", {self.skipped} skipped"
+        if self.replaced:
+            line += f", {self.replaced} replaced tasks with the same id"
+        print(line if final else line + "...", file=sys.stderr)
+
+
+def import_tasks(path, fmt=None, strict=False, batch_size=BATCH_SIZE):
+    fmt = detect_format(path, fmt)
+    progress = Progress("imported")
+
+    def imported(f):
+        reader = read_csv(f) if fmt == "csv" else read_jsonl(f)
+        for line_no, record in reader:
+            try:
+                record = validate(record)
+            except InvalidRecord as e:
+                where = f"line {line_no}"
+                if strict:
+                    raise SystemExit(f"{path} {where}: {e}")
+                print(f"skipping {where}: {e}", file=sys.stderr)
+                progress.skipped += 1
+                continue
+            progress.tick()
+            yield record
+
+    def spool(f, db):
+        # the validated records go to a temporary database first, so the ids they bring are known
+        # before the old tasks are written. It's on disk like the rest, a big import's ids
+        # aren't held in memory either
+        db.execute("CREATE TABLE spool (pos INTEGER PRIMARY KEY, id TEXT, record TEXT)")
+        insert = "INSERT INTO spool (id, record) VALUES (?, ?)"
+        batch = []
+        for record in imported(f):
+            batch.append((record["id"], json.dumps(record)))
+            if len(batch) >= batch_size:
+                db.executemany(insert, batch)
+                batch = []
+        db.executemany(insert, batch)
+        db.execute("CREATE INDEX spool_id ON spool (id, pos)")
+
+    def kept(existing, db):
+        # an imported task replaces the stored one with its id instead of sitting next to it
+        while True:
+            chunk = list(islice(existing, LOOKUP_SIZE))
+            if not chunk:
+                return
+            ids = [record["id"] for record in chunk]
+            found = {row[0] for row in db.execute(
+                f"SELECT DISTINCT id FROM spool WHERE id IN ({','.join('?' * len(ids))})", ids)}
+            for record in chunk:
+                if record["id"] in found:
+                    progress.replaced += 1
+                else:
+                    yield record
+
+    def spooled(db):
+        # a later record for an id wins
+        rows = db.execute("SELECT record FROM spool AS s WHERE pos = "
+                          "(SELECT max(pos) FROM spool WHERE id = s.id) ORDER BY pos")
+        for (line,) in rows:
+            yield json.loads(line)
+
+    # the lock keeps other instances from writing between reading the old tasks and replacing them.
+    # An empty name gives sqlite a temporary database of its own, removed when it's closed
+    storage = current_backend()
+    spool_db = sqlite3.connect("")
+    try:
+        with storage.locked(), open_input(path) as f:
+            spool(f, spool_db)
+            _, existing = storage.stream_records()
+            storage.write_snapshot_stream(chain(kept(iter(existing), spool_db), spooled(spool_db)), batch_size)
+    finally:
+        spool_db.close()
+    progress.report()
+    return progress
+
+
+def export_tasks(path, fmt=None):
+    fmt = detect_format(path, fmt)
+    progress = Progress("exported")
+    _, records = current_backend().stream_records()
+    f = open_output(path)
+    try:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, CSV_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            for record in records:
+                row = dict(record)
+                row["tags"] = ", ".join(row.get("tags", []))
+                row["fields"] = json.dumps(row.get("fields") or {})
+                row["overrides"] = json.dumps(row["overrides"]) if row.get("overrides") else ""
+                row["completed"] = "true" if row.get("completed") else "false"
+                writer.writerow(row)
+                progress.tick()
+        else:
+            batch = []
+            for record in records:
+                batch.append(json.dumps(record) + "\n")
+                progress.tick()
+                if len(batch) >= BATCH_SIZE:
+                    f.writelines(batch)
+                    batch = []
+            f.writelines(batch)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    progress.report()
+    return progress
+
+
+def query_tasks(text, explain=False, out=None):
+    # matching tasks as JSONL, with explain the plan and what each step did goes to stderr
+    out = out or sys.stdout
+    storage = current_backend()
+    try:
+        if hasattr(storage, "query_records"):
+            # sqlite answers it with its own indexes, nothing else gets loaded
+            records = storage.query_records(text)
+            if explain:
+                print(storage.explain_query(text), file=sys.stderr)
+        elif COLUMNS:
+            columns = storage.load_columns()
+            filters, rest = columns.plan(text)
+            if explain:
+                print(f"query: {text}\n  select {filters}\n  then checks {rest} per row", file=sys.stderr)
+            records = (item.to_dict() for item in columns.query(text))
+        else:
+            store = ItemStore(storage.load_items(CompactItem), backend=storage)
+            plan = compile_query(text, store)
+            ids = plan.run()
+            if explain:
+                print(plan.explain(), file=sys.stderr)
+            matched = store if ids is None else (store.get(item_id) for item_id in ids)
+            records = (item.to_dict() for item in matched)
+    except QueryError as e:
+        raise SystemExit(str(e))
+    count = 0
+    for record in records:
+        out.write(json.dumps(record) + "\n")
+        count += 1
+    return count
+
+
+def day_argument(value):
+    try:
+        return parse_day(value, date.today())
+    except QueryError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def export_calendar(path, fmt=None, first=None, last=None, jobs=None, expand_all=False):
+    # imported here, the pool machinery isn't needed for anything else
+    import calendar_export
+    start = time.perf_counter()
+    tasks, events = calendar_export.export_calendar(path, fmt, first, last, jobs, expand_all)
+    elapsed = time.perf_counter() - start
+    print(f"exported {events} events from {tasks} tasks in {elapsed:.1f}s", file=sys.stderr)
+    return tasks, events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import and export of Thing Tracker tasks")
+    parser.add_argument("--dir", help="folder with tracked_items.json, defaults to the current one")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="add tasks from a CSV or JSONL file, replacing ones with the same id")
+    importer.add_argument("path", help="file to read, - for stdin")
+    importer.add_argument("--format", choices=["csv", "jsonl"])
+    importer.add_argument("--strict", action="store_true", help="stop at the first bad record instead of skipping it")
+    importer.add_argument("--batch", type=int, default=BATCH_SIZE, help="records per write")
+
+    exporter = commands.add_parser("export", help="write every task to a CSV or JSONL file")
+    exporter.add_argument("path", help="file to write, - for stdout")
+    exporter.add_argument("--format", choices=["csv", "jsonl"])
+
+    calendar = commands.add_parser("calendar", help="write every occurrence in a date range to an .ics or CSV file")
+    calendar.add_argument("path", help="file to write, - for stdout")
+    calendar.add_argument("--format", choices=["ics", "csv"])
+    calendar.add_argument("--from", dest="first", type=day_argument, help="first day, today by default")
+    calendar.add_argument("--until", dest="last", type=day_argument, help="last day, three years on by default")
+    calendar.add_argument("--jobs", type=int, help="processes expanding tasks, one per core by default")
+    calendar.add_argument("--expand", action="store_true", help="an event per occurrence even where an RRULE would do")
+
+    querier = commands.add_parser("query", help="print the tasks matching a search query as JSONL")
+    querier.add_argument("text", help='like "tag:work priority:High due<2026-12-01 done:no"')
+    querier.add_argument("--explain", action="store_true", help="show the plan on stderr")
+
+    args = parser.parse_args(argv)
+    if args.dir:
+        os.chdir(args.dir)
+    if args.command == "import":
+        import_tasks(args.path, args.format, args.strict, args.batch)
+    elif args.command == "calendar":
+        export_calendar(args.path, args.format, args.first, args.last, args.jobs, args.expand)
+    elif args.command == "query":
+        query_tasks(args.text, args.explain)
+    else:
+        export_tasks(args.path, args.format)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
+
+COLUMNS = ["Name", "Tags", "Start Date", "Start Time", "Due", "End Time", "Priority", "Recurrence", "Done"]
+PRIORITY_COLUMN = 6
+DONE_COLUMN = 8
+FETCH_BATCH = 256
+SORT_ROLE = Qt.UserRole
+ID_ROLE = Qt.UserRole + 1
+PRIORITY_RANK = {"Low": 0, "Medium": 1, "High": 2}
+
+
+class TaskRow:
+    # one visible row: the stored task and the occurrence of it being shown
+    __slots__ = ("task", "occurrence", "values")
+
+    def __init__(self, task, occurrence):
+        self.task = task
+        self.occurrence = occurrence
+        self.values = [
+            occurrence.name,
+            ", ".join(occurrence.tags),
+            occurrence.start_date,
+            occurrence.start_time,
+            occurrence.due_date,
+            occurrence.end_time,
+            occurrence.priority,
+            getattr(occurrence, 'recurrence', 'None'),
+            ""
+        ]
+
+    def sort_key(self, column):
+        if column == PRIORITY_COLUMN:
+            return PRIORITY_RANK.get(self.occurrence.priority, -1)
+        if column == DONE_COLUMN:
+            return int(self.occurrence.completed)
+        return self.values[column]
+
+
+class TaskListModel(QAbstractTableModel):
+    completion_changed = pyqtSignal(object, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._loaded = 0
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        # earliest start dates get fetched first so the default sort fills in top down
+        self._rows = sorted(rows, key=lambda row: row.values[2])
+        self._loaded = min(FETCH_BATCH, len(self._rows))
+        self.endResetModel()
+
+    def row_at(self, source_row):
+        return self._rows[source_row]
+
+    def all_rows(self):
+        # a copy, fetched or not, safe to hand to another thread
+        return list(self._rows)
+
+    def append_row(self, row):
+        # lands in the loaded part so a freshly added task shows up straight away
+        position = self._loaded
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.insert(position, row)
+        self._loaded += 1
+        self.endInsertRows()
+
+    def add_rows(self, rows):
+        # rows loaded after the first paint go behind the unfetched ones, scrolling brings them in
+        fetched_all = self._loaded == len(self._rows)
+        self._rows.extend(sorted(rows, key=lambda row: row.values[2]))
+        if fetched_all:
+            self.fetchMore(QModelIndex())
+
+    def remove_tasks(self, task_ids):
+        # drops every row belonging to those tasks, fetched or not
+        for source_row in range(len(self._rows) - 1, -1, -1):
+            if self._rows[source_row].task.id in task_ids:
+                if source_row < self._loaded:
+                    self.remove_row(source_row)
+                else:
+                    del self._rows[source_row]
+
+    def remove_row(self, source_row):
+        self.beginRemoveRows(QModelIndex(), source_row, source_row)
+        del self._rows[source_row]
+        self._loaded -= 1
+        self.endRemoveRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._loaded < len(self._rows)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH, len(self._rows) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            return row.values[column]
+        if role == Qt.CheckStateRole and column == DONE_COLUMN:
+            return Qt.Checked if row.occurrence.completed else Qt.Unchecked
+        if role == SORT_ROLE:
+            return row.sort_key(column)
+        if role == ID_ROLE:
+            return row.task.id
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == DONE_COLUMN:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or index.column() != DONE_COLUMN:
+            return False
+        row = self._rows[index.row()]
+        checked = value == Qt.Checked
+        row.occurrence.completed = checked
+        self.dataChanged.emit(index, index, [role])
+        self.completion_changed.emit(row, checked)
+        return True
+
+
+class TaskFilterProxy(QSortFilterProxyModel):
+    # sorts whichever model is showing, the list or the search results (see SearchWorker)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(SORT_ROLE)
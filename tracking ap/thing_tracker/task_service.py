@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import socket
+import signal
+import asyncio
+import argparse
+import time
+import traceback
+from datetime import date
+import perf
+from backend import current as current_backend
+from item_store import ItemStore
+from tracker_model import CompactItem
+from task_cli import validate, InvalidRecord
+from query import parse_day, QueryError
+from service_client import parse_address
+from storage import COMPACT_AFTER
+
+PAGE_SIZE = 5000        # records per message when a list or query answer is long
+INLINE_PAGE = 200       # pages up to this size get encoded on the event loop, bigger ones on a thread
+MERGE_SECONDS = 0.5     # how often edits other processes made to the files get looked for
+MAX_BACKLOG = 16 << 20  # bytes of unsent events before a subscriber that stopped reading gets dropped
+LINE_LIMIT = 64 << 20   # longest request line
+BACKLOG = 1024          # connections waiting to be accepted, a crowd of clients starting at once
+BUSY_COMPACT_AFTER = 50000  # journal records before the snapshot gets rewritten even while requests keep coming
+IDLE_SECONDS = 2.0      # quiet this long and the journal gets folded into the snapshot, see merge_files
+
+
+def accept(record):
+    # a task from a window's writer. It may have been loaded from files holding a due date
+    # validate turns down, editing it has to keep working, so only what CompactItem needs is checked
+    if not isinstance(record, dict) or not record.get("id"):
+        raise InvalidRecord("not an object with an id")
+    try:
+        item = CompactItem.from_dict(record)
+    except (KeyError, TypeError) as e:
+        raise InvalidRecord(f"{type(e).__name__}: {e}")
+    if not isinstance(item.name, str) or not isinstance(record["tags"], list):
+        raise InvalidRecord("name must be text and tags a list")
+    if not isinstance(record["fields"], dict) or not isinstance(record.get("overrides") or {}, dict):
+        raise InvalidRecord("fields and overrides must be objects")
+    return item
+
+
+def encode(message):
+    return (json.dumps(message) + "\n").encode()
+
+
+def encode_page(request_id, seq, items, count=None):
+    # count goes on the last page only, it's what tells the client the answer is complete
+    message = {"id": request_id, "seq": seq, "records": [item.to_dict() for item in items]}
+    if count is not None:
+        message["result"] = count
+    return encode(message)
+
+
+class TaskService:
+    # one ItemStore shared by every client. Requests are JSON lines {"id", "op", ...}, answered
+    # with {"id", "result"} or {"id", "error"}. list and query send their records in pages of
+    # {"id", "seq", "records"}, the last one with the count as its result. Subscribers get
+    # {"event": "changes", "records"} for everyone else's edits, as journal records with the
+    # seq this service gave them
+    def __init__(self, store):
+        self.store = store
+        self.seq = 0
+        self.unfolded = 0  # our edits since the last compact
+        self.last_request = time.monotonic()
+        self.subscribers = set()
+        self.connections = {}  # writer -> the task serving it
+        self.ops = {"list": self.list, "query": self.query, "get": self.get, "add": self.add,
+                    "update": self.update, "delete": self.delete, "apply": self.apply,
+                    "subscribe": self.subscribe}
+
+    async def serve(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                self.last_request = time.monotonic()
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    handler = self.ops.get(request.get("op"))
+                    if handler is None:
+                        raise ValueError(f"{request.get('op')!r} isn't something the service does")
+                    with perf.span(f"service.{request['op']}"):
+                        await handler(request, writer)
+                except (ValueError, KeyError, TypeError, AttributeError, InvalidRecord, QueryError) as e:
+                    writer.write(encode({"id": request_id, "error": str(e) or type(e).__name__}))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            # ValueError: a request line over LINE_LIMIT
+            print("Dropping a client:", e)
+        finally:
+            self.subscribers.discard(writer)
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def close(self):
+        # closing a connection ends its serve() at the next read, a cancelled one would complain
+        serving = list(self.connections.values())
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*serving, return_exceptions=True)
+
+    def publish(self, changes, source=None):
+        # hands out seqs and sends the changes to every subscriber but the one that made them
+        for change in changes:
+            self.seq += 1
+            change["seq"] = self.seq
+        self.unfolded += len(changes)
+        if self.subscribers:
+            data = encode({"event": "changes", "records": changes})
+            for writer in list(self.subscribers):
+                if writer is source:
+                    continue
+                if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                    # it reconnects and loads again, that beats holding every edit for it
+                    self.subscribers.discard(writer)
+                    writer.close()
+                    continue
+                writer.write(data)
+        return [change["seq"] for change in changes]
+
+    async def send_records(self, request_id, items, writer):
+        # items get replaced on every edit, never changed, so the list holds still while it's sent
+        loop = asyncio.get_running_loop()
+        seq = self.seq
+        for start in range(0, max(len(items), 1), PAGE_SIZE):
+            page = items[start:start + PAGE_SIZE]
+            count = len(items) if start + PAGE_SIZE >= len(items) else None
+            if len(page) <= INLINE_PAGE:
+                writer.write(encode_page(request_id, seq, page, count))
+            else:
+                writer.write(await loop.run_in_executor(None, encode_page, request_id, seq, page, count))
+            await writer.drain()
+
+    async def list(self, request, writer):
+        with self.store.lock:
+            items = list(self.store)
+        completed = request.get("completed")
+        if completed is not None:
+            items = [item for item in items if bool(item.completed) == completed]
+        await self.send_records(request["id"], items, writer)
+
+    async def query(self, request, writer):
+        # right here on the loop: on a thread it only held the store's lock against every edit
+        today = parse_day(request["today"], date.today()) if request.get("today") else None
+        items = self.store.query(request["text"], today)
+        if items is None:
+            with self.store.lock:
+                items = list(self.store)
+        await self.send_records(request["id"], items, writer)
+
+    async def get(self, request, writer):
+        item = self.store.get(request["task"])
+        writer.write(encode({"id": request["id"], "result": item.to_dict() if item is not None else None}))
+
+    async def add(self, request, writer):
+        record = validate(request["item"])
+        if record["id"] in self.store:
+            raise ValueError(f"there's already a task {record['id']}")
+        self.store.add(CompactItem.from_dict(record))
+        change = {"op": "add", "item": record}
+        self.publish([change], writer)
+        writer.write(encode({"id": request["id"], "result": change}))
+
+    async def update(self, request, writer):
+        # fields the request leaves out keep their value
+        changes = request["item"]
+        item = self.store.get(changes["id"])
+        if item is None:
+            raise ValueError(f"there's no task {changes['id']}")
+        record = validate({**item.to_dict(), **changes})
+        self.store.replace(CompactItem.from_dict(record))
+        change = {"op": "update", "item": record}
+        self.publish([change], writer)
+        writer.write(encode({"id": request["id"], "result": change}))
+
+    async def delete(self, request, writer):
+        removed = self.store.remove(request["ids"])
+        self.publish([{"op": "delete", "id": item_id} for item_id in removed], writer)
+        writer.write(encode({"id": request["id"], "result": removed}))
+
+    async def apply(self, request, writer):
+        # a batch of journal records from a window's writer, each applied or turned down on its own.
+        # The result has a seq per record, None for the ones turned down, and "rejected" as
+        # [index, why] pairs. An add for a task that's already here is taken as an update, so a
+        # resent batch is harmless
+        records = request["records"]
+        changes, applied, rejected = [], [], []
+        for index, record in enumerate(records):
+            try:
+                changes.append(self.apply_record(record))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                rejected.append([index, str(e) or type(e).__name__])
+                continue
+            applied.append(index)
+        seqs = [None] * len(records)
+        for index, seq in zip(applied, self.publish(changes, writer)):
+            seqs[index] = seq
+        writer.write(encode({"id": request["id"], "result": {"seqs": seqs, "rejected": rejected}}))
+
+    def apply_record(self, record):
+        if record["op"] == "delete":
+            self.store.remove([record["id"]])
+            return {"op": "delete", "id": record["id"]}
+        if record["op"] not in ("add", "update"):
+            raise ValueError(f"{record['op']!r} isn't an edit")
+        item = accept(record["item"])
+        if item.id in self.store:
+            self.store.replace(item)
+        else:
+            self.store.add(item)
+        return {"op": record["op"], "item": item.to_dict()}
+
+    async def subscribe(self, request, writer):
+        self.subscribers.add(writer)
+        writer.write(encode({"id": request["id"], "result": {"seq": self.seq}}))
+
+    async def merge_files(self):
+        # task_cli import, or a window left on the files, can still write them. Their edits are
+        # taken in between ours, reading the files happens on a thread (see take_external) and
+        # only applying them here. Compacting waits for a quiet moment too: rewriting the
+        # snapshot of a big store takes long enough to stall every client while the writer
+        # thread holds the GIL. A failed round is printed and the next one tries again
+        loop = asyncio.get_running_loop()
+        backend = self.store.backend
+        while True:
+            await asyncio.sleep(MERGE_SECONDS)
+            if self.store.writer.pending():
+                continue
+            if self.unfolded >= COMPACT_AFTER and time.monotonic() - self.last_request >= IDLE_SECONDS:
+                self.unfolded = 0
+                try:
+                    await loop.run_in_executor(None, backend.compact)
+                except Exception as e:
+                    print("Compacting tasks failed:", e)
+            try:
+                taken = await loop.run_in_executor(None, self.store.take_external)
+                changed, removed = self.store.apply_taken(*taken)
+            except Exception as e:
+                if not isinstance(e, OSError):
+                    traceback.print_exc()
+                print("Taking in changes from elsewhere failed, trying again:", e)
+                continue
+            changes = [{"op": "update", "item": self.store.get(item_id).to_dict()}
+                       for item_id in changed if item_id in self.store]
+            changes += [{"op": "delete", "id": item_id} for item_id in removed]
+            if changes:
+                self.publish(changes)
+
+
+def load_store():
+    backend = current_backend()
+    store = ItemStore(backend.load_items(CompactItem), backend=backend)
+    store.windowed = False  # everything is loaded, there are no windows to fill in
+    if hasattr(backend, "COMPACT_AFTER"):
+        backend.COMPACT_AFTER = BUSY_COMPACT_AFTER  # the rest waits for a quiet moment, see merge_files
+    return store
+
+
+async def run(store, address):
+    service = TaskService(store)
+    family, where = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(where):
+            probe = socket.socket(socket.AF_UNIX)
+            try:
+                probe.connect(where)
+            except OSError:
+                os.remove(where)  # left behind by one that didn't shut down
+            else:
+                raise SystemExit(f"a task service is already running on {where}")
+            finally:
+                probe.close()
+        server = await asyncio.start_unix_server(service.serve, where, limit=LINE_LIMIT, backlog=BACKLOG)
+    else:
+        server = await asyncio.start_server(service.serve, *where, limit=LINE_LIMIT, backlog=BACKLOG)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    merging = asyncio.create_task(service.merge_files())
+    print(f"Serving {len(store)} tasks on {where}", flush=True)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        merging.cancel()
+        await service.close()
+        if family == socket.AF_UNIX and os.path.exists(where):
+            os.remove(where)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the tasks in memory once and serve them to windows and scripts")
+    parser.add_argument("--dir", help="folder with the task files, defaults to the current one")
+    parser.add_argument("--address", default=os.environ.get("THING_TRACKER_SERVICE", ""),
+                        help="socket path or localhost:PORT, tracked_items.sock in the folder by default")
+    args = parser.parse_args(argv)
+    if args.dir:
+        os.chdir(args.dir)
+    store = load_store()
+    try:
+        asyncio.run(run(store, args.address))
+    finally:
+        # edits from the last moments are still being batched
+        store.writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
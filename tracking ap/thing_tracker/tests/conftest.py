@@ -0,0 +1,56 @@
+import os
+import sys
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import storage
+
+
+def record(name="task", **changes):
+    # a stored task the way to_dict writes it
+    item = {"name": name, "tags": [], "due_date": "2026-11-02", "start_time": "09:00", "end_time": "10:00",
+            "completed": False, "priority": "Low", "fields": {}, "start_date": "2026-11-02",
+            "recurrence": "None", "id": name}
+    item.update(changes)
+    return item
+
+
+@pytest.fixture
+def task_dir(tmp_path, monkeypatch):
+    # the task files live in the current folder, and storage remembers what it read of them
+    monkeypatch.chdir(tmp_path)
+    if storage._journal_pin is not None:
+        storage._journal_pin.close()
+    for name, value in {"_seq": 0, "_pending": 0, "_journal_ino": None, "_journal_pin": None, "_offset": 0,
+                        "_disk_seq": 0, "_incoming": [], "_resync": False}.items():
+        monkeypatch.setattr(storage, name, value)
+    yield tmp_path
+    if storage._journal_pin is not None:
+        storage._journal_pin.close()
+        storage._journal_pin = None
+
+
+@pytest.fixture
+def sqlite_backend(task_dir, monkeypatch):
+    import backend
+    import sqlite_storage
+    monkeypatch.setattr(backend, "SETTING", "sqlite")
+    for name, value in {"_seq": 0, "_pending": 0, "_db": None, "_depth": 0, "_disk_seq": 0, "_incoming": [],
+                        "_resync": False}.items():
+        monkeypatch.setattr(sqlite_storage, name, value)
+    yield sqlite_storage
+    if sqlite_storage._db is not None:
+        sqlite_storage._db.close()
+        sqlite_storage._db = None
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def any_backend(request, task_dir, monkeypatch):
+    # the same test on the json files and on tracked_items.db
+    if request.param == "sqlite":
+        return request.getfixturevalue("sqlite_backend")
+    import backend
+    monkeypatch.setattr(backend, "SETTING", "json")
+    return storage
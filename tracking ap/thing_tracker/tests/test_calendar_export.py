@@ -0,0 +1,195 @@
+import csv
+import io
+import calendar
+from datetime import date, timedelta
+import pytest
+from calendar_export import render_chunk, rule, _fold, _escape, export_calendar
+from recurrence import Series, set_override
+from tracker_model import CompactItem
+from conftest import record
+
+FIRST, LAST = date(2026, 12, 1), date(2034, 12, 31)
+STAMP = "20261201T000000Z"
+
+# (due, start, recurrence, the RRULE rule() should give)
+TASKS = [
+    ("2026-11-02", "2026-11-02", "Daily", "FREQ=DAILY"),
+    ("2026-11-03", "2026-11-01", "Weekly", "FREQ=WEEKLY"),
+    ("2026-11-05", "2026-11-05", "Fortnightly", "FREQ=WEEKLY;INTERVAL=2"),
+    ("2026-11-15", "2026-11-10", "Monthly", "FREQ=MONTHLY"),
+    ("2026-10-31", "2026-10-31", "Monthly", "FREQ=MONTHLY;BYMONTHDAY=28,29,30,31;BYSETPOS=-1"),
+    ("2026-10-29", "2026-10-29", "Monthly", "FREQ=MONTHLY;BYMONTHDAY=28,29;BYSETPOS=-1"),
+    ("2026-10-30", "2026-10-29", "Monthly", None),  # only one end gets cut short in February
+    ("2026-11-02", "2026-10-30", "Monthly", None),  # starts the month before it's due
+    ("2028-02-29", "2028-02-29", "Yearly", "FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=28,29;BYSETPOS=-1"),
+    ("2026-11-02", "2026-11-02", "Yearly", "FREQ=YEARLY"),
+]
+
+
+def make_task(due, start, recurrence):
+    return CompactItem.from_dict(record("t", due_date=due, start_date=start, recurrence=recurrence))
+
+
+def with_overrides(task):
+    # a skip, one moved past its neighbours, one moved out of the export, and when there's
+    # an occurrence before the export one brought into it from there
+    inside = Series(task).between(FIRST, LAST)
+
+    def move(occurrence, to):
+        shift = to - occurrence.due
+        set_override(task, occurrence.original, due_date=to.isoformat(),
+                     start_date=(occurrence.start + shift).isoformat())
+
+    set_override(task, inside[1].original, skip=True)
+    move(inside[2], inside[5].due + timedelta(days=1))
+    move(inside[3], LAST + timedelta(days=30))
+    set_override(task, inside[4].original, done=True)
+    before = Series(task).previous(FIRST - timedelta(days=1))
+    if before is not None:
+        move(before, FIRST + timedelta(days=3))
+    return task
+
+
+def unfold(text):
+    lines = text.split("\r\n")
+    assert all(len(line.encode("utf-8")) <= 75 for line in lines)
+    return text.replace("\r\n ", "").split("\r\n")
+
+
+def events_of(text):
+    events, event = [], None
+    for line in unfold(text):
+        if line == "BEGIN:VEVENT":
+            event = {}
+        elif line == "END:VEVENT":
+            events.append(event)
+            event = None
+        elif event is not None and line:
+            name, value = line.split(":", 1)
+            event[name.split(";")[0]] = value
+    return events
+
+
+def day(value):
+    return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+
+def expand_rule(first, rrule):
+    # the start days an RRULE of the kinds rule() writes gives, as RFC 5545 reads it
+    parts = dict(part.split("=") for part in rrule.split(";"))
+    count, interval = int(parts["COUNT"]), int(parts.get("INTERVAL", 1))
+    if parts["FREQ"] in ("DAILY", "WEEKLY"):
+        step = timedelta(days=interval * (7 if parts["FREQ"] == "WEEKLY" else 1))
+        return [first + step * i for i in range(count)]
+    assert int(parts.get("BYMONTH", first.month)) == first.month
+    wanted = [int(d) for d in parts["BYMONTHDAY"].split(",")] if "BYMONTHDAY" in parts else [first.day]
+    months = interval * (12 if parts["FREQ"] == "YEARLY" else 1)
+    found, i = [], 0
+    while len(found) < count:
+        month = first.month - 1 + i * months
+        year, month = first.year + month // 12, month % 12 + 1
+        days = [d for d in wanted if d <= calendar.monthrange(year, month)[1]]
+        found += [date(year, month, d) for d in (days[-1:] if parts.get("BYSETPOS") == "-1" else days)]
+        i += 1
+    return found[:count]
+
+
+def occurrences_in(text):
+    # (start, due) of every occurrence a calendar app would show for the exported events
+    events = events_of(text)
+    replaced = {(e["UID"], day(e["RECURRENCE-ID"])): e for e in events if "RECURRENCE-ID" in e}
+    found = []
+    for event in events:
+        if "RECURRENCE-ID" in event:
+            continue
+        start, due = day(event["DTSTART"]), day(event["DTEND"])
+        if "RRULE" not in event:
+            found.append((start, due))
+            continue
+        excluded = {day(value) for value in event.get("EXDATE", "").split(",") if value}
+        for instance in expand_rule(start, event["RRULE"]):
+            if instance in excluded:
+                continue
+            moved = replaced.pop((event["UID"], instance), None)
+            if moved is not None:
+                found.append((day(moved["DTSTART"]), day(moved["DTEND"])))
+            else:
+                found.append((instance, instance + (due - start)))
+    assert not replaced  # every RECURRENCE-ID names an occurrence of its rule
+    return sorted(found)
+
+
+def exported(tasks, fmt, expand_all=False):
+    data, events = render_chunk([task.to_dict() for task in tasks], fmt, FIRST, LAST, STAMP, expand_all)
+    return data.decode("utf-8"), events
+
+
+@pytest.mark.parametrize("due, start, recurrence, pattern", TASKS)
+def test_rule(due, start, recurrence, pattern):
+    assert rule(make_task(due, start, recurrence)) == pattern
+
+
+@pytest.mark.parametrize("expand_all", [False, True], ids=["rrule", "expanded"])
+@pytest.mark.parametrize("overridden", [False, True], ids=["plain", "overridden"])
+@pytest.mark.parametrize("due, start, recurrence, pattern", TASKS)
+def test_ics_matches_series_between(due, start, recurrence, pattern, overridden, expand_all):
+    task = make_task(due, start, recurrence)
+    if overridden:
+        with_overrides(task)
+    expected = sorted((o.start, o.due) for o in Series(task).between(FIRST, LAST))
+    text, events = exported([task], "ics", expand_all)
+    assert occurrences_in(text) == expected
+    assert events == len(expected)
+    assert ("RRULE:" in text) == (pattern is not None and not expand_all)
+
+
+@pytest.mark.parametrize("due, start, recurrence, pattern", TASKS)
+def test_csv_rows_match_series_between(due, start, recurrence, pattern):
+    task = with_overrides(make_task(due, start, recurrence))
+    expected = [[o.start.isoformat(), o.due.isoformat(), "true" if o.completed else "false", o.original.isoformat()]
+                for o in Series(task).between(FIRST, LAST)]
+    text, events = exported([task], "csv")
+    rows = list(csv.reader(io.StringIO(text)))
+    assert [[row[3], row[5], row[9], row[10]] for row in rows] == expected
+    assert events == len(rows)
+
+
+def test_one_off_tasks_only_inside_the_range():
+    inside = CompactItem.from_dict(record("in", due_date="2027-01-05", start_date="2027-01-04"))
+    outside = CompactItem.from_dict(record("out", due_date="2026-11-30", start_date="2026-11-30"))
+    text, events = exported([inside, outside], "ics")
+    assert events == 1
+    assert [(e["UID"], e["DTSTART"], e["DTEND"]) for e in events_of(text)] == \
+        [("in@thing-tracker", "20270104T090000", "20270105T100000")]
+
+
+def test_escape():
+    assert _escape("a;b,c\\d\r\ne\nf") == "a\\;b\\,c\\\\d\\ne\\nf"
+
+
+@pytest.mark.parametrize("line", ["SUMMARY:" + "x" * 200, "SUMMARY:" + "日本語のタスク✓😀" * 20, "SUMMARY:é" * 40,
+                                  "SUMMARY:short"])
+def test_fold_keeps_lines_to_75_octets(line):
+    folded = _fold(line)
+    assert all(len(part.encode("utf-8")) <= 75 for part in folded.split("\r\n"))
+    assert folded.replace("\r\n ", "") == line
+
+
+def test_long_unicode_names_come_back_whole():
+    name = "Quarterly review; budget, hiring \\ plans — 日本語のメモ 😀 " * 4
+    task = CompactItem.from_dict(dict(record("u", due_date="2027-01-05", start_date="2027-01-05"), name=name, tags=["work, home", "emoji 😀"],
+                                      fields={"notes": "line one\nline two"}))
+    event, = events_of(exported([task], "ics")[0])
+    assert event["SUMMARY"] == _escape(name)
+    assert event["CATEGORIES"] == "work\\, home,emoji 😀"
+    assert event["DESCRIPTION"] == "notes: line one\\nline two"
+
+
+def test_export_calendar_writes_a_whole_file(task_dir):
+    import storage
+    storage.save_items([make_task("2026-12-02", "2026-12-02", "Weekly"),
+                        CompactItem.from_dict(record("csv", due_date="2026-12-03"))])
+    assert export_calendar("out.ics", first=FIRST, last=date(2026, 12, 31), jobs=1) == (2, 6)
+    text = (task_dir / "out.ics").read_bytes().decode("utf-8")
+    assert text.startswith("BEGIN:VCALENDAR\r\n") and text.endswith("END:VCALENDAR\r\n")
+    assert len(occurrences_in(text)) == 6
@@ -0,0 +1,41 @@
+from datetime import date
+import pytest
+import columnar
+from columnar import ColumnStore
+from query import linear_scan
+from tracker_model import CompactItem
+from conftest import record
+
+TODAY = date(2026, 11, 2)
+RECORDS = [record("a", due_date="2026-11-01", tags=["work"]),
+           record("b", due_date="2026-11-02", priority="High"),
+           record("c", due_date="2026-11-20", priority="High", completed=True),
+           record("d", due_date="not a date"),
+           record("e", due_date="2026-10-01", priority="Medium", tags=["work"])]
+QUERIES = ["due<=today done:no", "due>=today due<today+30", "priority:High", "priority>=Medium done:no",
+           "tag:work due<today", "due<0001-01-02", "due>9999-12-31",
+           "done:yes", ""]
+
+
+@pytest.fixture(params=["numpy", "loop"])
+def columns(request, monkeypatch):
+    if request.param == "loop":
+        monkeypatch.setattr(columnar, "np", None)
+    elif columnar.np is None:
+        pytest.skip("numpy isn't installed")
+    return ColumnStore.from_dicts(RECORDS)
+
+
+@pytest.mark.parametrize("text", QUERIES)
+def test_query_matches_linear_scan(columns, text):
+    items = [CompactItem.from_dict(r) for r in RECORDS]
+    expected = [item.id for item in linear_scan(text, items, TODAY)]
+    assert [item.id for item in columns.query(text, TODAY)] == expected
+
+
+def test_select_after_edits(columns):
+    columns.remove(["a"])
+    columns.update(CompactItem.from_dict(record("e", due_date="2026-10-01", completed=True)))
+    assert columns.items(columns.overdue(TODAY))[0].id == "b"
+    assert len(columns.overdue(TODAY)) == 1
+    assert [columns.ids[row] for row in columns.with_priority("High")] == ["b", "c"]
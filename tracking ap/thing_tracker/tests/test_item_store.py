@@ -0,0 +1,74 @@
+from contextlib import nullcontext
+from item_store import ItemStore
+from tracker_model import CompactItem
+from conftest import record
+
+
+class ExternalBackend:
+    # saves nothing, hands out whatever the test puts in external as other processes' records
+    def __init__(self, everything=None):
+        self.external = []
+        self.everything = everything
+        self.seq = 0
+
+    def stamp(self, records):
+        for record in records:
+            self.seq += 1
+            record["seq"] = self.seq
+
+    def append_records(self, records):
+        return False
+
+    def compact(self):
+        pass
+
+    def take_changes(self):
+        records, self.external = self.external, []
+        return records, self.everything is not None
+
+    def locked(self):
+        return nullcontext()
+
+    def stream_records(self):
+        return 0, iter(self.everything)
+
+
+def loaded_store(backend, delay):
+    store = ItemStore([CompactItem.from_dict(record("a"))], backend=backend)
+    store.writer.delay = store.writer.max_delay = delay
+    return store
+
+
+def test_edit_after_take_external_wins():
+    backend = ExternalBackend()
+    store = loaded_store(backend, 60)  # the edit below stays queued
+    backend.external = [{"op": "update", "item": record("a", priority="High"), "seq": 100}]
+    taken = store.take_external()
+
+    store.replace(CompactItem.from_dict(record("a", priority="Medium")))
+    assert store.apply_taken(*taken) == ([], [])
+    assert store.get("a").to_dict()["priority"] == "Medium"
+    store.writer.close()
+
+
+def test_later_external_record_replaces_a_written_edit():
+    backend = ExternalBackend()
+    store = loaded_store(backend, 0)
+    store.replace(CompactItem.from_dict(record("a", priority="Medium")))
+    assert store.writer.flush(5)
+    backend.external = [{"op": "update", "item": record("a", priority="High"), "seq": 100}]
+
+    assert store.apply_taken(*store.take_external()) == (["a"], [])
+    assert store.get("a").to_dict()["priority"] == "High"
+    store.writer.close()
+
+
+def test_resync_keeps_an_add_made_after_the_read():
+    backend = ExternalBackend(everything=[record("a", priority="High")])
+    store = loaded_store(backend, 60)
+    taken = store.take_external()
+
+    store.add(CompactItem.from_dict(record("b")))
+    assert store.apply_taken(*taken) == (["a"], [])
+    assert sorted(item.id for item in store) == ["a", "b"]
+    store.writer.close()
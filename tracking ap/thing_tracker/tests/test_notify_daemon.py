@@ -0,0 +1,111 @@
+import time
+import threading
+from datetime import datetime
+import pytest
+import storage
+from notifier import FakeNotifier
+from notify_daemon import NotificationDaemon
+from tracker_model import CompactItem
+from conftest import record
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def save(*records):
+    storage.save_items([CompactItem.from_dict(r) for r in records])
+
+
+def add(*records):
+    records = [{"op": "add", "item": r} for r in records]
+    storage.stamp(records)
+    storage.append_records(records)
+
+
+@pytest.fixture
+def daemon(task_dir):
+    save(record("standup", due_date="2026-11-02", start_date="2026-11-02", start_time="09:00", end_time="09:15"))
+    clock = Clock(datetime(2026, 11, 2, 8, 0))
+    daemon = NotificationDaemon(FakeNotifier(), clock=clock, poll_seconds=10000, watch=False)
+    daemon.load()
+    return daemon
+
+
+def test_reminders_fire_when_due_not_before(daemon):
+    assert daemon.next_deadline() == datetime(2026, 11, 2, 9, 0)
+    assert daemon.wait_seconds() == 3600
+
+    daemon.clock.now = datetime(2026, 11, 2, 8, 59, 30)
+    assert daemon.run_pending() == []
+    assert daemon.backend.sent == []
+
+    daemon.clock.now = datetime(2026, 11, 2, 9, 0)
+    assert [kind for _, _, kind in daemon.run_pending()] == ["starts"]
+    assert daemon.backend.sent == [("Thing Tracker", "standup starts at 2026-11-02 09:00")]
+    assert daemon.next_deadline() == datetime(2026, 11, 2, 9, 15)
+
+
+def test_reminders_due_together_go_out_as_one(daemon):
+    daemon.clock.now = datetime(2026, 11, 2, 9, 30)
+    assert len(daemon.run_pending()) == 2
+    summary, body = daemon.backend.sent[0]
+    assert summary == "Thing Tracker - 2 tasks"
+    assert body.splitlines() == ["standup starts at 2026-11-02 09:00", "standup due at 2026-11-02 09:15"]
+
+
+def test_edits_to_the_files_get_rescheduled(daemon):
+    add(record("early", due_date="2026-11-02", start_date="2026-11-02", start_time="08:30", end_time="08:45"))
+    changed, removed = daemon.poll_changes()
+    assert changed == ["early"] and removed == []
+    assert daemon.next_deadline() == datetime(2026, 11, 2, 8, 30)
+
+
+def test_overdue_summary(task_dir):
+    save(record("late", due_date="2026-11-01"), record("done", due_date="2026-11-01", completed=True),
+         record("later", due_date="2026-11-03"))
+    daemon = NotificationDaemon(FakeNotifier(), clock=Clock(datetime(2026, 11, 2, 8, 0)), watch=False)
+    daemon.load()
+    daemon.notify_overdue()
+    assert daemon.backend.sent == [("Thing Tracker - Due Tasks", "late (Due: 2026-11-01)")]
+
+
+def test_run_wakes_on_file_change(task_dir):
+    pytest.importorskip("watchdog")
+    save(record("first", due_date="2030-01-01"))
+    daemon = NotificationDaemon(FakeNotifier(), poll_seconds=1000)
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+    try:
+        while daemon.watcher is None:
+            time.sleep(0.01)
+        add(record("second", due_date="2030-01-01"))
+        end = time.monotonic() + 5
+        while "second" not in daemon.items and time.monotonic() < end:
+            time.sleep(0.05)
+        assert "second" in daemon.items
+    finally:
+        daemon.stop()
+        thread.join(5)
+
+
+def test_sqlite_appends_and_rewrites_get_picked_up(sqlite_backend):
+    early = record("early", start_time="08:30", end_time="08:45")
+    sqlite_backend.save_items([CompactItem.from_dict(record("a"))])
+    daemon = NotificationDaemon(FakeNotifier(), clock=Clock(datetime(2026, 11, 2, 8, 0)), watch=False)
+    daemon.load()
+
+    records = [{"op": "add", "item": early}]
+    sqlite_backend.stamp(records)
+    sqlite_backend.append_records(records)
+    assert daemon.poll_changes() == (["early"], [])
+    assert daemon.next_deadline() == datetime(2026, 11, 2, 8, 30)
+
+    # task_cli import rewrites every task and drops the change rows
+    sqlite_backend.save_items([CompactItem.from_dict(r) for r in (record("a"), early, record("b"))])
+    assert daemon.poll_changes() == (["b"], [])
+    assert sorted(daemon.records) == ["a", "b", "early"]
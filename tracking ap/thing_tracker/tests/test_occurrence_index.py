@@ -0,0 +1,37 @@
+from datetime import date
+from occurrence_index import OccurrenceIndex
+from tracker_model import CompactItem
+from conftest import record
+
+FIRST, LAST = date(2026, 11, 1), date(2026, 11, 7)
+
+
+def item(name, **changes):
+    return CompactItem.from_dict(record(name, **{"due_date": "2026-11-01", "start_date": "2026-11-01", **changes}))
+
+
+def test_recurring_without_start_is_always_shown_and_never_counted():
+    undated = item("undated", recurrence="Daily", start_date="")
+    daily = item("daily", recurrence="Daily")
+    index = OccurrenceIndex([undated, daily])
+
+    shown = {task.id for task, _ in index.window(FIRST, LAST, today=FIRST)}
+    assert shown == {"undated", "daily"}
+    assert index.counts(FIRST, LAST) == {day: 1 for day in
+                                         (date(2026, 11, d) for d in range(1, 8))}
+
+    index.remove(undated)
+    assert len(index.counts(FIRST, LAST)) == 7
+    index.remove(daily)
+    assert index.counts(FIRST, LAST) == {}
+
+
+def test_update_moves_a_task_between_always_and_series():
+    task = item("task", recurrence="Weekly", start_date="")
+    index = OccurrenceIndex([task])
+    assert index.counts(FIRST, LAST) == {}
+
+    index.update(item("task", recurrence="Weekly"))
+    assert index.counts(FIRST, LAST) == {FIRST: 1}
+    index.update(item("task", recurrence="Weekly", start_date=""))
+    assert index.counts(FIRST, LAST) == {}
@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+import pytest
+import item_store
+from item_store import ItemStore
+from persistence import WriteBehind
+from tracker_model import CompactItem
+from conftest import record
+
+
+class FlakyBackend:
+    # fails its first appends with the given errors, then saves
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.saved = []
+        self.seq = 0
+
+    def stamp(self, records):
+        for record in records:
+            self.seq += 1
+            record["seq"] = self.seq
+
+    def append_records(self, records):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.saved += records
+        return False
+
+    def compact(self):
+        pass
+
+    def take_changes(self):
+        return [], False
+
+
+def test_writer_survives_any_error(capsys):
+    backend = FlakyBackend(OSError("disk full"), RuntimeError("bug"))
+    writer = WriteBehind(delay=0.01, backend=backend)
+    writer.submit([{"op": "delete", "id": "a"}])
+    assert writer.flush(5)
+    assert [r["id"] for r in backend.saved] == ["a"]
+
+    writer.submit([{"op": "delete", "id": "b"}])
+    assert writer.flush(5)
+    assert [r["id"] for r in backend.saved] == ["a", "b"]
+    assert writer.close()
+    assert "RuntimeError: bug" in capsys.readouterr().err
+
+
+def test_merge_and_window_give_up_waiting_for_a_stuck_writer(monkeypatch):
+    monkeypatch.setattr(item_store, "FLUSH_SECONDS", 0.1)
+    backend = FlakyBackend(*[OSError("locked")] * 1000)
+    backend.select_window = lambda first, last, completed: []
+    store = ItemStore([], backend=backend)
+    store.add(CompactItem.from_dict(record("a")))
+
+    with pytest.raises(TimeoutError):
+        store.merge_external()
+    assert store.load_window("2026-11-01", "2026-11-30") == []
+    assert store._windows == []  # asked again on the next refresh
+
+    backend.errors = []
+    assert store.writer.flush(5)
+    assert store.merge_external() == ([], [])
+    store.writer.close()
+
+
+def test_sqlite_lock_held_past_the_timeout_is_retried(sqlite_backend):
+    store = ItemStore([], backend=sqlite_backend)
+    sqlite_backend._connect().execute("PRAGMA busy_timeout = 50")
+
+    # like task_cli import holding its transaction for longer than the timeout
+    other = sqlite3.connect(sqlite_backend.DB_FILE, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(OSError):
+        with sqlite_backend.locked():
+            pass
+
+    store.writer.delay = 0.01
+    store.add(CompactItem.from_dict(record("a")))
+    assert not store.writer.flush(0.3)
+    assert store.writer._thread.is_alive()
+
+    other.execute("COMMIT")
+    other.close()
+    assert store.writer.flush(10)
+    assert [item.id for item in sqlite_backend.load_items(CompactItem)] == ["a"]
+    store.writer.close()
@@ -0,0 +1,19 @@
+from datetime import date
+import pytest
+from query import parse, parse_day, QueryError
+
+TODAY = date(2026, 11, 2)
+
+
+def test_relative_days():
+    assert parse_day("today+30", TODAY) == date(2026, 12, 2)
+    assert parse_day("Yesterday", TODAY) == date(2026, 11, 1)
+    assert parse_day("2026-02-28", TODAY) == date(2026, 2, 28)
+
+
+@pytest.mark.parametrize("value", ["today+3000000", "today-3000000", "today+" + "9" * 5000, "2026-02-30", "soon"])
+def test_days_out_of_range_are_query_errors(value):
+    with pytest.raises(QueryError):
+        parse_day(value, TODAY)
+    with pytest.raises(QueryError):
+        parse(f"due<{value}", TODAY)
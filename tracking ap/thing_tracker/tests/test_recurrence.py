@@ -0,0 +1,137 @@
+import calendar
+from datetime import date, timedelta
+from itertools import islice
+import pytest
+import recurrence
+from recurrence import Series, add_months, occurrence_date, index_on_or_before
+from tracker_model import CompactItem
+from conftest import record
+
+FROM, TO = date(2024, 1, 1), date(2026, 12, 31)
+
+
+def lands_on(anchor, kind, day):
+    # whether the pattern started on anchor has an occurrence on day, checked from the calendar alone
+    if day < anchor:
+        return False
+    if kind in recurrence.STEP_DAYS:
+        return (day - anchor).days % recurrence.STEP_DAYS[kind] == 0
+    months = (day.year - anchor.year) * 12 + day.month - anchor.month
+    last = calendar.monthrange(day.year, day.month)[1]
+    return months % recurrence.STEP_MONTHS[kind] == 0 and day.day == min(anchor.day, last)
+
+
+def brute_force(task, until):
+    # every occurrence as (due, start, done, original), by walking the days one at a time
+    def walk(anchor):
+        day = anchor
+        while day <= until:
+            if lands_on(anchor, task.recurrence, day):
+                yield day
+            day += timedelta(days=1)
+
+    overrides = task.overrides or {}
+    found = []
+    for due, start in zip(walk(task.due), walk(task.start)):
+        entry = overrides.get(due.isoformat(), {})
+        if entry.get("skip"):
+            continue
+        new_due = date.fromisoformat(entry["due_date"]) if entry.get("due_date") else due
+        new_start = date.fromisoformat(entry["start_date"]) if entry.get("start_date") else start
+        found.append((new_due, new_start, bool(entry.get("done")), due))
+    return found
+
+
+def seen(occurrences):
+    return [(o.due, o.start, o.completed, o.original) for o in occurrences]
+
+
+def series_task(due, kind, start=None, overrides=None):
+    return CompactItem.from_dict(record("series", due_date=due, start_date=start or due, recurrence=kind,
+                                        overrides=overrides))
+
+
+@pytest.fixture(params=["numpy", "loop"])
+def expansion(request, monkeypatch):
+    if request.param == "loop":
+        monkeypatch.setattr(recurrence, "np", False)
+    elif not recurrence._numpy():
+        pytest.skip("numpy isn't installed")
+
+
+CASES = [
+    ("2024-01-31", "Monthly", "2024-01-30"),  # clamps to Feb 29, back on the 31st in March
+    ("2024-02-29", "Yearly", None),            # Feb 28 in the years between leap years
+    ("2024-03-31", "Monthly", "2024-03-01"),
+    ("2024-08-30", "Monthly", None),
+    ("2025-01-01", "Daily", None),
+    ("2024-05-06", "Weekly", "2024-05-05"),
+    ("2024-12-30", "Fortnightly", None),
+]
+
+OVERRIDES = {
+    "2024-02-29": {"skip": True},                                   # Monthly from Jan 31 lands here
+    "2024-04-30": {"done": True},
+    "2024-05-31": {"due_date": "2024-08-15"},                       # moved past two of its neighbours
+    "2024-06-30": {"due_date": "2024-06-01", "done": True},        # moved before the one it followed
+    "2024-07-31": {"start_date": "2024-07-01"},
+    "2024-03-15": {"done": True},                                   # no occurrence there, ignored
+    "2025-02-28": {"skip": True},
+    "2025-01-08": {"due_date": "2025-01-02"},
+    "2026-02-28": {"done": True, "due_date": "2026-03-03"},
+}
+
+
+@pytest.mark.parametrize("due, kind, start", CASES)
+@pytest.mark.parametrize("overrides", [None, OVERRIDES], ids=["plain", "overridden"])
+def test_between_matches_day_by_day(expansion, due, kind, start, overrides):
+    task = series_task(due, kind, start, overrides)
+    expected = sorted(o for o in brute_force(task, TO + timedelta(days=400)) if FROM <= o[0] <= TO)
+    found = Series(task).between(FROM, TO)
+    assert sorted(seen(found)) == expected
+    assert [o.due for o in found] == sorted(o.due for o in found)
+
+
+@pytest.mark.parametrize("due, kind, start", CASES)
+def test_previous_next_following_match_day_by_day(due, kind, start):
+    task = series_task(due, kind, start, OVERRIDES)
+    every = sorted(brute_force(task, date(2040, 12, 31)))  # 8 yearly ones past the last day asked about
+    series = Series(task)
+    for day in (date(2024, 1, 15), date(2024, 2, 29), date(2024, 5, 31), date(2024, 6, 15), date(2025, 1, 5),
+                date(2026, 3, 1)):
+        before = [o for o in every if o[0] <= day]
+        previous = series.previous(day)
+        assert (previous.due if previous else None) == (before[-1][0] if before else None)
+        assert series.next(day).due == next(o[0] for o in every if o[0] > day)
+        assert [o.due for o in islice(series.following(day), 8)] == [o[0] for o in every if o[0] >= day][:8]
+
+
+def test_overrides_stop_matching_when_the_anchor_moves():
+    task = series_task("2024-01-31", "Monthly", overrides={"2024-04-30": {"skip": True}})
+    april = date(2024, 4, 1), date(2024, 4, 30)
+    assert Series(task).between(*april) == []
+    task.due_date = "2024-01-15"
+    task.start_date = "2024-01-15"
+    assert [o.due for o in Series(task).between(*april)] == [date(2024, 4, 15)]
+
+
+def test_monthly_clamping_is_counted_from_the_anchor():
+    anchor = date(2024, 1, 31)
+    assert [occurrence_date(anchor, "Monthly", n) for n in range(4)] == \
+        [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    assert add_months(date(2024, 2, 29), 12) == date(2025, 2, 28)
+    assert occurrence_date(date(2024, 2, 29), "Yearly", 4) == date(2028, 2, 29)
+    assert index_on_or_before(anchor, "Monthly", date(2024, 3, 30)) == 1
+    assert index_on_or_before(anchor, "Monthly", date(2024, 1, 30)) == -1
+
+
+def test_set_override_and_take_it_back():
+    task = series_task("2024-01-31", "Monthly")
+    recurrence.set_override(task, date(2024, 3, 31), skip=True)
+    recurrence.set_override(task, date(2024, 4, 30), due_date="2024-05-02")
+    assert task.overrides == {"2024-03-31": {"skip": True}, "2024-04-30": {"due_date": "2024-05-02"}}
+    recurrence.set_override(task, date(2024, 3, 31), skip=False)
+    recurrence.clear_override(task, date(2024, 4, 30))
+    assert task.overrides is None
+    with pytest.raises(ValueError):
+        recurrence.set_override(task, date(2024, 3, 31), name="renamed")
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+from search_index import SearchIndex
+from query import linear_scan
+from utils import filter_items
+
+
+def task(item_id, name, tags=()):
+    return SimpleNamespace(id=item_id, name=name, tags=list(tags), completed=False)
+
+
+ITEMS = [task("1", "Finish work report", ["Work"]), task("2", "Learn c++ #basics"), task("3", "Homework")]
+
+
+def found(query):
+    return sorted(SearchIndex(ITEMS).match_keys(query))
+
+
+def test_words_match_by_prefix():
+    assert found("wor") == ["1"]
+    assert found("ork") == []
+    assert found("rep fin") == ["1"]
+    assert found("") == ["1", "2", "3"]
+
+
+def test_text_without_words_matches_as_substring():
+    assert found("#") == ["2"]
+    assert found("++") == ["2"]
+    assert found("@") == []
+
+
+def test_linear_scan_agrees():
+    for query in ("wor", "ork", "#", "++", "@"):
+        assert sorted(item.id for item in linear_scan(query, ITEMS)) == found(query)
+
+
+def test_filter_items_without_an_index_agrees():
+    index = SearchIndex(ITEMS)
+    for query in ("wor", "ork", "rep fin", "#", "++", "@", "", "  "):
+        assert sorted(item.id for item in filter_items(ITEMS, query)) == \
+            sorted(item.id for item in filter_items(ITEMS, query, index))
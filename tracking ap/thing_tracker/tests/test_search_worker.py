@@ -0,0 +1,40 @@
+import time
+from types import SimpleNamespace
+import pytest
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+from search_worker import SearchWorker
+
+
+class BrokenStore:
+    # the ids of the rows whose task id is in the text, anything with "bad" in it is a bug
+    def query_ids(self, text, today, cancelled):
+        if "bad" in text:
+            raise OverflowError("date value out of range")
+        return set(text.split())
+
+
+APP = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])  # delivers the signals
+
+
+def wait_for(results, count):
+    end = time.monotonic() + 5
+    while len(results) < count and time.monotonic() < end:
+        APP.processEvents()
+        time.sleep(0.01)
+    return results
+
+
+def test_search_after_a_failed_one_still_answers(capsys):
+    worker = SearchWorker(BrokenStore())
+    results = []
+    worker.failed.connect(lambda generation, why: results.append((generation, why)))
+    worker.found.connect(lambda generation, rows, first: results.append((generation, [r.task.id for r in rows])))
+    rows = [SimpleNamespace(task=SimpleNamespace(id=item_id)) for item_id in ("a", "b")]
+
+    bad = worker.search("bad", rows)
+    assert wait_for(results, 1) == [(bad, "date value out of range")]
+    good = worker.search("b", rows)
+    assert wait_for(results, 2)[1] == (good, ["b"])
+    assert worker._thread.is_alive()
+    assert "OverflowError" in capsys.readouterr().err
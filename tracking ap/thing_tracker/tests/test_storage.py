@@ -0,0 +1,77 @@
+import json
+import os
+import storage
+from conftest import record
+
+
+def write_journal(lines, tail=b""):
+    with open(storage.JOURNAL_FILE, "wb") as f:
+        for line in lines:
+            f.write(json.dumps(line).encode() + b"\n")
+        f.write(tail)
+
+
+def names(items):
+    return sorted(item.name for item in items)
+
+
+def test_torn_last_journal_line_is_dropped(task_dir):
+    write_journal([{"op": "add", "item": record("a"), "seq": 1}, {"op": "add", "item": record("b"), "seq": 2}],
+                  tail=b'{"op": "add", "item": {"name": "c"')
+    good = os.path.getsize(storage.JOURNAL_FILE) - len(b'{"op": "add", "item": {"name": "c"')
+
+    assert names(storage.load_items()) == ["a", "b"]
+    assert os.path.getsize(storage.JOURNAL_FILE) == good
+
+    # the next append starts on a line of its own
+    records = [{"op": "add", "item": record("d")}]
+    storage.stamp(records)
+    storage.append_records(records)
+    assert [r["item"]["name"] for r in storage.read_journal()[0]] == ["a", "b", "d"]
+
+
+def test_crash_between_snapshot_and_rotate(task_dir):
+    # the snapshot took in everything up to seq 5 but the journal wasn't rotated yet
+    storage._write_snapshot(5, [record("a", priority="High"), record("c")])
+    write_journal([{"op": "update", "item": record("a"), "seq": 4},
+                   {"op": "add", "item": record("c"), "seq": 5},
+                   {"op": "add", "item": record("b"), "seq": 6}])
+
+    items = storage.load_items()
+    assert names(items) == ["a", "b", "c"]
+    assert {item.name: item.priority for item in items}["a"] == "High"
+    assert storage._seq == 6
+
+    seq, records = storage.stream_records()
+    assert seq == 6
+    assert sorted(r["id"] for r in records) == ["a", "b", "c"]
+
+
+def test_crash_between_snapshot_and_rotate_lazy(task_dir):
+    storage._write_snapshot(5, [record("a", priority="High"), record("c", completed=True)])
+    write_journal([{"op": "update", "item": record("a"), "seq": 4},
+                   {"op": "delete", "id": "c", "seq": 5},
+                   {"op": "add", "item": record("b"), "seq": 6}])
+
+    active, rest = storage.load_items_lazy()
+    assert {item.name: item.priority for item in active} == {"a": "High", "b": "Low"}
+    assert names(rest) == ["c"]
+
+
+def test_legacy_bare_list_snapshot(task_dir):
+    legacy = [record("a"), record("b")]
+    for item in legacy:
+        del item["id"]
+    with open(storage.STORAGE_FILE, "w") as f:
+        json.dump(legacy, f)
+
+    items = storage.load_items()
+    assert names(items) == ["a", "b"]
+    assert all(item.id for item in items)
+
+    # the ids given out are written back, so the next load keeps them
+    with open(storage.STORAGE_FILE) as f:
+        data = json.load(f)
+    assert data["seq"] == 0
+    assert {item["id"] for item in data["items"]} == {item.id for item in items}
+    assert {item.id for item in storage.load_items()} == {item.id for item in items}
@@ -0,0 +1,37 @@
+import json
+import task_cli
+from tracker_model import CompactItem
+from conftest import record
+
+
+def exported(tmp_path):
+    path = tmp_path / "out.jsonl"
+    task_cli.export_tasks(str(path))
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_export_import_round_trip_keeps_one_copy(any_backend, tmp_path):
+    any_backend.save_items([CompactItem.from_dict(record(name)) for name in ("a", "b", "c")])
+    path = tmp_path / "tasks.jsonl"
+    task_cli.export_tasks(str(path))
+
+    progress = task_cli.import_tasks(str(path))
+    assert progress.count == 3 and progress.replaced == 3
+
+    assert sorted(r["id"] for r in exported(tmp_path)) == ["a", "b", "c"]
+    active, rest = any_backend.load_items_lazy(CompactItem)
+    assert sorted(item.id for item in list(active) + list(rest or ())) == ["a", "b", "c"]
+    assert len(any_backend.load_items(CompactItem)) == 3
+
+
+def test_import_replaces_same_id_and_adds_new(any_backend, tmp_path):
+    any_backend.save_items([CompactItem.from_dict(record(name)) for name in ("a", "b")])
+    path = tmp_path / "tasks.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in [record("b", priority="High"), record("c"),
+                                                         record("c", priority="Medium")]) + "\n")
+
+    task_cli.import_tasks(str(path))
+    by_id = {r["id"]: r for r in exported(tmp_path)}
+    assert sorted(by_id) == ["a", "b", "c"]
+    assert by_id["b"]["priority"] == "High"
+    assert by_id["c"]["priority"] == "Medium"  # the last record for an id wins
@@ -0,0 +1,101 @@
+import json
+import asyncio
+import pytest
+from item_store import ItemStore
+from service_client import ServiceBackend, ServiceError
+from task_service import TaskService
+from tracker_model import CompactItem
+from conftest import record
+
+
+class Sent:
+    # stands in for a client's connection, keeps the lines the service wrote to it
+    def __init__(self):
+        self.messages = []
+
+    def write(self, data):
+        self.messages.append(json.loads(data))
+
+
+class FakeClient:
+    def __init__(self, result):
+        self.result = result
+
+    def subscribe(self, callback):
+        pass
+
+    def call(self, op, **request):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def test_apply_keeps_the_edits_it_can_take(task_dir):
+    legacy = record("old", due_date="someday")  # loaded from files written before validation
+    store = ItemStore([CompactItem.from_dict(legacy), CompactItem.from_dict(record("gone"))])
+    service = TaskService(store)
+    writer = Sent()
+    records = [{"op": "update", "item": dict(legacy, completed=True)},
+               {"op": "add", "item": {"id": "broken", "tags": []}},
+               {"op": "delete", "id": "gone"},
+               {"op": "rename", "id": "old"}]
+
+    asyncio.run(service.apply({"id": 7, "records": records}, writer))
+    result = writer.messages[0]["result"]
+    assert result["seqs"] == [1, None, 2, None]
+    assert [index for index, _ in result["rejected"]] == [1, 3]
+    assert store.get("old").completed and store.get("old").to_dict()["due_date"] == "someday"
+    assert "gone" not in store and "broken" not in store
+    assert store.writer.close()
+
+
+def test_turned_down_edit_resyncs_the_window(capsys):
+    client = FakeClient({"seqs": [5, None], "rejected": [[1, "name must be text and tags a list"]]})
+    backend = ServiceBackend(client)
+    woken = []
+    backend.watch(lambda: woken.append(True))
+    records = [{"op": "update", "item": record("a"), "seq": 1}, {"op": "add", "item": record("b"), "seq": 2}]
+
+    backend.append_records(records)
+    assert records[0]["seq"] == 5
+    assert "edit to b" in capsys.readouterr().out
+    assert backend.take_changes() == ([], True)
+    assert woken
+
+
+def test_turned_down_batch_resyncs_the_window():
+    backend = ServiceBackend(FakeClient(ServiceError("'records' missing")))
+    assert backend.append_records([{"op": "delete", "id": "a", "seq": 1}]) is False
+    assert backend.take_changes() == ([], True)
+
+
+class Stop(BaseException):
+    # gets out of merge_files' loop, which carries on after any Exception
+    pass
+
+
+def test_merge_files_carries_on_after_an_error(task_dir, monkeypatch, capsys):
+    import task_service
+    monkeypatch.setattr(task_service, "MERGE_SECONDS", 0)
+    store = ItemStore([])
+    service = TaskService(store)
+    calls = []
+
+    def take_external():
+        calls.append(True)
+        if len(calls) == 1:
+            raise RuntimeError("bug")
+        if len(calls) == 3:
+            raise Stop
+        return 0, [{"op": "add", "item": record("x"), "seq": 1}], None
+
+    monkeypatch.setattr(store, "take_external", take_external)
+    published = []
+    monkeypatch.setattr(service, "publish", published.append)
+
+    with pytest.raises(Stop):
+        asyncio.run(service.merge_files())
+    assert len(calls) == 3
+    assert published == [[{"op": "update", "item": record("x")}]]
+    assert "RuntimeError: bug" in capsys.readouterr().err
+    store.writer.close()
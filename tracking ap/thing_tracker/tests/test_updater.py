@@ -0,0 +1,98 @@
+import os
+import json
+import hashlib
+import threading
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+import pytest
+import updater
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def release(tmp_path, monkeypatch):
+    # a folder served over http the way the raw GitHub files are, and an app folder to update
+    served, app = tmp_path / "release", tmp_path / "app"
+    served.mkdir()
+    app.mkdir()
+    logged = []
+    monkeypatch.setattr(updater, "log_message", logged.append)
+    server = HTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(served)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield served, app, f"http://127.0.0.1:{server.server_port}/", logged
+    server.shutdown()
+    server.server_close()
+
+
+def publish(served, files, hashes=None):
+    for fname, content in files.items():
+        (served / fname).write_bytes(content)
+    manifest = {"version": "2.0", "files": {fname: hashlib.sha256(content).hexdigest()
+                                            for fname, content in files.items()}}
+    manifest["files"].update(hashes or {})
+    (served / updater.MANIFEST_FILE).write_text(json.dumps(manifest))
+
+
+def test_only_changed_files_are_fetched(release):
+    served, app, url, _ = release
+    (app / "main.py").write_bytes(b"old main")
+    (app / "utils.py").write_bytes(b"same")
+    publish(served, {"main.py": b"new main", "utils.py": b"same", "query.py": b"new file"})
+
+    assert updater.download_and_replace_files(str(app), url) == []
+    assert (app / "main.py").read_bytes() == b"new main"
+    assert (app / "query.py").read_bytes() == b"new file"
+    assert [p for p in os.listdir(app) if p.startswith(".update-")] == []
+
+
+def test_hash_mismatch_replaces_nothing(release):
+    served, app, url, _ = release
+    (app / "main.py").write_bytes(b"old main")
+    (app / "utils.py").write_bytes(b"old utils")
+    publish(served, {"main.py": b"new main", "utils.py": b"new utils"}, {"utils.py": "0" * 64})
+
+    errors = updater.download_and_replace_files(str(app), url)
+    assert len(errors) == 1 and "utils.py" in errors[0] and "hash mismatch" in errors[0]
+    assert (app / "main.py").read_bytes() == b"old main"
+    assert (app / "utils.py").read_bytes() == b"old utils"
+
+
+def test_failed_swap_rolls_back(release, monkeypatch):
+    served, app, url, logged = release
+    (app / "main.py").write_bytes(b"old main")
+    publish(served, {"main.py": b"new main", "utils.py": b"new utils"})
+    replace = os.replace
+
+    def fail_on_utils(src, dst):
+        if os.path.basename(dst) == "utils.py":
+            raise OSError("disk full")
+        replace(src, dst)
+    monkeypatch.setattr(os, "replace", fail_on_utils)
+
+    errors = updater.download_and_replace_files(str(app), url)
+    assert len(errors) == 1 and "rolled back" in errors[0] and "disk full" in errors[0]
+    assert (app / "main.py").read_bytes() == b"old main"
+    assert not (app / "utils.py").exists()
+    assert "Rolled back main.py." in logged
+
+
+def test_names_outside_the_app_folder_are_refused(release):
+    served, app, url, _ = release
+    inner = app / "inner"
+    inner.mkdir()
+    (served / "x.py").write_bytes(b"evil")
+    publish(served, {"main.py": b"new main"}, {"../x.py": hashlib.sha256(b"evil").hexdigest()})
+
+    errors = updater.download_and_replace_files(str(inner), url)
+    assert len(errors) == 1 and "../x.py" in errors[0]
+    assert not (app / "x.py").exists()
+    assert os.listdir(inner) == []
+
+
+@pytest.mark.parametrize("fname", ["../x.py", "/etc/x.py", "sub/x.py", "..", "", "a\\b.py"])
+def test_safe_name(fname):
+    assert not updater.safe_name(fname)
@@ -1,6 +1,69 @@
+import sys
+import uuid
 from dataclasses import dataclass, asdict, field
+from datetime import date
+from enum import IntEnum
+from types import MappingProxyType
 from typing import List, Dict
 
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+class Priority(IntEnum):
+    Low = 0
+    Medium = 1
+    High = 2
+
+
+PRIORITY_BY_NAME = {priority.name: priority for priority in Priority}
+NO_FIELDS = MappingProxyType({})
+
+# distinct date/time strings are few, parse each once and share the result
+_dates = {}
+_minutes = {}
+
+
+def parse_date(value):
+    # YYYY-MM-DD to a date, None for anything that wouldn't format back the same
+    try:
+        return _dates[value]
+    except KeyError:
+        pass
+    except TypeError:
+        return None
+    try:
+        parsed = date.fromisoformat(value)
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is not None and parsed.isoformat() != value:
+        parsed = None
+    _dates[value] = parsed
+    return parsed
+
+
+def parse_minutes(value):
+    # HH:mm to minutes after midnight
+    try:
+        return _minutes[value]
+    except KeyError:
+        pass
+    except TypeError:
+        return None
+    minutes = None
+    if isinstance(value, str) and len(value) == 5 and value[2] == ":" and value[:2].isdigit() and value[3:].isdigit():
+        hours, mins = int(value[:2]), int(value[3:])
+        if hours < 24 and mins < 60:
+            minutes = hours * 60 + mins
+    _minutes[value] = minutes
+    return minutes
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
 @dataclass
 class TrackedItem:
     name: str
@@ -13,9 +76,24 @@ class TrackedItem:
     fields: Dict[str, str]
     start_date: str = field(default_factory=lambda: "")
     recurrence: str = field(default_factory=lambda: "None")
+    id: str = field(default_factory=new_id)
+    # exceptions to a recurring task, original due date (YYYY-MM-DD) -> {"done", "skip",
+    # "due_date", "start_date"}. Only occurrences that differ from the pattern have one
+    overrides: Dict[str, dict] = field(default_factory=dict)
+
+    @property
+    def due(self):
+        return parse_date(self.due_date)
+
+    @property
+    def start(self):
+        return parse_date(self.start_date)
 
     def to_dict(self):
-        return asdict(self)
+        data = asdict(self)
+        if not data["overrides"]:
+            del data["overrides"]  # only series with exceptions carry the key
+        return data
 
     @staticmethod
     def from_dict(data):
@@ -23,4 +101,152 @@ class TrackedItem:
             data["start_date"] = ""
         if "recurrence" not in data:
             data["recurrence"] = "None"
+        if "id" not in data:
+            data["id"] = new_id()
         return TrackedItem(**data)
+
+
+class CompactItem:
+    # same fields as TrackedItem, parsed once: dates as date, times as minutes, priority as Priority.
+    # Values that don't parse are kept verbatim in _raw so to_dict still gives back what was loaded.
+    __slots__ = ("id", "name", "tags", "due", "start", "start_minutes", "end_minutes",
+                 "completed", "level", "fields", "recurrence", "overrides", "_raw")
+
+    def __init__(self, name, tags, due_date, start_time, end_time, completed, priority, fields,
+                 start_date="", recurrence="None", id=None, overrides=None):
+        # same as going through the property setters, inlined because this runs per item at load
+        raw = {}
+        self.id = id or new_id()
+        self.name = name
+        self.tags = tuple(tags)
+        self.completed = completed
+        self.fields = fields or NO_FIELDS
+        self.recurrence = sys.intern(recurrence)
+        self.overrides = overrides or None  # as in TrackedItem, None for the usual no exceptions
+        self.due = parse_date(due_date)
+        if self.due is None and due_date:
+            raw["due_date"] = due_date
+        self.start = parse_date(start_date)
+        if self.start is None and start_date:
+            raw["start_date"] = start_date
+        self.start_minutes = parse_minutes(start_time)
+        if self.start_minutes is None and start_time:
+            raw["start_time"] = start_time
+        self.end_minutes = parse_minutes(end_time)
+        if self.end_minutes is None and end_time:
+            raw["end_time"] = end_time
+        self.level = PRIORITY_BY_NAME.get(priority)
+        if self.level is None and priority:
+            raw["priority"] = priority
+        self._raw = raw or None
+
+    def _get_raw(self, key):
+        return self._raw.get(key, "") if self._raw else ""
+
+    def _set_raw(self, key, value):
+        if self._raw:
+            self._raw.pop(key, None)
+        if value:
+            if self._raw is None:
+                self._raw = {}
+            self._raw[key] = value
+        if not self._raw:
+            self._raw = None
+
+    def _set_date(self, attr, key, value):
+        parsed = parse_date(value)
+        setattr(self, attr, parsed)
+        self._set_raw(key, None if parsed is not None else value)
+
+    def _set_time(self, attr, key, value):
+        minutes = parse_minutes(value)
+        setattr(self, attr, minutes)
+        self._set_raw(key, None if minutes is not None else value)
+
+    @property
+    def due_date(self):
+        return self.due.isoformat() if self.due is not None else self._get_raw("due_date")
+
+    @due_date.setter
+    def due_date(self, value):
+        self._set_date("due", "due_date", value)
+
+    @property
+    def start_date(self):
+        return self.start.isoformat() if self.start is not None else self._get_raw("start_date")
+
+    @start_date.setter
+    def start_date(self, value):
+        self._set_date("start", "start_date", value)
+
+    @property
+    def start_time(self):
+        if self.start_minutes is None:
+            return self._get_raw("start_time")
+        return format_minutes(self.start_minutes)
+
+    @start_time.setter
+    def start_time(self, value):
+        self._set_time("start_minutes", "start_time", value)
+
+    @property
+    def end_time(self):
+        if self.end_minutes is None:
+            return self._get_raw("end_time")
+        return format_minutes(self.end_minutes)
+
+    @end_time.setter
+    def end_time(self, value):
+        self._set_time("end_minutes", "end_time", value)
+
+    @property
+    def priority(self):
+        return self.level.name if self.level is not None else self._get_raw("priority")
+
+    @priority.setter
+    def priority(self, value):
+        self.level = PRIORITY_BY_NAME.get(value)
+        self._set_raw("priority", None if self.level is not None else value)
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "tags": list(self.tags),
+            "due_date": self.due_date,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "completed": self.completed,
+            "priority": self.priority,
+            "fields": dict(self.fields),
+            "start_date": self.start_date,
+            "recurrence": self.recurrence,
+            "id": self.id,
+        }
+        if self.overrides:
+            # entries are replaced rather than changed (see set_override), so they can be shared
+            data["overrides"] = dict(self.overrides)
+        return data
+
+    @staticmethod
+    def from_dict(data):
+        return CompactItem(
+            data["name"],
+            data["tags"],
+            data["due_date"],
+            data["start_time"],
+            data["end_time"],
+            data["completed"],
+            data["priority"],
+            data["fields"],
+            data.get("start_date", ""),
+            data.get("recurrence", "None"),
+            data.get("id"),
+            data.get("overrides")
+        )
+
+    @staticmethod
+    def from_item(item):
+        return CompactItem.from_dict(item.to_dict())
+
+    def __repr__(self):
+        return f"CompactItem({self.name!r}, due={self.due_date!r}, id={self.id!r})"
@@ -3,22 +3,33 @@ import os
 import subprocess
 from PyQt5.QtWidgets import (
     QWidget, QMainWindow, QVBoxLayout, QHBoxLayout,
-    QLineEdit, QPushButton, QTreeWidget, QTreeWidgetItem,
+    QLineEdit, QPushButton, QTreeView,
     QComboBox, QDateEdit, QCheckBox, QLabel, QCalendarWidget,
-    QTimeEdit, QMessageBox, QApplication
+    QTimeEdit, QMessageBox, QApplication, QMenu, QInputDialog
 )
-from PyQt5.QtCore import Qt, QDate, QTime
-from tracker_model import TrackedItem
-from storage import save_items, load_items
-from utils import filter_items
+from PyQt5.QtCore import Qt, QDate, QTime, QEvent, QTimer, QFileSystemWatcher, pyqtSignal
+from PyQt5.QtGui import QColor, QTextCharFormat
+from tracker_model import CompactItem, parse_date
+from backend import current as current_backend, service
+from item_store import ItemStore
+from search_worker import SearchWorker
+from task_list_model import TaskListModel, TaskFilterProxy, TaskRow, ID_ROLE
+from recurrence import Series, is_recurring, as_date, set_override, clear_override
+import perf
 from datetime import datetime, date, timedelta
-try:
-    from notifier import send_notification
-except ImportError:
-    send_notification = None
+from time import perf_counter_ns
+
+LOAD_CHUNK = 20000  # completed tasks pulled in per event loop turn after the first paint
+HEAT_COLOR = (255, 140, 0)
+MERGE_DELAY_MS = 100   # a burst of file events from another instance becomes one merge
+MERGE_REBUILD_AT = 500  # more changed tasks than this and the whole list gets rebuilt instead
+MERGE_RETRY_MS = 1000   # how long to wait before trying again when the task service is away
+SEARCH_DELAY_MS = 150   # typing has to pause this long before a search starts
 
 
 class MainWindow(QMainWindow):
+    store_changed = pyqtSignal()  # from the task service's reader thread
+
     def load_app_version(self):
         try:
             base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
@@ -35,11 +46,45 @@ class MainWindow(QMainWindow):
         self.setWindowTitle(f"Thing Tracker v{self.APP_VERSION}")
         self.setMinimumSize(950, 700)
 
-        self.items = load_items()
+        # incomplete tasks now, completed ones once the window is up, or with sqlite
+        # only those the list and calendar show (ItemStore.load_window). With the task
+        # service the tasks come from it and edits go to it, the files are left to it
+        backend = service() or current_backend()
+        self.items = ItemStore(*backend.load_items_lazy(CompactItem), backend=backend)
+        app = QApplication.instance()
+        if app:
+            app.aboutToQuit.connect(self.items.writer.close)
+
+        self._rows = {}  # task id -> TaskRow last shown for it
+        self._painted = False
+        self._after_paint = []
 
         self.init_ui()
+        self.perf_panel = None
+        if perf.ENABLED:
+            from perf_panel import PerfPanel
+            self.perf_panel = PerfPanel(self)
+            self.addDockWidget(Qt.RightDockWidgetArea, self.perf_panel)
         self.refresh_list()
-        self.check_notifications()
+        self.update_heat()
+        self.watch_store()
+        self.after_first_paint(self.check_notifications)
+        self.after_first_paint(self.load_deferred)
+
+    def after_first_paint(self, callback):
+        # keeps D-Bus and network work from holding up the first frame
+        if self._painted:
+            QTimer.singleShot(0, callback)
+        else:
+            self._after_paint.append(callback)
+
+    def event(self, event):
+        if event.type() == QEvent.Paint and not self._painted:
+            self._painted = True
+            for callback in self._after_paint:
+                QTimer.singleShot(0, callback)
+            self._after_paint = []
+        return super().event(event)
 
     def init_ui(self):
         central = QWidget()
@@ -124,23 +169,41 @@ class MainWindow(QMainWindow):
 
         search_layout = QHBoxLayout()
         self.search_bar = QLineEdit()
-        self.search_bar.setPlaceholderText("Search by name or tag")
-        self.search_bar.textChanged.connect(self.refresh_list)
+        self.search_bar.setPlaceholderText("Search by name or tag, or like: tag:work priority:High due<today+7 done:no")
+        self.search_bar.textChanged.connect(self.search_typed)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.apply_search)
+        self._typed_at = 0
         search_layout.addWidget(QLabel("Search:"))
         search_layout.addWidget(self.search_bar)
         main_layout.addLayout(search_layout)
 
-        self.tree = QTreeWidget()
-        self.tree.setColumnCount(9)
-        self.tree.setHeaderLabels([
-            "Name", "Tags", "Start Date", "Start Time", "Due", "End Time", "Priority", "Recurrence", "Done"
-        ])
-        self.tree.setDragDropMode(QTreeWidget.InternalMove)
-        self.tree.itemChanged.connect(self.handle_item_changed)
+        self.model = TaskListModel(self)
+        self.model.completion_changed.connect(self.handle_item_changed)
+        # shown instead of the list while there's a search, filled in chunks by the worker
+        self.results = TaskListModel(self)
+        self.results.completion_changed.connect(self.handle_item_changed)
+        self._search = 0  # generation of the search whose results count
+        self.searcher = SearchWorker(self.items, self)
+        self.searcher.found.connect(self.show_results)
+        self.searcher.failed.connect(self.show_search_error)
+        self.proxy = TaskFilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.sort(2, Qt.AscendingOrder)
+
+        self.tree = QTreeView()
+        self.tree.setModel(self.proxy)
+        self.tree.setRootIsDecorated(False)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tree.customContextMenuRequested.connect(self.show_row_menu)
         main_layout.addWidget(self.tree)
 
         self.calendar = QCalendarWidget()
         self.calendar.selectionChanged.connect(self.refresh_list)
+        self.calendar.currentPageChanged.connect(self.update_heat)
         main_layout.addWidget(QLabel("Filter from Due Date:"))
         main_layout.addWidget(self.calendar)
 
@@ -155,7 +218,7 @@ class MainWindow(QMainWindow):
         completed = self.completed_input.isChecked()
         recurrence = self.repeat_input.currentText()
 
-        item = TrackedItem(
+        item = CompactItem(
             name=name,
             tags=tags,
             start_date=start_date,
@@ -167,10 +230,13 @@ class MainWindow(QMainWindow):
             recurrence=recurrence,
             fields={}
         )
-        self.items.append(item)
-        save_items(self.items)
+        self.items.add(item)
         self.clear_inputs()
-        self.refresh_list()
+        from_dt, to_dt = self.visible_window()
+        for occurrence in self.generate_recurrences(item, from_dt, to_dt):
+            self.model.append_row(TaskRow(item, occurrence))
+        self.update_heat()
+        self.search_again()
 
     def clear_inputs(self):
         self.name_input.clear()
@@ -185,157 +251,257 @@ class MainWindow(QMainWindow):
         self.recur_count_input.clear()
         self.recur_end_date_input.setDate(QDate.currentDate().addYears(1))
 
+    @perf.timed("generate_recurrences")
     def generate_recurrences(self, task, from_date, to_date):
-        try:
-            start_due = datetime.strptime(task.due_date, "%Y-%m-%d")
-            start_start = datetime.strptime(task.start_date, "%Y-%m-%d")
-        except Exception:
+        due = task.due
+        if due is None or task.start is None:
             return [task]
 
-        recurrence = getattr(task, 'recurrence', 'None')
-        if recurrence == 'None':
-            if from_date <= start_due <= to_date:
+        if not is_recurring(getattr(task, 'recurrence', 'None')):
+            if as_date(from_date) <= due <= as_date(to_date):
                 return [task]
             return []
 
-        current_due = start_due
-        current_start = start_start
-        delta_map = {
-            'Daily': timedelta(days=1),
-            'Weekly': timedelta(weeks=1),
-            'Fortnightly': timedelta(weeks=2),
-            'Monthly': None,
-            'Yearly': None,
-        }
-        delta = delta_map.get(recurrence)
-
-        def add_months(dt, months):
-            month = dt.month - 1 + months
-            year = dt.year + month // 12
-            month = month % 12 + 1
-            day = min(dt.day, [31,
-                29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28,
-                31,30,31,30,31,31,30,31,30,31][month-1])
-            return datetime(year, month, day)
-
-        generated = []
-        while current_due <= to_date:
-            new_task = TrackedItem(
-                name=task.name,
-                tags=task.tags,
-                start_date=current_start.strftime("%Y-%m-%d"),
-                start_time=task.start_time,
-                due_date=current_due.strftime("%Y-%m-%d"),
-                end_time=task.end_time,
-                completed=False,
-                priority=task.priority,
-                recurrence=task.recurrence,
-                fields=task.fields.copy() if hasattr(task.fields, 'copy') else {}
-            )
-            generated.append(new_task)
-
-            if recurrence == 'Monthly':
-                current_due = add_months(current_due, 1)
-                current_start = add_months(current_start, 1)
-            elif recurrence == 'Yearly':
-                current_due = add_months(current_due, 12)
-                current_start = add_months(current_start, 12)
-            else:
-                current_due += delta
-                current_start += delta
-
-        today = datetime.today()
-        incomplete = [g for g in generated if datetime.strptime(g.due_date, "%Y-%m-%d") <= today and not g.completed]
-        if incomplete:
-            return [incomplete[-1]]
-        upcoming = [g for g in generated if datetime.strptime(g.due_date, "%Y-%m-%d") > today]
-        if upcoming:
-            return [upcoming[0]]
-        return []
+        occurrence = Series(task).current(date.today(), to_date)
+        return [occurrence] if occurrence is not None else []
 
-    def refresh_list(self):
-        self.tree.blockSignals(True)
-        self.tree.clear()
-        query = self.search_bar.text().lower()
+    def visible_window(self):
         selected_date = self.calendar.selectedDate().toString("yyyy-MM-dd")
         selected_dt = datetime.strptime(selected_date, "%Y-%m-%d")
-        to_dt = selected_dt + timedelta(days=365)
-
-        filtered = filter_items(self.items, query)
-        final = []
-        for task in filtered:
-            rec = self.generate_recurrences(task, selected_dt, to_dt)
-            final.extend(rec)
-
-        for i in final:
-            recurrence = getattr(i, 'recurrence', 'None')
-            row = QTreeWidgetItem([
-                i.name,
-                ", ".join(i.tags),
-                i.start_date,
-                i.start_time,
-                i.due_date,
-                i.end_time,
-                i.priority,
-                recurrence,
-                ""
-            ])
-            row.setFlags(row.flags() | Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
-            row.setCheckState(8, Qt.Checked if i.completed else Qt.Unchecked)
-            self.tree.addTopLevelItem(row)
-
-        self.tree.blockSignals(False)
-        self.tree.sortItems(2, Qt.AscendingOrder)
-
-    def handle_item_changed(self, item, column):
-        if column == 8:
-            name = item.text(0)
-            start_date = item.text(2)
-            start_time = item.text(3)
-            due = item.text(4)
-            end_time = item.text(5)
-            checked = item.checkState(8) == Qt.Checked
-            for tracked in self.items:
-                if (tracked.name == name and tracked.due_date == due and
-                    tracked.start_date == start_date and tracked.start_time == start_time
-                    and tracked.end_time == end_time):
-                    tracked.completed = checked
-                    save_items(self.items)
-                    break
+        return selected_dt, selected_dt + timedelta(days=365)
+
+    @perf.timed("refresh_list")
+    def refresh_list(self):
+        # the index hands back the same occurrence objects until a task changes, so rows are reused
+        from_dt, to_dt = self.visible_window()
+        self.items.load_window(from_dt, to_dt)
+        rows = []
+        cache = self._rows
+        for task, occurrence in self.items.occurrence_index.window(from_dt, to_dt):
+            row = cache.get(task.id)
+            if row is None or row.occurrence is not occurrence:
+                row = cache[task.id] = TaskRow(task, occurrence)
+            rows.append(row)
+        with perf.span("refresh_list.set_rows"):
+            self.model.set_rows(rows)
+        self.search_again()
+
+    def watch_store(self):
+        # other instances and scripts writing the task files show up here without polling
+        self.merge_timer = QTimer(self)
+        self.merge_timer.setSingleShot(True)
+        self.merge_timer.setInterval(MERGE_DELAY_MS)
+        self.merge_timer.timeout.connect(self.merge_external_changes)
+        self.watcher = None
+        if hasattr(self.items.backend, "watch"):
+            # the task service says when something changed, there are no files to watch
+            self.store_changed.connect(self.merge_timer.start)
+            self.items.backend.watch(self.store_changed.emit)
+            return
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.merge_timer.start)
+        self.watcher.directoryChanged.connect(self.merge_timer.start)
+        self.watch_paths()
+
+    def watch_paths(self):
+        # replacing a file drops its watch, so this runs again after every merge
+        if self.watcher is None:
+            return
+        folder = os.path.abspath(".")
+        backend = self.items.backend
+        paths = [folder] + [os.path.join(folder, name) for name in (backend.STORAGE_FILE, backend.JOURNAL_FILE)]
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        missing = [path for path in paths if path not in watched and os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    @perf.timed("merge_external_changes")
+    def merge_external_changes(self):
+        self.watch_paths()
+        try:
+            changed, removed = self.items.merge_external()
+        except OSError as e:
+            print("Couldn't take in changes from elsewhere, trying again:", e)
+            QTimer.singleShot(MERGE_RETRY_MS, self.merge_timer.start)
+            return
+        if not changed and not removed:
+            return
+        if len(changed) + len(removed) > MERGE_REBUILD_AT:
+            self.refresh_list()
+        else:
+            self.replace_rows(set(changed) | set(removed))
+        self.update_heat()
+        self.search_again()
+
+    def replace_rows(self, task_ids):
+        # rebuilds the rows of just these tasks, ones no longer in the store lose theirs
+        for task_id in task_ids:
+            self._rows.pop(task_id, None)
+        self.model.remove_tasks(task_ids)
+        from_dt, to_dt = self.visible_window()
+        for task_id in task_ids:
+            task = self.items.get(task_id)
+            if task is not None:
+                for occurrence in self.generate_recurrences(task, from_dt, to_dt):
+                    self.model.append_row(TaskRow(task, occurrence))
+
+    @perf.timed("update_heat")
+    def update_heat(self, *_):
+        # shades the days on the visible calendar page by how many tasks fall due
+        first = date(self.calendar.yearShown(), self.calendar.monthShown(), 1) - timedelta(days=7)
+        last = first + timedelta(days=49)
+        loaded = self.items.load_window(first, last)
+        if loaded:
+            from_dt, to_dt = self.visible_window()
+            self.model.add_rows([TaskRow(task, occurrence) for task in loaded
+                                 for occurrence in self.generate_recurrences(task, from_dt, to_dt)])
+            self.search_again()
+        counts = self.items.occurrence_index.counts(first, last)
+        self.calendar.setDateTextFormat(QDate(), QTextCharFormat())
+        top = max(counts.values(), default=0)
+        for day, count in counts.items():
+            text_format = QTextCharFormat()
+            text_format.setBackground(QColor(*HEAT_COLOR, 40 + 160 * count // top))
+            text_format.setToolTip(f"{count} due")
+            self.calendar.setDateTextFormat(QDate(day.year, day.month, day.day), text_format)
+
+    def load_deferred(self):
+        loaded = self.items.load_more(LOAD_CHUNK)
+        if loaded:
+            from_dt, to_dt = self.visible_window()
+            self.model.add_rows([TaskRow(task, occurrence) for task in loaded
+                                 for occurrence in self.generate_recurrences(task, from_dt, to_dt)])
+        if not self.items.fully_loaded:
+            QTimer.singleShot(0, self.load_deferred)
+            return
+        self.update_heat()
+        self.search_again()
+
+    def search_typed(self, _text):
+        # each keystroke pushes the search back, only the text typing stops at gets looked up
+        self._typed_at = perf_counter_ns()
+        self.search_timer.start()
+
+    def search_again(self):
+        # the list's rows changed under a search, its results are picked again from the new ones
+        if self.search_bar.text().strip():
+            self.apply_search()
+
+    def apply_search(self):
+        text = self.search_bar.text()
+        if not text.strip():
+            self.searcher.cancel()
+            self.search_bar.setToolTip("")
+            self.show_model(self.model)
+            return
+        # the previous results stay up until the first chunk of these replaces them
+        self._search = self.searcher.search(text, self.model.all_rows())
+
+    def show_results(self, generation, rows, first):
+        if generation != self._search:
+            return  # from a search the text has moved on from
+        if first:
+            self.search_bar.setToolTip("")
+            self.results.set_rows(rows)
+            self.show_model(self.results)
+            if perf.ENABLED and self._typed_at:
+                perf.record("search.first_result", self._typed_at, perf_counter_ns() - self._typed_at)
+                self._typed_at = 0
+        else:
+            self.results.add_rows(rows)
+
+    def show_search_error(self, generation, message):
+        if generation != self._search:
+            return
+        # nothing matches a query that can't be read, the tooltip says why
+        self.search_bar.setToolTip(message)
+        self.results.set_rows([])
+        self.show_model(self.results)
+
+    def show_model(self, model):
+        if self.proxy.sourceModel() is not model:
+            self.proxy.setSourceModel(model)
+            self.proxy.sort(self.proxy.sortColumn(), self.proxy.sortOrder())
+
+    def handle_item_changed(self, row, checked):
+        task = row.task
+        if row.occurrence is task:
+            task.completed = checked
+        else:
+            # one date of a recurring task, it's kept as an exception on the series
+            set_override(task, row.occurrence.original, done=checked)
+        self.items.update(task)
+
+    def show_row_menu(self, pos):
+        index = self.tree.indexAt(pos)
+        if not index.isValid():
+            return
+        row = self.proxy.sourceModel().row_at(self.proxy.mapToSource(index).row())
+        if row.occurrence is row.task:
+            return  # only occurrences of a recurring task can be skipped or moved
+        occurrence = row.occurrence
+        menu = QMenu(self)
+        skip = menu.addAction("Skip this one")
+        move = menu.addAction("Move this one...")
+        undo = None
+        if occurrence.original.isoformat() in (row.task.overrides or {}):
+            undo = menu.addAction("Put this one back")
+        chosen = menu.exec_(self.tree.viewport().mapToGlobal(pos))
+        if chosen is None:
+            return
+        if chosen is skip:
+            set_override(row.task, occurrence.original, skip=True)
+        elif chosen is undo:
+            clear_override(row.task, occurrence.original)
+        else:
+            text, ok = QInputDialog.getText(self, "Move occurrence", "New due date (YYYY-MM-DD):",
+                                            text=occurrence.due_date)
+            if not ok:
+                return
+            due = parse_date(text.strip())
+            if due is None:
+                QMessageBox.warning(self, "Move occurrence", f"{text} isn't a date, use YYYY-MM-DD.")
+                return
+            # the start moves with it, so the occurrence keeps its length
+            start = occurrence.start + (due - occurrence.due)
+            set_override(row.task, occurrence.original, due_date=due.isoformat(), start_date=start.isoformat())
+        self.items.update(row.task)
+        self.replace_rows({row.task.id})
+        self.update_heat()
+        self.search_again()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Delete:
-            selected = self.tree.selectedItems()
+            selected = self.tree.selectionModel().selectedRows()
             if not selected:
                 return
-            for item in selected:
-                name = item.text(0)
-                due = item.text(4)
-                start_date = item.text(2)
-                start_time = item.text(3)
-                end_time = item.text(5)
-
-                for tracked in self.items:
-                    if (tracked.name == name and tracked.due_date == due and
-                        tracked.start_date == start_date and tracked.start_time == start_time
-                        and tracked.end_time == end_time):
-                        self.items.remove(tracked)
-                        break
-            save_items(self.items)
-            self.refresh_list()
+            removed = self.items.remove([index.data(ID_ROLE) for index in selected])
+            for item_id in removed:
+                self._rows.pop(item_id, None)
+            # the rows may be showing in the search results, the list has them either way
+            source = self.proxy.sourceModel()
+            source_rows = sorted({self.proxy.mapToSource(index).row() for index in selected}, reverse=True)
+            for source_row in source_rows:
+                source.remove_row(source_row)
+            if source is not self.model:
+                self.model.remove_tasks(set(removed))
+            self.update_heat()
+        elif event.key() == Qt.Key_F12 and self.perf_panel is not None:
+            self.perf_panel.setVisible(not self.perf_panel.isVisible())
         else:
             super().keyPressEvent(event)
 
+    @perf.timed("check_notifications")
     def check_notifications(self):
-        if not send_notification:
+        from notifier import send_notification, available as notifier_available
+        if not notifier_available():
             print("Notifier not available. Install pydbus or I sacrifice your children to Moloch.")
             return
 
         today = date.today()
         due_tasks = []
         for task in self.items:
-            due_date = datetime.strptime(task.due_date, "%Y-%m-%d").date()
-            if due_date <= today and not task.completed:
+            if task.due is not None and task.due <= today and not task.completed:
                 due_tasks.append(task)
 
         if not due_tasks:
@@ -1,11 +1,18 @@
 import sys
 import subprocess
 import os 
+import json
 import shutil
+import hashlib
 import tempfile
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from PyQt5.QtWidgets import QApplication, QMessageBox
+
+BASE_URL = "https://raw.githubusercontent.com/Soldrion/vibe-coded/main/tracking%20ap/thing_tracker/"
+MANIFEST_FILE = "manifest.json"
+FILES = ["main.py", "ui_main.py", "tracker_model.py", "storage.py", "utils.py", "task_list_model.py", "search_index.py", "recurrence.py", "item_store.py", "persistence.py", "columnar.py", "notify_daemon.py", "notifier.py", "task_cli.py", "perf.py", "perf_panel.py", "occurrence_index.py", "field_index.py", "query.py", "backend.py", "sqlite_storage.py", "search_worker.py", "calendar_export.py", "task_service.py", "service_client.py"]
+MAX_WORKERS = 6
 
 def log_message(message):
     desktop = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -15,6 +22,7 @@ def log_message(message):
         f.write(f"{timestamp} {message}\n")
 
 def show_message(title, message, error=False):
+    from PyQt5.QtWidgets import QApplication, QMessageBox
     app = QApplication.instance() or QApplication([])
     msg_box = QMessageBox()
     msg_box.setWindowTitle(title)
@@ -24,34 +32,150 @@ def show_message(title, message, error=False):
     if not QApplication.instance():
         app.quit()
 
-def download_and_replace_files(app_dir):
-    base_url = "https://raw.githubusercontent.com/Soldrion/vibe-coded/main/tracking%20ap/thing_tracker/"
-    files = ["main.py", "ui_main.py", "tracker_model.py", "storage.py", "utils.py"]
-
-    errors = []
-    for fname in files:
-        try:
-            url = base_url + fname
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            content = r.content
-
+def base_url():
+    return os.environ.get("THING_TRACKER_UPDATE_URL", BASE_URL)
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_manifest(app_dir):
+    # run before pushing a release so the updater knows what changed
+    with open(os.path.join(app_dir, "version.txt"), "r") as f:
+        version = f.read().strip()
+    manifest = {"version": version, "files": {fname: file_hash(os.path.join(app_dir, fname)) for fname in FILES}}
+    with open(os.path.join(app_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest
+
+def make_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_manifest(session, url):
+    r = session.get(url + MANIFEST_FILE, timeout=10)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json()
+
+def safe_name(fname):
+    # only a plain file name in the app folder, a manifest naming ../x or /x mustn't write there
+    return (isinstance(fname, str) and fname not in ("", ".", "..") and os.path.basename(fname) == fname
+            and "/" not in fname and "\\" not in fname and not os.path.isabs(fname))
+
+def changed_files(app_dir, manifest):
+    changed = []
+    for fname, expected in manifest["files"].items():
+        if not safe_name(fname):
+            raise ValueError(f"{MANIFEST_FILE} names {fname!r}, which isn't a file in the app folder")
+        local_path = os.path.join(app_dir, fname)
+        if not os.path.exists(local_path) or file_hash(local_path) != expected:
+            changed.append(fname)
+    return changed
+
+def download_file(session, url, fname, expected, staging):
+    if not safe_name(fname):
+        raise ValueError(f"{fname!r} isn't a file in the app folder")
+    r = session.get(url + fname, timeout=10)
+    r.raise_for_status()
+    content = r.content
+    actual = hashlib.sha256(content).hexdigest()
+    if expected is not None and actual != expected:
+        raise ValueError(f"hash mismatch, expected {expected} got {actual}")
+    with open(os.path.join(staging, fname), "wb") as f:
+        f.write(content)
+    return actual
+
+def swap_in(app_dir, staging, fnames):
+    # all staged files go in, or none do
+    replaced = []
+    backed_up = set()
+    for fname in fnames:
+        if not safe_name(fname):
+            raise ValueError(f"{fname!r} isn't a file in the app folder")
+    try:
+        for fname in fnames:
             local_path = os.path.join(app_dir, fname)
-            backup_path = local_path + ".bak"
-
             if os.path.exists(local_path):
-                shutil.copy2(local_path, backup_path)
-
-            tmp_fd, tmp_path = tempfile.mkstemp()
-            with os.fdopen(tmp_fd, 'wb') as tmp_file:
-                tmp_file.write(content)
-
-            shutil.move(tmp_path, local_path)
-            log_message(f"Updated {fname} successfully.")
+                shutil.copy2(local_path, local_path + ".bak")
+                backed_up.add(fname)
+            os.replace(os.path.join(staging, fname), local_path)
+            replaced.append(fname)
+    except Exception:
+        for fname in reversed(replaced):
+            local_path = os.path.join(app_dir, fname)
+            if fname in backed_up:
+                shutil.copy2(local_path + ".bak", local_path)
+            else:
+                os.remove(local_path)
+            log_message(f"Rolled back {fname}.")
+        raise
+    for fname in fnames:
+        log_message(f"Updated {fname} successfully.")
+
+def download_and_replace_files(app_dir, url=None):
+    url = url or base_url()
+    errors = []
+    with make_session() as session:
+        try:
+            manifest = fetch_manifest(session, url)
         except Exception as e:
-            err = f"Failed to update {fname}: {e}"
-            errors.append(err)
+            err = f"Failed to fetch {MANIFEST_FILE}: {e}"
             log_message(err)
+            return [err]
+
+        if manifest is None:
+            # older releases have no manifest, fetch everything and keep what differs
+            log_message(f"No {MANIFEST_FILE}, downloading every file.")
+            expected = {fname: None for fname in FILES}
+        else:
+            try:
+                expected = {fname: manifest["files"][fname] for fname in changed_files(app_dir, manifest)}
+            except (ValueError, KeyError, TypeError) as e:
+                err = f"Bad {MANIFEST_FILE}, nothing was updated: {e}"
+                log_message(err)
+                return [err]
+        if not expected:
+            log_message("Everything is up to date.")
+            return errors
+
+        staging = tempfile.mkdtemp(prefix=".update-", dir=app_dir)
+        try:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+                futures = {pool.submit(download_file, session, url, fname, hash_, staging): fname
+                           for fname, hash_ in expected.items()}
+                hashes = {}
+                for future in as_completed(futures):
+                    fname = futures[future]
+                    try:
+                        hashes[fname] = future.result()
+                    except Exception as e:
+                        err = f"Failed to update {fname}: {e}"
+                        errors.append(err)
+                        log_message(err)
+            if errors:
+                log_message("Nothing was replaced.")
+                return errors
+
+            fnames = [fname for fname in expected
+                      if manifest is not None or not os.path.exists(os.path.join(app_dir, fname))
+                      or file_hash(os.path.join(app_dir, fname)) != hashes[fname]]
+            try:
+                swap_in(app_dir, staging, fnames)
+            except Exception as e:
+                err = f"Failed to replace files, rolled back: {e}"
+                errors.append(err)
+                log_message(err)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
 
     return errors
 
@@ -76,15 +200,22 @@ def restart_app(app_dir):
         show_message("Restart Failed", f"Failed to restart app:\n{e}", error=True)
 
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "--write-manifest":
+        app_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(os.path.abspath(__file__))
+        manifest = write_manifest(app_dir)
+        print(f"Wrote {MANIFEST_FILE} for {manifest['version']}")
+        return
+
     if len(sys.argv) < 2:
-        show_message("Updater Error", "Usage: updater.py <app_directory>", error=True)
+        show_message("Updater Error", "Usage: updater.py <app_directory> [base_url]", error=True)
         return
 
     app_dir = sys.argv[1]
+    url = sys.argv[2] if len(sys.argv) > 2 else None
 
     log_message("=== Update started ===")
 
-    errors = download_and_replace_files(app_dir)
+    errors = download_and_replace_files(app_dir, url)
 
     if errors:
         show_message("Update Completed with Errors", "\n".join(errors), error=True)
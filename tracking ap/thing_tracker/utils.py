@@ -1,3 +1,12 @@
-def filter_items(items, query):
-    query = query.lower()
-    return [item for item in items if query in item.name.lower() or any(query in tag.lower() for tag in item.tags)]
+from perf import timed
+from query import Term, matches
+
+
+@timed("filter_items")
+def filter_items(items, query, index=None):
+    if index is not None:
+        return index.search(query)
+    # same word-prefix rule as the index, checked task by task
+    text = query.strip()
+    term = Term("text", ":", text, text)
+    return [item for item in items if matches(term, item)]